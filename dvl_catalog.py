@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import dvl_schema
+from dvl_files import (
+    READ_CHUNK_SIZE,
+    FrameAssembler,
+    load_columns,
+    log_sources,
+    open_input,
+    read_bytes,
+    times_path,
+)
+from dvl_logging import RAW_TIME_ENTRY
+from dvl_summary import SUMMARY_FILE
+
+GET_ALL_FILE = "get_all.txt"
+CATALOG_TABLE = "runs"
+
+# replies that change between runs without the configuration changing
+VOLATILE_COMMANDS = ("GETCLOCKSTR", "READIP")
+
+
+def parse_get_all(text):
+    """Commands and values of a get_all.txt as {command: {key: value}}.
+
+    Quoted values are unquoted; numbers stay strings. Commands that reply
+    several lines (LISTLICENSE) map to a list of dicts.
+    """
+
+    get_all = dict()
+
+    for line in text.splitlines():
+
+        command, _, arguments = line.strip().partition(",")
+        if not command or command == "OK":
+            continue
+
+        values = dict()
+        for item in next(csv.reader([arguments])) if arguments else ():
+            key, _, value = item.partition("=")
+            values[key] = value.strip('"')
+
+        if command in get_all:
+            if not isinstance(get_all[command], list):
+                get_all[command] = [get_all[command]]
+            get_all[command].append(values)
+        else:
+            get_all[command] = values
+
+    return get_all
+
+
+def _count(counts, packet_id, number=1):
+
+    try:
+        name = dvl_schema.DataID(packet_id).name.lower()
+    except ValueError:
+        name = "0x{:02x}".format(packet_id)
+
+    counts[name] = counts.get(name, 0) + number
+
+
+def _span(span, key, value):
+
+    if value is None or value != value:
+        return
+
+    start, end = key + "_start", key + "_end"
+    span[start] = value if span[start] is None else min(span[start], value)
+    span[end] = value if span[end] is None else max(span[end], value)
+
+
+def _scan_frames(path, counts, span):
+
+    assembler = FrameAssembler()
+
+    with open_input(path) as file:
+        while True:
+            data = file.read(READ_CHUNK_SIZE)
+
+            frames = assembler.feed(data)
+            buffer = assembler.buffer
+
+            for offset, size, valid in frames:
+                if not valid:
+                    continue
+
+                _count(counts, buffer[offset + 2])
+
+                size_header = buffer[offset + 1]
+                if (
+                    buffer[offset + 2] != dvl_schema.DataID.ASCII
+                    and size >= size_header + 12
+                ):
+                    _span(
+                        span,
+                        "device",
+                        int.from_bytes(
+                            buffer[offset + size_header + 4 : offset + size_header + 8],
+                            "little",
+                        )
+                        + int.from_bytes(
+                            buffer[
+                                offset + size_header + 8 : offset + size_header + 12
+                            ],
+                            "little",
+                        )
+                        * 1e-6,
+                    )
+
+            if not data:
+                break
+
+    if times_path(path).is_file():
+        data = read_bytes(times_path(path))
+        if len(data) >= RAW_TIME_ENTRY.size:
+            _span(span, "host", RAW_TIME_ENTRY.unpack_from(data, 0)[1])
+            _span(
+                span,
+                "host",
+                RAW_TIME_ENTRY.unpack_from(
+                    data, (len(data) // RAW_TIME_ENTRY.size - 1) * RAW_TIME_ENTRY.size
+                )[1],
+            )
+
+
+def _scan_csv(path, counts, span):
+
+    with io.TextIOWrapper(open_input(path), newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        columns = [
+            header.index(name) if name in header else None
+            for name in ("id", "timeStamp", "microSeconds", "timestampPython")
+        ]
+
+        for row in reader:
+            try:
+                values = [
+                    row[column] if column is not None else "" for column in columns
+                ]
+            except IndexError:
+                continue
+
+            if values[0]:
+                _count(counts, int(values[0]))
+            if values[1]:
+                _span(
+                    span,
+                    "device",
+                    int(values[1]) + (int(values[2]) if values[2] else 0) * 1e-6,
+                )
+            if values[3]:
+                _span(span, "host", float(values[3]))
+
+
+def _scan_columnar(folder, counts, span):
+
+    for array in load_columns(folder).values():
+        if not len(array):
+            continue
+
+        _count(counts, int(array["id"][0]), len(array))
+
+        device_time = array["timeStamp"] + array["microSeconds"] * 1e-6
+        _span(span, "device", float(device_time.min()))
+        _span(span, "device", float(device_time.max()))
+        _span(span, "host", float(array["timestampPython"].min()))
+        _span(span, "host", float(array["timestampPython"].max()))
+
+
+def run_mtime(folder):
+    """Newest modification time of the files of a run folder, including segment folders.
+
+    The summary sidecar is left out, so writing it does not make the run look changed.
+    """
+
+    mtime = 0.0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.endswith(SUMMARY_FILE):
+                mtime = max(mtime, os.stat(os.path.join(root, name)).st_mtime)
+
+    return mtime
+
+
+def scan_run(folder):
+    """Catalog entry of a run folder: its GETALL metadata and packet statistics.
+
+    The logs of the folder (see dvl_files.log_sources) are scanned once
+    without decoding packets, for the packet count per id and the device
+    and host time span.
+    """
+
+    folder = Path(folder)
+
+    get_all = dict()
+    if (folder / GET_ALL_FILE).is_file():
+        get_all = parse_get_all((folder / GET_ALL_FILE).read_text(errors="replace"))
+
+    counts = dict()
+    span = {
+        "device_start": None,
+        "device_end": None,
+        "host_start": None,
+        "host_end": None,
+    }
+
+    for kind, source in log_sources(folder):
+        if kind == "columnar":
+            _scan_columnar(source, counts, span)
+        elif ".csv" in source.suffixes:
+            _scan_csv(source, counts, span)
+        else:
+            _scan_frames(source, counts, span)
+
+    config = {
+        command: values
+        for command, values in get_all.items()
+        if command not in VOLATILE_COMMANDS
+    }
+
+    identity = get_all.get("ID", {})
+    firmware = get_all.get("GETFW", {})
+
+    if span["device_start"] is not None:
+        duration = span["device_end"] - span["device_start"]
+    elif span["host_start"] is not None:
+        duration = span["host_end"] - span["host_start"]
+    else:
+        duration = None
+
+    return {
+        "path": str(folder.resolve()),
+        "mtime": run_mtime(folder),
+        "device": identity.get("STR"),
+        "serial": identity.get("SN"),
+        "firmware": firmware.get("STR"),
+        "firmware_hash": firmware.get("HASH"),
+        "clock": get_all.get("GETCLOCKSTR", {}).get("TIME"),
+        "config_hash": hashlib.sha1(
+            json.dumps(config, sort_keys=True).encode()
+        ).hexdigest()[:16],
+        "get_all": json.dumps(get_all),
+        "packets": sum(counts.values()),
+        "packet_counts": json.dumps(counts),
+        "duration": duration,
+        **span,
+    }
+
+
+CATALOG_COLUMNS = (
+    ("path", "TEXT PRIMARY KEY"),
+    ("mtime", "REAL"),
+    ("device", "TEXT"),
+    ("serial", "TEXT"),
+    ("firmware", "TEXT"),
+    ("firmware_hash", "TEXT"),
+    ("clock", "TEXT"),
+    ("config_hash", "TEXT"),
+    ("get_all", "TEXT"),
+    ("packets", "INTEGER"),
+    ("packet_counts", "TEXT"),
+    ("duration", "REAL"),
+    ("device_start", "REAL"),
+    ("device_end", "REAL"),
+    ("host_start", "REAL"),
+    ("host_end", "REAL"),
+)
+
+
+class LogCatalog:
+    """Searchable index of the run folders under one or more log roots.
+
+    A run folder is any folder holding a get_all.txt, as written by the
+    logger and by downloads. Entries (see scan_run) are kept in a sqlite3
+    table keyed by path, with the newest file modification time of the
+    folder: update rescans only new and changed folders, on a pool of worker
+    processes, and drops folders that are gone. The GETALL replies are
+    stored as json next to indexed columns for serial, firmware and a hash
+    of the configuration, so runs are found without opening their logs.
+
+        catalog = LogCatalog("catalog.sqlite")
+        catalog.update(["logs", "download"])
+        runs = catalog.find(serial="300293", firmware="4.0.1")
+    """
+
+    def __init__(self, path):
+
+        self.path = str(path)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+        columns = ", ".join(
+            "{} {}".format(name, sql_type) for name, sql_type in CATALOG_COLUMNS
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} ({})".format(CATALOG_TABLE, columns)
+        )
+        for name in ("serial", "firmware", "firmware_hash", "config_hash", "clock"):
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})".format(
+                    CATALOG_TABLE, name
+                )
+            )
+        self.connection.commit()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exception):
+
+        self.close()
+
+    def close(self):
+
+        self.connection.close()
+
+    def update(self, roots, workers=None):
+        """Scan new and changed run folders under roots.
+
+        Returns the (scanned, removed) counts.
+        """
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        folders = {
+            str(get_all.parent.resolve())
+            for root in roots
+            for get_all in Path(root).rglob(GET_ALL_FILE)
+        }
+        known = {
+            row["path"]: row["mtime"]
+            for row in self.connection.execute(
+                "SELECT path, mtime FROM {}".format(CATALOG_TABLE)
+            )
+        }
+
+        changed = [
+            folder
+            for folder in sorted(folders)
+            if known.get(folder) != run_mtime(folder)
+        ]
+
+        roots = [str(Path(root).resolve()) for root in roots]
+        removed = [
+            path
+            for path in known
+            if path not in folders
+            and any(path.startswith(root + os.sep) or path == root for root in roots)
+        ]
+
+        if workers > 1 and len(changed) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                entries = list(executor.map(scan_run, changed, chunksize=8))
+        else:
+            entries = [scan_run(folder) for folder in changed]
+
+        names = [name for name, _ in CATALOG_COLUMNS]
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+                    CATALOG_TABLE, ", ".join(names), ", ".join("?" * len(names))
+                ),
+                [tuple(entry[name] for name in names) for entry in entries],
+            )
+            self.connection.executemany(
+                "DELETE FROM {} WHERE path = ?".format(CATALOG_TABLE),
+                [(path,) for path in removed],
+            )
+
+        return len(entries), len(removed)
+
+    def find(self, serial=None, firmware=None, where=None, parameters=()):
+        """Runs matching a serial number, firmware version and sql condition.
+
+        firmware is the STR or HASH of the version; every argument is
+        optional. The runs are returned oldest first.
+        """
+
+        conditions = list()
+        values = list()
+
+        if serial is not None:
+            conditions.append("serial = ?")
+            values.append(str(serial))
+
+        if firmware is not None:
+            conditions.append("(firmware = ? OR firmware_hash = ?)")
+            values.extend((firmware, firmware))
+
+        if where is not None:
+            conditions.append("({})".format(where))
+            values.extend(parameters)
+
+        sql = "SELECT * FROM {}".format(CATALOG_TABLE)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        return self.connection.execute(
+            sql + " ORDER BY serial, clock, path", values
+        ).fetchall()
+
+    def changes(self, serial=None):
+        """Runs whose configuration or firmware differs from the previous run.
+
+        Runs are compared with the previous run of the same device.
+        """
+
+        changed = list()
+        previous = dict()
+
+        for row in self.find(serial=serial):
+            key = (row["config_hash"], row["firmware_hash"])
+            if row["serial"] in previous and previous[row["serial"]] != key:
+                changed.append(row)
+            previous[row["serial"]] = key
+
+        return changed
+
+
+def _print_runs(rows):
+
+    for row in rows:
+        duration = (
+            "{:.0f} s".format(row["duration"]) if row["duration"] is not None else "-"
+        )
+        print(
+            "{}  SN={} FW={} ({})  {}  {} packets  {}".format(
+                row["clock"],
+                row["serial"],
+                row["firmware"],
+                row["firmware_hash"],
+                duration,
+                row["packets"],
+                row["path"],
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Catalog of Nucleus log and download folders"
+    )
+    parser.add_argument(
+        "--catalog", default="catalog.sqlite", help="Catalog database file"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser(
+        "update", help="Scan log roots for new and changed runs"
+    )
+    update_parser.add_argument("roots", nargs="+", help="Folders to search for runs")
+    update_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: one per core)",
+    )
+
+    find_parser = subparsers.add_parser(
+        "find", help="List runs by serial number and firmware"
+    )
+    find_parser.add_argument("--serial", default=None, help="Device serial number")
+    find_parser.add_argument(
+        "--firmware", default=None, help="Firmware version or hash"
+    )
+
+    changes_parser = subparsers.add_parser(
+        "changes", help="List runs where the configuration or firmware changed"
+    )
+    changes_parser.add_argument("--serial", default=None, help="Device serial number")
+
+    args = parser.parse_args()
+
+    with LogCatalog(args.catalog) as catalog:
+
+        if args.command == "update":
+            scanned, removed = catalog.update(args.roots, workers=args.workers)
+            print(f"✅ Scanned {scanned} runs, removed {removed}")
+
+        elif args.command == "find":
+            _print_runs(catalog.find(serial=args.serial, firmware=args.firmware))
+
+        elif args.command == "changes":
+            _print_runs(catalog.changes(serial=args.serial))
+
+
+if __name__ == "__main__":
+    main()
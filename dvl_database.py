@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import sqlite3
+from operator import itemgetter
+
+import dvl_schema
+
+RUNS_TABLE = "runs"
+
+_SQL_TYPES = {
+    "u1": "INTEGER",
+    "u2": "INTEGER",
+    "u4": "INTEGER",
+    "i1": "INTEGER",
+    "i2": "INTEGER",
+    "i4": "INTEGER",
+    "f4": "REAL",
+    "f8": "REAL",
+    "?": "INTEGER",
+}
+
+
+def _quote(name):
+
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class PacketDatabase:
+    """Decoded packets of many runs in one sqlite3 database.
+
+    Every fixed-width packet layout gets a table named after it (imu,
+    bottom_track, ahrs_v2, ...) with the record fields of dvl_schema, the run
+    the packet belongs to and its device time in POSIX seconds (deviceTime).
+    The tables are indexed on device time and host time (timestampPython).
+    Runs are listed in the runs table with their path and the modification
+    time of the log they were read from. Current profile and ASCII packets
+    are not stored.
+
+    Packets are buffered per table and inserted with executemany in one
+    transaction every batch_size packets and on flush. The database is
+    opened in WAL mode, so queries can run while a logger is writing.
+
+        with PacketDatabase("runs.sqlite") as database:
+            rows = database.query(
+                "SELECT * FROM bottom_track WHERE fomX > 1.5 "
+                "AND deviceTime BETWEEN ? AND ?",
+                (t0, t1),
+            )
+    """
+
+    def __init__(self, path, batch_size=1000):
+
+        self.path = str(path)
+        self.batch_size = batch_size
+
+        # the logger writes from its writer thread, one thread at a time
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} (run INTEGER PRIMARY KEY, path TEXT UNIQUE, "
+            "mtime REAL, packets INTEGER DEFAULT 0)".format(RUNS_TABLE)
+        )
+        self.connection.commit()
+
+        self.tables = dict()
+        self.pending = 0
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exception):
+
+        self.close()
+
+    def _table(self, key):
+
+        table = self.tables.get(key)
+        if table is not None:
+            return table
+
+        fields = dvl_schema.RECORD_FIELDS[key]
+        name = dvl_schema.layout_name(key)
+        names = [field for field, _ in fields]
+
+        columns = ", ".join(
+            "{} {}".format(_quote(field), _SQL_TYPES[numpy_type])
+            for field, numpy_type in fields
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} (run INTEGER, deviceTime REAL, {})".format(
+                name, columns
+            )
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS {0}_device_time ON {0} (deviceTime)".format(
+                name
+            )
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS {0}_host_time ON {0} (timestampPython)".format(
+                name
+            )
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS {0}_run ON {0} (run)".format(name)
+        )
+
+        table = {
+            "name": name,
+            "names": names,
+            "getter": itemgetter(*names),
+            "insert": "INSERT INTO {} VALUES ({})".format(
+                name, ", ".join("?" * (len(names) + 2))
+            ),
+            "rows": list(),
+        }
+        self.tables[key] = table
+
+        return table
+
+    def run(self, path, mtime=None) -> int:
+        """Id of the run stored for path, replacing any packets it already has."""
+
+        self.flush()
+
+        row = self.connection.execute(
+            "SELECT run FROM {} WHERE path = ?".format(RUNS_TABLE), (str(path),)
+        ).fetchone()
+
+        if row is None:
+            run = self.connection.execute(
+                "INSERT INTO {} (path, mtime) VALUES (?, ?)".format(RUNS_TABLE),
+                (str(path), mtime),
+            ).lastrowid
+        else:
+            run = row["run"]
+            for (name,) in self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name != ?",
+                (RUNS_TABLE,),
+            ).fetchall():
+                self.connection.execute(
+                    "DELETE FROM {} WHERE run = ?".format(name), (run,)
+                )
+            self.connection.execute(
+                "UPDATE {} SET mtime = ?, packets = 0 WHERE run = ?".format(RUNS_TABLE),
+                (mtime, run),
+            )
+
+        self.connection.commit()
+
+        return run
+
+    def is_current(self, path, mtime) -> bool:
+        """Whether path was stored from a log with modification time mtime."""
+
+        row = self.connection.execute(
+            "SELECT mtime FROM {} WHERE path = ?".format(RUNS_TABLE), (str(path),)
+        ).fetchone()
+
+        return row is not None and row["mtime"] == mtime
+
+    def insert(self, run, packet) -> bool:
+        """Queue a decoded packet of run. Returns False if its layout has no table."""
+
+        key = dvl_schema.layout_key(
+            packet.get("family"), packet.get("id"), packet.get("version")
+        )
+        if key is None or dvl_schema.RECORD_FIELDS[key] is None:
+            return False
+
+        table = self._table(key)
+
+        try:
+            values = table["getter"](packet)
+        except KeyError:
+            # packets read from csv lack the columns that had no value
+            values = tuple(packet.get(name) for name in table["names"])
+
+        device_time = (
+            packet["timeStamp"] + packet.get("microSeconds", 0) * 1e-6
+            if packet.get("timeStamp") is not None
+            else None
+        )
+        table["rows"].append((run, device_time) + values)
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+        return True
+
+    def flush(self):
+
+        if not self.pending:
+            return
+
+        with self.connection:
+            for table in self.tables.values():
+                if table["rows"]:
+                    self.connection.executemany(table["insert"], table["rows"])
+                    table["rows"] = list()
+
+        self.pending = 0
+
+    def finish(self, run):
+        """Flush and record the packet count of run."""
+
+        self.flush()
+
+        total = 0
+        for (name,) in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != ?",
+            (RUNS_TABLE,),
+        ).fetchall():
+            total += self.connection.execute(
+                "SELECT COUNT(*) FROM {} WHERE run = ?".format(name), (run,)
+            ).fetchone()[0]
+
+        with self.connection:
+            self.connection.execute(
+                "UPDATE {} SET packets = ? WHERE run = ?".format(RUNS_TABLE),
+                (total, run),
+            )
+
+    def query(self, sql, parameters=()):
+        """Rows (sqlite3.Row) of a query, after flushing queued packets."""
+
+        self.flush()
+
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def close(self):
+
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,1533 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import os
+import re
+import time
+from binascii import crc32
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+from queue import Queue
+from struct import error as struct_error
+from threading import Lock, Thread
+
+from nucleus_driver._download import Download
+
+import dvl_schema
+from dvl_files import (
+    DVL_INDEX_ENTRY,
+    MAX_PACKAGE_LENGTH,
+    READ_CHUNK_SIZE,
+    CsvExporter,
+    FrameAssembler,
+    IndexWriter,
+    close_buffer,
+    find_boundary,
+    find_frames,
+    open_buffer,
+    open_dvl_index,
+)
+from dvl_logging import ColumnarWriter, PacketCsvWriter
+
+MEGABYTE = 1024 * 1024
+PARALLEL_CHUNK_SIZE = 16 * MEGABYTE
+
+SOURCES = {0: "nucleus", 1: "dvl"}
+DOWNLOAD_FILES = {
+    0: ("nucleus_data.nucleus", None),
+    1: ("dvl_data.bin", "dvl_crc_fails.bin"),
+}
+
+PIPELINE_DEPTH = 4
+CHUNK_LIMITS_SERIAL = (1024, 64 * 1024)
+CHUNK_LIMITS_TCP = (64 * 1024, 4 * MEGABYTE)
+MAX_ATTEMPTS = 10
+
+DECODE_OUTPUTS = ("csv", "columnar", "index")
+DECODE_FOLDER = "decoded"
+DECODE_QUEUE_DEPTH = 64
+
+DVL_RECORD_MAX_LENGTH = 10000
+DVL_RECORD_SYNC_MAX_LENGTH = 0x4000
+
+
+def _convert_chunk(path, start, end, fieldnames):
+    """Decode the frames of path[start:end] in a worker process.
+
+    Returns the nucleus_log.csv rows as text, the current profile packets and
+    the frames that failed the data checksum, in file order, together with the
+    packet counts and the position where framing stopped.
+    """
+
+    buffer = open_buffer(path)
+
+    text = io.StringIO()
+    writer = PacketCsvWriter(text, fieldnames=fieldnames)
+
+    current_profiles = list()
+    failed_frames = list()
+    packets = 0
+    undecoded = 0
+
+    frames, stop = find_frames(buffer, start, end)
+
+    for offset, size, valid in frames:
+
+        if not valid:
+            failed_frames.append(bytes(buffer[offset : offset + size]))
+            continue
+
+        try:
+            packet = dvl_schema.decode_packet(
+                buffer, offset, timestamp=datetime.now().timestamp()
+            )
+        except struct_error:
+            packet = None
+
+        if packet is None:
+            undecoded += 1
+            continue
+
+        if packet["id"] == dvl_schema.DataID.CURRENT_PROFILE:
+            current_profiles.append(packet)
+        else:
+            writer.writerow(packet)
+        packets += 1
+
+    close_buffer(buffer)
+
+    return text.getvalue(), current_profiles, failed_frames, packets, undecoded, stop
+
+
+def _dvl_record_start(data, position, end):
+    """Whether data[position:end] could start with a DVL record length field.
+
+    Same test as Download._handle_crc: a non-zero length of at most 0x4000
+    in the two low bytes and zeros in the two high bytes, with a shorter
+    remainder accepted when the bytes present agree.
+    """
+
+    remaining = end - position
+
+    if remaining <= 1:
+        return True
+
+    if data[position] == 0 and data[position + 1] == 0:
+        return False
+
+    if data[position] | data[position + 1] << 8 > DVL_RECORD_SYNC_MAX_LENGTH:
+        return False
+
+    if remaining == 2:
+        return True
+
+    if remaining == 3:
+        return data[position + 2] == 0
+
+    return data[position + 2] == 0 and data[position + 3] == 0
+
+
+def _dvl_resync(data, position, end):
+    """Position of the next possible DVL record start after a bad record at position."""
+
+    position += 1
+
+    while end - position > 3:
+
+        # a record start has zeros in bytes 2 and 3 of its length field
+        zeros = data.find(b"\x00\x00", position + 2, end)
+        if zeros < 0:
+            position = max(position, end - 3)
+            break
+
+        position = zeros - 2
+        if _dvl_record_start(data, position, end):
+            return position
+        position += 1
+
+    while not _dvl_record_start(data, position, end):
+        position += 1
+
+    return position
+
+
+class DVLRecordWriter:
+    """Split a stream of downloaded DVL data into records and write them.
+
+    The stream holds records of a 4 byte length, the data and a 4 byte crc32.
+    Records that pass the crc are written to file and bytes between them to
+    fail_file. Received data is appended to one buffer and parsed with a
+    moving offset; it is compacted once per write instead of being sliced
+    per record. statistics is updated like Download.dvl_download_statistics.
+
+    Only the record data goes to file, so the offset, length and crc of each
+    record are appended to index_file (see dvl_files.DVLRecordIndex) when
+    one is given.
+    """
+
+    def __init__(self, file, fail_file, statistics, index_file=None):
+
+        self.file = file
+        self.fail_file = fail_file
+        self.statistics = statistics
+        self.index_file = index_file
+
+        self.buffer = bytearray()
+        self.offset = file.tell()
+
+    def write(self, package):
+
+        self.buffer += package
+
+        with memoryview(self.buffer) as view:
+            position = self._write_records(view)
+
+        del self.buffer[:position]
+
+    def _write_records(self, view) -> int:
+
+        data = self.buffer
+        end = len(data)
+        position = 0
+
+        while end - position >= 4:
+
+            length = int.from_bytes(view[position : position + 4], "little")
+
+            if length <= DVL_RECORD_MAX_LENGTH:
+
+                if end - position < 4 + length + 4:
+                    break
+
+                record = view[position + 4 : position + 4 + length]
+                crc = int.from_bytes(
+                    view[position + 4 + length : position + 8 + length], "little"
+                )
+                if crc == crc32(record):
+                    self.file.write(record)
+                    if self.index_file is not None:
+                        self.index_file.write(
+                            DVL_INDEX_ENTRY.pack(self.offset, length, crc)
+                        )
+                    self.offset += length
+                    self.statistics["successful bytes"] += length
+                    position += 4 + length + 4
+                    continue
+
+            resync = _dvl_resync(data, position, end)
+            self.fail_file.write(view[position:resync])
+            self.statistics["failed bytes"] += resync - position
+            position = resync
+
+        return position
+
+
+class ChunkController:
+    """Chooses the length and timeout of download chunks from what the link delivers.
+
+    Reply times of recent chunks give the link latency and time per byte
+    (least squares), and the failed chunks (bad reply or crc) per requested
+    byte give a byte error rate. After every chunk the length moves to
+    whichever of half, the same or double the current length has the best
+    expected goodput, L * (1 - error rate)^L / (latency + L * time per byte),
+    within the limits. The timeout is a multiple of the expected reply time,
+    growing with the attempt; until replies have been timed it follows the
+    fixed 3 to 10 s schedule of Download.
+    """
+
+    DECAY = 0.98
+    TIMEOUT_FACTOR = 3.0
+    MIN_TIMEOUT = 1.0
+    MAX_TIMEOUT = 30.0
+
+    def __init__(self, length, minimum, maximum):
+
+        self.length = min(max(length, minimum), maximum)
+        self.minimum = minimum
+        self.maximum = maximum
+
+        self.samples = deque(maxlen=64)
+        self.latency = 0.0
+        self.seconds_per_byte = None
+
+        self.requested_bytes = 0.0
+        self.failures = 0.0
+
+        self._lock = Lock()
+
+    @property
+    def byte_error_rate(self) -> float:
+
+        return self.failures / self.requested_bytes if self.requested_bytes else 0.0
+
+    def expected_seconds(self, length) -> float:
+
+        return self.latency + length * self.seconds_per_byte
+
+    def goodput(self, length) -> float:
+
+        return (
+            length
+            * max(1.0 - self.byte_error_rate, 0.0) ** length
+            / max(self.expected_seconds(length), 1e-9)
+        )
+
+    def timeout(self, length, attempt) -> float:
+
+        if self.seconds_per_byte is None:
+            return min(
+                2 + attempt, 10
+            )  # First iteration is 3s, 3 last iterations are 10s
+
+        return min(
+            max(self.TIMEOUT_FACTOR * self.expected_seconds(length), self.MIN_TIMEOUT)
+            * attempt,
+            self.MAX_TIMEOUT,
+        )
+
+    def measure(self, length, seconds):
+        """Time taken by a reply of length bytes."""
+
+        with self._lock:
+            self.samples.append((length, seconds))
+
+            count = len(self.samples)
+            mean_length = sum(sample[0] for sample in self.samples) / count
+            mean_seconds = sum(sample[1] for sample in self.samples) / count
+            variance = sum((sample[0] - mean_length) ** 2 for sample in self.samples)
+
+            slope = 0.0
+            if variance > 0:
+                slope = (
+                    sum(
+                        (sample[0] - mean_length) * (sample[1] - mean_seconds)
+                        for sample in self.samples
+                    )
+                    / variance
+                )
+
+            if slope > 0:
+                self.seconds_per_byte = slope
+                self.latency = max(mean_seconds - slope * mean_length, 0.0)
+            else:
+                # a single chunk length so far: no latency estimate yet
+                self.seconds_per_byte = mean_seconds / mean_length
+                self.latency = 0.0
+
+    def record(self, length, success):
+        """Outcome of a chunk: True when its crc matched, False on a bad reply."""
+
+        with self._lock:
+            self.requested_bytes = self.DECAY * self.requested_bytes + length
+            self.failures = self.DECAY * self.failures + (0.0 if success else 1.0)
+
+            if self.seconds_per_byte is None:
+                if not success:
+                    self.length = max(self.minimum, self.length // 2)
+                return
+
+            candidates = (
+                max(self.minimum, self.length // 2),
+                self.length,
+                min(self.maximum, self.length * 2),
+            )
+            self.length = max(candidates, key=self.goodput)
+
+
+class StreamDecoder:
+    """Decode a .nucleus file on its own thread while it is being downloaded.
+
+    feed queues the bytes written to the file; the decoder thread frames them
+    with FrameAssembler and writes each packet to the selected outputs:
+    "csv" (nucleus_log.csv and current_profile_log.csv) and "columnar" (.npy
+    files and manifest) in the decoded folder next to the file, and "index"
+    (the PacketIndex sidecar of the file). A resumed download first decodes
+    the existing part of the file, read back from disk. The queue is bounded
+    by DECODE_QUEUE_DEPTH chunks, so feed only blocks the download when the
+    decoder falls that far behind.
+    """
+
+    def __init__(self, path, outputs, existing=0):
+
+        self.path = Path(path)
+        self.existing = existing
+        self.length = existing
+
+        folder = self.path.parent / DECODE_FOLDER
+        if "csv" in outputs or "columnar" in outputs:
+            folder.mkdir(parents=True, exist_ok=True)
+
+        self.exporter = CsvExporter(folder) if "csv" in outputs else None
+        self.columnar = ColumnarWriter(folder) if "columnar" in outputs else None
+        self.index = IndexWriter(self.path) if "index" in outputs else None
+
+        self.statistics = dict()
+        self.statistics["packets"] = 0
+        self.statistics["failed packets"] = 0
+        self.statistics["undecoded packets"] = 0
+
+        self.errors = list()
+
+        self._queue = Queue(maxsize=DECODE_QUEUE_DEPTH)
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, data):
+
+        self.length += len(data)
+        self._queue.put(data)
+
+    def _chunks(self):
+
+        if self.existing:
+            with open(self.path, "rb") as file:
+                remaining = self.existing
+                while remaining > 0:
+                    data = file.read(min(READ_CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            yield data
+
+    def _run(self):
+
+        assembler = FrameAssembler()
+        decode = self.exporter is not None or self.columnar is not None
+
+        for data in self._chunks():
+
+            # after a failed write the outputs are incomplete; the queue is still
+            # drained below
+            if self.errors:
+                continue
+
+            try:
+                for offset, size, valid in assembler.feed(data):
+
+                    if not valid:
+                        self.statistics["failed packets"] += 1
+                        continue
+
+                    if self.index is not None:
+                        self.index.write(
+                            assembler.buffer,
+                            offset,
+                            size,
+                            file_offset=assembler.offset + offset,
+                        )
+
+                    if not decode:
+                        self.statistics["packets"] += 1
+                        continue
+
+                    try:
+                        packet = dvl_schema.decode_packet(
+                            assembler.buffer,
+                            offset,
+                            timestamp=datetime.now().timestamp(),
+                        )
+                    except struct_error:
+                        # a checksum-valid frame shorter than its layout, only this
+                        # packet is lost
+                        packet = None
+
+                    if packet is None:
+                        self.statistics["undecoded packets"] += 1
+                        continue
+
+                    if self.exporter is not None:
+                        self.exporter.write(packet)
+                    if self.columnar is not None:
+                        self.columnar.write(packet)
+
+                    self.statistics["packets"] += 1
+
+            except Exception as exception:
+                # writing an output failed; keep draining the queue so that feed
+                # never blocks the download
+                self.errors.append(exception)
+
+    def close(self) -> bool:
+        """Decode what is still queued and close the outputs.
+
+        Returns False if writing failed.
+        """
+
+        self._queue.put(None)
+        self._thread.join()
+
+        for output in (self.exporter, self.columnar):
+            if output is not None:
+                output.close()
+
+        if self.index is not None:
+            self.index.close(self.length)
+
+        return not self.errors
+
+
+class DownloadManifest:
+    """Verified chunks of one downloaded device file, as json lines.
+
+    The first line holds the serial, source, FID, download folder and the
+    length of the device file (from LISTFILES). Every chunk that passed its
+    crc and was written adds a line with its byte range on the device, the
+    device crc, the bytes held back by the DVL record writer and the sizes
+    of the output files after writing it. A download resumes after the last
+    chunk whose recorded sizes the output files still have (resume_chunk),
+    once DVLDownload has checked that the device file still holds it.
+    """
+
+    def __init__(self, path):
+
+        self.path = Path(path)
+        self.metadata = None
+        self.chunks = list()
+        self.file = None
+
+        if self.path.is_file():
+            with open(self.path) as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line cut short by an interrupted session
+                        break
+                    if self.metadata is None:
+                        self.metadata = entry
+                    else:
+                        self.chunks.append(entry)
+
+    def create(self, **metadata):
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.metadata = metadata
+        self.chunks = list()
+
+        self.file = open(self.path, "w")
+        self.file.write(json.dumps(metadata) + "\n")
+        self.file.flush()
+
+    def _sizes(self):
+
+        return [
+            Path(self.metadata["folder"], name).stat().st_size if name else 0
+            for name in DOWNLOAD_FILES[self.metadata["src"]]
+        ]
+
+    def resumable(self) -> bool:
+
+        if self.metadata is None:
+            return False
+
+        if not all(
+            Path(self.metadata["folder"], name).is_file()
+            for name in DOWNLOAD_FILES[self.metadata["src"]]
+            if name
+        ):
+            return False
+
+        return self._sizes()[0] >= self.metadata["header"]
+
+    def resume_chunk(self):
+        """The last chunk whose recorded sizes the output files still have.
+
+        None if there is no such chunk.
+        """
+
+        size, fail_size = self._sizes()
+
+        for chunk in reversed(self.chunks):
+            if chunk["size"] <= size and chunk["fail_size"] <= fail_size:
+                return chunk
+
+        return None
+
+    def matches(self, length) -> bool:
+        """Whether a device file of length can be the file of this manifest.
+
+        FIDs restart after the device memory is erased; a file shorter than
+        the one downloaded or than the last verified chunk is a new recording.
+        """
+
+        chunk = self.resume_chunk()
+
+        return length >= self.metadata.get("length", 0) and (
+            chunk is None or length >= chunk["end"]
+        )
+
+    def resume_point(self):
+        """Device offset to continue from and the output file sizes at that point."""
+
+        chunk = self.resume_chunk()
+
+        if chunk is not None:
+            return chunk["end"] - chunk["pending"], chunk["size"], chunk["fail_size"]
+
+        # no verified chunk yet: start over after the get_all header
+        return 0, self.metadata["header"], 0
+
+    def add(self, start, end, crc, pending, size, fail_size):
+
+        if self.file is None:
+            self.file = open(self.path, "a")
+
+        chunk = {
+            "start": start,
+            "end": end,
+            "crc": crc,
+            "pending": pending,
+            "size": size,
+            "fail_size": fail_size,
+        }
+        self.chunks.append(chunk)
+
+        self.file.write(json.dumps(chunk) + "\n")
+        self.file.flush()
+
+    def close(self):
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class DVLDownload(Download):
+    """Download with bulk conversion of .nucleus files.
+
+    Downloads are pipelined: the next chunk is requested while the previous
+    one is verified and written on a worker thread (see _download_chunks).
+    With adaptive (the default) chunk lengths and timeouts follow the link
+    quality, see ChunkController; otherwise the fixed PACKET_LENGTH_TCP and
+    PACKET_LENGTH_SERIAL are used.
+    download_dvl_data splits the received data into records with
+    DVLRecordWriter, which avoids copying the buffer for every record, and
+    indexes them in dvl_data.bin.index for dvl_files.DVLRecordIndex.
+
+    Whole-file downloads keep a DownloadManifest per device serial, source
+    and FID under <path>/manifests. With resume (the default) a download of
+    a file seen before continues in the same folder after the last verified
+    chunk, and sync fetches only what LISTFILES shows to be new.
+
+    With decode (e.g. ("csv", "index")), download_nucleus_data decodes the
+    file while it downloads, see StreamDecoder, so it is ready for analysis
+    when the download completes without a second pass over it.
+
+    convert_nucleus_data memory-maps the file and frames packets a chunk at a
+    time instead of feeding the parser one byte per call. The output is the
+    same nucleus_converted folder the driver's converter writes.
+
+    Large files logged to csv are converted by a pool of worker processes
+    (workers, default one per core). The file is split at frame boundaries
+    verified with find_boundary and the results are written in file order,
+    so the output matches a sequential conversion.
+    """
+
+    def __init__(
+        self, chunk_size=MEGABYTE, workers=None, adaptive=True, decode=(), **kwargs
+    ):
+
+        super().__init__(**kwargs)
+
+        # a chunk must be able to hold the largest frame
+        self.chunk_size = max(chunk_size, MAX_PACKAGE_LENGTH)
+        self.workers = workers
+
+        self.adaptive = adaptive
+        self.decode = decode
+        self.chunk_controllers = dict()
+        self.download_sessions = list()
+
+        self.download_statistics = dict()
+        self.download_statistics["bytes"] = 0
+        self.download_statistics["seconds"] = 0.0
+        self.download_statistics["MB/s"] = 0.0
+        self.download_statistics["retries"] = 0
+
+        self.conversion_statistics = dict()
+        self.conversion_statistics["packets"] = 0
+        self.conversion_statistics["failed packets"] = 0
+        self.conversion_statistics["undecoded packets"] = 0
+
+    @staticmethod
+    def _handle_crc(dvl_data: bytes):
+
+        position = _dvl_resync(dvl_data, 0, len(dvl_data))
+
+        return dvl_data[position:], dvl_data[:position]
+
+    def _request_chunk(self, fid, src, sa, length, timeout=3) -> (bool, bytes, int):
+        """Send one DOWNLOAD command and check the format of the reply.
+
+        Returns the status, the data and the crc32 reported by the device. The
+        crc is not verified here.
+        """
+
+        # length of _len number + length of \r\n + length of _len + length of \r\n
+        # + length of crc and \r\n + length of OK\r\n
+        expected_data_length = len(str(length)) + 2 + length + 2 + 10 + 4
+
+        command = (
+            b"DOWNLOAD,FID="
+            + str(fid).encode()
+            + b",SRC="
+            + str(src).encode()
+            + b",SA="
+            + str(sa).encode()
+            + b",LEN="
+            + str(length).encode()
+            + b",CRC=1\r\n"
+        )
+        self.connection.write(command)
+        data = self.connection.read(size=expected_data_length, timeout=timeout)
+        self.commands._check_reply(data=data, terminator=b"OK\r\n", command=command)
+
+        if len(data) != expected_data_length:
+            self.messages.write_warning(
+                "received data from download reply is incorrect length: "
+                f"{len(data)} / {expected_data_length}"
+            )
+            self.connection.reset_buffers()
+            return False, b"", 0
+
+        length_reply = data[: len(str(length)) + 2]
+        data_reply = data[len(str(length)) + 2 : -14]
+        crc_reply = data[-14:-4]
+        ok_reply = data[-4:]
+
+        for name, reply in (
+            ("length", length_reply),
+            ("data", data_reply),
+            ("crc", crc_reply),
+            ("ok", ok_reply),
+        ):
+            if reply[-2:] != b"\r\n":
+                self.messages.write_warning(
+                    f"unexpected format of the {name} reply from download command. "
+                    f"Reply should end with b'\r\n': {reply}"
+                )
+                self.connection.reset_buffers()
+                return False, b"", 0
+
+        try:
+            crc = int(crc_reply[:-2].decode(), 16)
+        except ValueError:
+            self.messages.write_warning(
+                "Unable to convert received crc value to integer. "
+                f"crc value: {crc_reply}"
+            )
+            self.connection.reset_buffers()
+            return False, b"", 0
+
+        return True, data_reply[:-2], crc
+
+    def download_data(self, fid, src, sa, length, timeout=3) -> (bool, bytes):
+
+        status, data, crc = self._request_chunk(
+            fid=fid, src=src, sa=sa, length=length, timeout=timeout
+        )
+        if not status:
+            return False, b""
+
+        return crc32(data) == crc, data
+
+    def _chunk_controller(self) -> "ChunkController":
+
+        connection_type = self.connection.get_connection_type()
+
+        if connection_type not in self.chunk_controllers:
+            if connection_type == "tcp":
+                length, limits = self.PACKET_LENGTH_TCP, CHUNK_LIMITS_TCP
+            else:
+                length, limits = self.PACKET_LENGTH_SERIAL, CHUNK_LIMITS_SERIAL
+
+            if not self.adaptive:
+                limits = (length, length)
+
+            self.chunk_controllers[connection_type] = ChunkController(length, *limits)
+
+        return self.chunk_controllers[connection_type]
+
+    def _download_chunks(self, fid, src, start, end, write, verified=None) -> bool:
+        """Download bytes start to end of a file and pass them to write in order.
+
+        verified(index, data, crc) is called after each chunk is written.
+
+        This thread keeps requesting chunks while a verifier thread checks the
+        crc32 of the previous replies and writes them, so the link is not idle
+        during verification and disk I/O. Chunk lengths and timeouts come from
+        the ChunkController of the connection type. A chunk with a bad reply
+        or crc is requested again, split if the controller has shrunk the
+        chunk length since; after MAX_ATTEMPTS failures of one chunk the
+        download is aborted. Throughput is kept in download_statistics and
+        appended to download_sessions.
+        """
+
+        controller = self._chunk_controller()
+
+        lengths = dict()
+        attempts = dict()
+        backlog = deque()
+        replies = Queue(maxsize=PIPELINE_DEPTH)
+        rejected = Queue()
+        errors = list()
+
+        statistics = self.download_statistics
+        statistics["bytes"] = 0
+        statistics["retries"] = 0
+        statistics["chunks"] = 0
+        statistics["failed chunks"] = 0
+        started = time.monotonic()
+
+        def _verify():
+
+            waiting = dict()
+            written = start
+            percentage_previous = -1
+
+            while written < end:
+
+                reply = replies.get()
+                if reply is None:
+                    return
+
+                index, data, crc = reply
+
+                if crc32(data) != crc:
+                    controller.record(len(data), False)
+                    statistics["failed chunks"] += 1
+                    rejected.put(index)
+                    continue
+
+                controller.record(len(data), True)
+
+                if attempts[index] > 1:
+                    self.messages.write_message(
+                        "successfully received packet at index {}".format(index)
+                    )
+
+                waiting[index] = (data, crc)
+
+                while written in waiting:
+
+                    index = written
+                    data, crc = waiting.pop(index)
+                    written += len(data)
+
+                    if errors:
+                        continue
+
+                    try:
+                        write(data)
+                        if verified is not None:
+                            verified(index, data, crc)
+                    except OSError as exception:
+                        errors.append(exception)
+                        continue
+
+                    statistics["bytes"] += len(data)
+
+                    percentage = statistics["bytes"] * 100 / (end - start)
+                    if percentage > percentage_previous + 1:
+                        if percentage > 99:
+                            percentage = 100
+                        self.progress_bar(percentage, 100)
+                        percentage_previous = int(percentage)
+
+            rejected.put(None)
+
+        def _request(index, length) -> bool:
+
+            while not errors:
+
+                attempts[index] = attempts.get(index, 0) + 1
+
+                if attempts[index] > MAX_ATTEMPTS:
+                    self.messages.write_warning(
+                        "Failed to receive package from download {} consecutive "
+                        "attempts. Aborting download!".format(MAX_ATTEMPTS)
+                    )
+                    return False
+
+                if attempts[index] > 1:
+                    statistics["retries"] += 1
+
+                limit = controller.length
+                if length > limit:
+                    # the link got worse: fetch a shorter piece now and the rest later
+                    backlog.appendleft((index + limit, length - limit))
+                    length = limit
+
+                lengths[index] = length
+                statistics["chunks"] += 1
+
+                requested = time.monotonic()
+                status, data, crc = self._request_chunk(
+                    fid=fid,
+                    src=src,
+                    sa=index,
+                    length=length,
+                    timeout=controller.timeout(length, attempts[index]),
+                )
+
+                if status:
+                    controller.measure(length, time.monotonic() - requested)
+                    replies.put((index, data, crc))
+                    return True
+
+                controller.record(length, False)
+                statistics["failed chunks"] += 1
+                self.messages.write_message(
+                    "Failed to receive packet at index {} on attempt {}. "
+                    "Retrying...".format(index, attempts[index])
+                )
+
+            return False
+
+        def _retry(index) -> bool:
+
+            self.messages.write_message(
+                "Failed crc check of packet at index {} on attempt {}. "
+                "Retrying...".format(index, attempts[index])
+            )
+
+            return _request(index, lengths[index])
+
+        verifier = Thread(target=_verify, daemon=True)
+        verifier.start()
+
+        frontier = start
+        status = True
+
+        while status:
+
+            # chunks rejected by the verifier and split remainders go before new chunks
+            if not rejected.empty():
+                index = rejected.get_nowait()
+            elif backlog:
+                status = _request(*backlog.popleft())
+                continue
+            elif frontier < end:
+                length = min(end - frontier, controller.length)
+                status = _request(frontier, length)
+                frontier += length
+                continue
+            else:
+                index = rejected.get()
+
+            if index is None:
+                break
+
+            status = _retry(index)
+
+        if not status:
+            replies.put(None)
+
+        verifier.join()
+
+        if errors:
+            self.messages.write_warning(
+                "Failed to write downloaded data: {}".format(errors[0])
+            )
+            status = False
+
+        statistics["seconds"] = time.monotonic() - started
+        statistics["MB/s"] = (
+            statistics["bytes"] / MEGABYTE / max(statistics["seconds"], 1e-9)
+        )
+        statistics["chunk length"] = controller.length
+        statistics["byte error rate"] = controller.byte_error_rate
+
+        self.download_sessions.append(
+            dict(
+                statistics,
+                fid=fid,
+                src=src,
+                connection=self.connection.get_connection_type(),
+                status=status,
+            )
+        )
+
+        self.messages.write_message(
+            "Downloaded {:.1f} MB in {:.1f} s ({:.2f} MB/s) over {}, {} retries, "
+            "chunk length {}".format(
+                statistics["bytes"] / MEGABYTE,
+                statistics["seconds"],
+                statistics["MB/s"],
+                self.connection.get_connection_type(),
+                statistics["retries"],
+                controller.length,
+            )
+        )
+
+        return status
+
+    def _list_fids(self, src) -> dict:
+        """FIDs and lengths of the files on the device, from LISTFILES."""
+
+        fids = dict()
+
+        for entry in self.commands.list_files(src=src):
+            if entry == b"OK\r\n":
+                break
+
+            values = dict(
+                item.split(b"=", 1)
+                for item in entry.strip().split(b",")
+                if b"=" in item
+            )
+            try:
+                fids[int(values[b"FID"])] = int(values[b"LEN"])
+            except (KeyError, ValueError):
+                self.messages.write_warning(
+                    "Failed to extract FID and LEN from file list entry {}".format(
+                        entry
+                    )
+                )
+
+        return fids
+
+    def _same_file(self, manifest, fid, src, length):
+        """Whether the device file is still the one manifest was written for.
+
+        The file must be no shorter than before and the last verified chunk
+        is read again and its crc compared with the one stored. Returns None
+        if the chunk could not be read.
+        """
+
+        if not manifest.matches(length):
+            return False
+
+        chunk = manifest.resume_chunk()
+        if chunk is None:
+            return True
+
+        controller = self._chunk_controller()
+        chunk_length = chunk["end"] - chunk["start"]
+
+        # attempts count from 1, as in _download_chunks; the timeout grows with the
+        # attempt
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            status, data, crc = self._request_chunk(
+                fid=fid,
+                src=src,
+                sa=chunk["start"],
+                length=chunk_length,
+                timeout=controller.timeout(chunk_length, attempt),
+            )
+            if status and crc32(data) == crc:
+                return crc == chunk["crc"]
+
+        return None
+
+    def _manifest_path(self, path, src, fid, get_all) -> str:
+
+        match = re.search(rb"SN=(\d+)", get_all)
+        serial = match.group(1).decode() if match else "unknown"
+
+        return "{}/manifests/{}/{}_fid{}.jsonl".format(
+            path.rstrip("/"), serial, SOURCES[src], fid
+        )
+
+    def _download_file(self, src, fid, sa, length, path, resume, decode=()) -> bool:
+
+        if isinstance(decode, str):
+            decode = (decode,)
+
+        def _check_arguments():
+
+            if fid is not None and (not isinstance(fid, int) or fid < 1):
+                self.messages.write_warning(
+                    "fid argument must be a positive integer larger or equal to 1"
+                )
+                return False
+
+            if sa is not None and (not isinstance(sa, int) or sa < 0):
+                self.messages.write_warning(
+                    "sa argument must be a non-negative integer"
+                )
+                return False
+
+            if length is not None and (not isinstance(length, int) or length < 1):
+                self.messages.write_warning(
+                    "length argument must be a positive integer larger or equal to 1"
+                )
+                return False
+
+            if any(output not in DECODE_OUTPUTS for output in decode):
+                self.messages.write_warning(
+                    "decode argument must be a selection of {}".format(
+                        ", ".join(DECODE_OUTPUTS)
+                    )
+                )
+                return False
+
+            return True
+
+        def _download_get_all() -> (bool, bytes):
+
+            for i in range(1, 11):
+                get_all = self.download_get_all_data(download_parameters["fid"])[src]
+
+                if get_all is not None:
+                    break
+
+            else:
+                return False, b""
+
+            return True, get_all
+
+        if not _check_arguments():
+            return False
+
+        status, download_parameters = self.get_download_parameters(
+            src=src, fid=fid, sa=sa, length=length
+        )
+        if not status:
+            return False
+
+        status, get_all = _download_get_all()
+        if not status:
+            return status
+
+        if path is None:
+            path = self._path
+
+        # only whole-file downloads are tracked, so that a manifest always starts at
+        # byte 0
+        manifest = None
+        if sa is None and length is None:
+            manifest = DownloadManifest(
+                self._manifest_path(path, src, download_parameters["fid"], get_all)
+            )
+
+        start = download_parameters["sa"]
+        resumed = resume and manifest is not None and manifest.resumable()
+
+        if resumed:
+            same_file = self._same_file(
+                manifest, download_parameters["fid"], src, download_parameters["end"]
+            )
+
+            if same_file is None:
+                self.messages.write_warning(
+                    "Failed to read back the last downloaded chunk of FID {}. "
+                    "Aborting download!".format(download_parameters["fid"])
+                )
+                return False
+
+            if not same_file:
+                self.messages.write_message(
+                    "FID {} on the device is not the file partially downloaded to {}. "
+                    "Starting over".format(
+                        download_parameters["fid"], manifest.metadata["folder"]
+                    )
+                )
+                resumed = False
+
+        if resumed:
+            file_path = manifest.metadata["folder"]
+            start, size, fail_size = manifest.resume_point()
+
+            if start >= download_parameters["end"]:
+                self.messages.write_message(
+                    "FID {} is up to date in: {}".format(
+                        download_parameters["fid"], file_path
+                    )
+                )
+                return True
+
+            self.messages.write_message(
+                "Resuming download at byte {} to: {}".format(start, file_path)
+            )
+
+        else:
+            file_path = (
+                path.rstrip("/")
+                + "/"
+                + SOURCES[src]
+                + "/"
+                + datetime.now().strftime("%y%m%d_%H%M%S")
+            )
+            Path(file_path).mkdir(parents=True, exist_ok=True)
+
+            self.messages.write_message("Downloading data to: {}".format(file_path))
+
+            if src == 0:
+                with open(file_path + "/get_all.txt", "w") as file:
+                    if get_all[10] == 0x20:
+                        file.writelines(get_all[11:].decode())
+                    else:
+                        file.writelines(get_all[10:].decode())
+
+            size, fail_size = len(get_all), 0
+
+            if manifest is not None:
+                manifest.create(
+                    folder=file_path,
+                    src=src,
+                    fid=download_parameters["fid"],
+                    header=len(get_all),
+                    length=download_parameters["end"],
+                )
+
+        with ExitStack() as stack:
+
+            file, fail_file = (
+                (
+                    stack.enter_context(
+                        open(file_path + "/" + name, "r+b" if resumed else "wb")
+                    )
+                    if name
+                    else None
+                )
+                for name in DOWNLOAD_FILES[src]
+            )
+
+            if resumed:
+                # drop anything written after the last chunk the manifest knows about
+                for output, output_size in ((file, size), (fail_file, fail_size)):
+                    if output is not None:
+                        output.truncate(output_size)
+                        output.seek(output_size)
+            else:
+                file.write(get_all)
+
+            decoder = None
+            index_file = None
+
+            if src == 0:
+                write = file.write
+                pending = None
+
+                if decode:
+                    decoder = StreamDecoder(
+                        file_path + "/" + DOWNLOAD_FILES[src][0],
+                        decode,
+                        existing=size if resumed else 0,
+                    )
+                    if not resumed:
+                        decoder.feed(get_all)
+
+                    def write(data):
+
+                        file.write(data)
+                        decoder.feed(data)
+
+            else:
+                self.dvl_download_statistics["successful bytes"] = 0
+                self.dvl_download_statistics["failed bytes"] = 0
+
+                index_file = (
+                    open_dvl_index(file.name, size=size)
+                    if resumed
+                    else open_dvl_index(file.name, header=len(get_all))
+                )
+                if index_file is not None:
+                    stack.enter_context(index_file)
+
+                writer = DVLRecordWriter(
+                    file, fail_file, self.dvl_download_statistics, index_file
+                )
+                write = writer.write
+                pending = writer.buffer
+
+            def _verified(index, data, crc):
+
+                if manifest is not None:
+                    if index_file is not None:
+                        # the manifest must not get ahead of the record index
+                        index_file.flush()
+                    manifest.add(
+                        index,
+                        index + len(data),
+                        crc,
+                        len(pending) if pending is not None else 0,
+                        file.tell(),
+                        fail_file.tell() if fail_file is not None else 0,
+                    )
+
+            status = self._download_chunks(
+                download_parameters["fid"],
+                src,
+                start,
+                download_parameters["end"],
+                write,
+                verified=_verified,
+            )
+
+            if decoder is not None:
+                file.flush()
+
+                if not decoder.close():
+                    self.messages.write_warning(
+                        "Failed to write decoded data: {}".format(decoder.errors[0])
+                    )
+                    status = False
+
+                for key in self.conversion_statistics:
+                    self.conversion_statistics[key] = decoder.statistics[key]
+
+                self.messages.write_message(
+                    "Decoded {} packets during download. "
+                    "{} packets failed the data checksum".format(
+                        decoder.statistics["packets"],
+                        decoder.statistics["failed packets"],
+                    )
+                )
+
+            if src == 1:
+                self.messages.write_message(
+                    "Downloaded and converted {} bytes of data. "
+                    "{} bytes of data failed conversion due to CRC checks".format(
+                        self.dvl_download_statistics["successful bytes"],
+                        self.dvl_download_statistics["failed bytes"],
+                    )
+                )
+
+        if manifest is not None:
+            manifest.close()
+
+        return status
+
+    def download_dvl_data(
+        self, fid=None, sa=None, length=None, path=None, resume=True
+    ) -> bool:
+
+        return self._download_file(1, fid, sa, length, path, resume)
+
+    def download_nucleus_data(
+        self, fid=None, sa=None, length=None, path=None, resume=True, decode=None
+    ) -> bool:
+
+        return self._download_file(
+            0, fid, sa, length, path, resume, self.decode if decode is None else decode
+        )
+
+    def sync(self, path=None, src=(0, 1)) -> bool:
+        """Download what is new on the device since the last sync.
+
+        Every file listed by LISTFILES for the given sources is downloaded,
+        continuing after the ranges recorded in its manifest, so files that
+        were already fetched completely cost one LISTFILES round trip.
+        """
+
+        status = True
+
+        for source in src:
+            for fid in sorted(self._list_fids(source)):
+                if not self._download_file(
+                    source,
+                    fid,
+                    None,
+                    None,
+                    path,
+                    resume=True,
+                    decode=self.decode if source == 0 else (),
+                ):
+                    status = False
+
+        return status
+
+    def _convert_range(self, buffer, position, end):
+
+        write_packets = self.logger.needs_packets()
+
+        while position < end:
+
+            frames, stop = find_frames(
+                buffer, position, min(position + self.chunk_size, end)
+            )
+
+            for offset, size, valid in frames:
+
+                if not valid:
+                    self.parser.write_condition(
+                        error_message="data checksum failed",
+                        packet=bytearray(buffer[offset : offset + size]),
+                    )
+                    self.conversion_statistics["failed packets"] += 1
+                    continue
+
+                timestamp = datetime.now().timestamp()
+
+                if not write_packets:
+                    self.logger.write_frame(
+                        timestamp, bytes(buffer[offset : offset + size])
+                    )
+                    self.conversion_statistics["packets"] += 1
+                    continue
+
+                try:
+                    packet = dvl_schema.decode_packet(
+                        buffer, offset, timestamp=timestamp
+                    )
+                except struct_error:
+                    # a checksum-valid frame shorter than its layout
+                    packet = None
+
+                if packet is None:
+                    self.messages.write_exception(
+                        "Unable to unpack sensor data. Extraction aborted"
+                    )
+                    self.conversion_statistics["undecoded packets"] += 1
+                    continue
+
+                self.logger.write_packet(packet)
+                self.conversion_statistics["packets"] += 1
+
+            if stop == position:
+                # only an incomplete frame is left at the end of the file
+                break
+
+            position = stop
+            self.progress_bar(position, len(buffer))
+
+        if 0 < position < len(buffer):
+            self.progress_bar(len(buffer), len(buffer))
+
+    def _convert_parallel(self, path, buffer, workers) -> int:
+        """Convert buffer with a process pool.
+
+        Returns the position to continue sequentially from.
+        """
+
+        file_length = len(buffer)
+
+        boundaries = [0]
+        for position in range(PARALLEL_CHUNK_SIZE, file_length, PARALLEL_CHUNK_SIZE):
+            boundary = find_boundary(buffer, position, file_length)
+            if boundaries[-1] < boundary < file_length:
+                boundaries.append(boundary)
+        boundaries.append(file_length)
+
+        chunks = iter(zip(boundaries[:-1], boundaries[1:]))
+        fieldnames = self.logger.packet_writer.fieldnames
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+
+            # keep a bounded number of chunks in flight so results do not pile up in
+            # memory
+            pending = deque()
+            for start, end in chunks:
+                pending.append(
+                    (end, executor.submit(_convert_chunk, path, start, end, fieldnames))
+                )
+                if len(pending) == 2 * workers:
+                    break
+
+            while pending:
+
+                end, future = pending.popleft()
+                text, current_profiles, failed_frames, packets, undecoded, stop = (
+                    future.result()
+                )
+
+                self.logger.packet_file.write(text)
+
+                for packet in current_profiles:
+                    self.logger.write_packet(packet)
+
+                for frame in failed_frames:
+                    self.parser.write_condition(
+                        error_message="data checksum failed", packet=bytearray(frame)
+                    )
+
+                self.conversion_statistics["packets"] += packets
+                self.conversion_statistics["failed packets"] += len(failed_frames)
+                self.conversion_statistics["undecoded packets"] += undecoded
+
+                if stop != end:
+                    # a frame crosses the boundary, so the sequential scan takes over
+                    # from its start
+                    for _, future in pending:
+                        future.cancel()
+                    return stop
+
+                self.progress_bar(stop, file_length)
+
+                for start, end in chunks:
+                    pending.append(
+                        (
+                            end,
+                            executor.submit(
+                                _convert_chunk, path, start, end, fieldnames
+                            ),
+                        )
+                    )
+                    break
+
+        return file_length
+
+    def convert_nucleus_data(self, path, workers=None) -> bool:
+
+        if not Path(path).is_file():
+            self.messages.write_warning("selected file path is not a file")
+            return False
+
+        path_folder = Path(path).parent
+
+        self.logger.set_path(path=str(path_folder) + "/nucleus_converted")
+
+        self.logger.start(_converting=True)
+
+        for key in self.conversion_statistics:
+            self.conversion_statistics[key] = 0
+
+        buffer = open_buffer(path)
+        file_length = len(buffer)
+        started = time.monotonic()
+
+        if workers is None:
+            workers = self.workers if self.workers is not None else os.cpu_count() or 1
+
+        # the workers write csv text directly, so the segments and the database of
+        # the logger would miss their packets
+        parallel = (
+            self.logger.mode == "csv"
+            and not self.logger._segmenting()
+            and self.logger.database is None
+        )
+
+        position = 0
+        if workers > 1 and file_length > 2 * PARALLEL_CHUNK_SIZE and parallel:
+            position = self._convert_parallel(path, buffer, workers)
+
+        self._convert_range(buffer, position, file_length)
+
+        close_buffer(buffer)
+
+        self.logger.stop()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.messages.write_message(
+            "Converted {} packets from {:.1f} MB in {:.1f} s ({:.1f} MB/s). "
+            "{} packets failed the data checksum".format(
+                self.conversion_statistics["packets"],
+                file_length / MEGABYTE,
+                elapsed,
+                file_length / MEGABYTE / elapsed,
+                self.conversion_statistics["failed packets"],
+            )
+        )
+
+        if self.conversion_statistics["undecoded packets"]:
+            self.messages.write_warning(
+                "{} packets had no known layout or were too short to decode "
+                "and were skipped".format(
+                    self.conversion_statistics["undecoded packets"]
+                )
+            )
+
+        return True
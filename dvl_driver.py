@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+from struct import error as struct_error
+
+from nucleus_driver import NucleusDriver
+from nucleus_driver._parser import Parser
+
+from dvl_download import DVLDownload
+from dvl_logging import AsyncLogger
+import dvl_schema
+
+
+class SchemaParser(Parser):
+    """Parser decoding packets with the precompiled layouts from dvl_schema.
+
+    Callbacks added with add_callback are called with every decoded packet
+    of their packet id, on the parser thread, as soon as it is decoded.
+    """
+
+    def __init__(self, **kwargs):
+
+        super().__init__(**kwargs)
+
+        # packet id (None: every packet) -> tuple of callbacks, replaced rather than
+        # changed so the parser thread needs no lock
+        self._callbacks = dict()
+        self.failed_packets = 0  # frames that failed a checksum
+
+    def add_callback(self, callback, packet_id=None):
+        """Call callback(packet) for every decoded packet with packet_id.
+
+        With packet_id None the callback gets every packet. Callbacks run on
+        the parser thread and delay the packets behind them, so they should
+        return quickly (see DVLReader for a dispatch thread).
+        """
+
+        callbacks = dict(self._callbacks)
+        callbacks[packet_id] = callbacks.get(packet_id, ()) + (callback,)
+        self._callbacks = callbacks
+
+    def remove_callback(self, callback, packet_id=None):
+
+        callbacks = dict(self._callbacks)
+        remaining = tuple(
+            registered
+            for registered in callbacks.get(packet_id, ())
+            if registered != callback
+        )
+        if remaining:
+            callbacks[packet_id] = remaining
+        else:
+            callbacks.pop(packet_id, None)
+        self._callbacks = callbacks
+
+    def _dispatch(self, callbacks, packet):
+
+        for callback in callbacks:
+            try:
+                callback(packet)
+            except Exception as exception:
+                self.messages.write_exception(f"Packet callback failed: {exception!r}")
+
+    @staticmethod
+    def checksum(packet):
+
+        return dvl_schema.checksum(packet)
+
+    def write_packet(self, packet):
+
+        if self._queuing["packet"] is True:
+
+            if self.packet_queue.full():
+                self.packet_queue.get_nowait()
+
+            self.packet_queue.put_nowait(packet)
+
+        if self.logger._logging is True and self.logger.needs_packets():
+            self.logger.write_packet(packet)
+
+        callbacks = self._callbacks
+        if callbacks:
+            self._dispatch(callbacks.get(packet["id"], ()), packet)
+            self._dispatch(callbacks.get(None, ()), packet)
+
+    def write_ascii(self, packet):
+
+        timestamp = datetime.now().timestamp()
+
+        if self._queuing["ascii"] is True:
+
+            if self.ascii_queue.full():
+                self.ascii_queue.get_nowait()
+
+            self.ascii_queue.put_nowait(
+                {"timestamp_python": timestamp, "bytes": bytes(packet)}
+            )
+
+        if self.logger._logging is True:
+            self.logger.write_ascii(timestamp, bytes(packet))
+
+    def write_condition(self, error_message, packet):
+
+        self.failed_packets += 1
+
+        failed_packet = {
+            "timestamp_python": datetime.now().timestamp(),
+            "error_message": error_message,
+            "failed_packet": packet,
+        }
+
+        if self._queuing["condition"] is True:
+
+            if self.condition_queue.full():
+                self.condition_queue.get_nowait()
+
+            self.condition_queue.put_nowait(failed_packet)
+
+        if self.logger._logging is True:
+            self.logger.write_condition(failed_packet)
+
+    def add_binary_packet(self, binary_packet, ascii_packet):
+
+        logging = self.logger._logging is True
+        decode = (
+            self._queuing["packet"] is True
+            or bool(self._callbacks)
+            or (logging and self.logger.needs_packets())
+        )
+
+        header_checksum, data_checksum, packet = self.get_packet(
+            binary_packet, decode=decode
+        )
+
+        if header_checksum:
+            if data_checksum:
+
+                self.update_is_steaming(packet["id"])
+
+                if logging and not self.logger.needs_packets():
+                    self.logger.write_frame(
+                        datetime.now().timestamp(),
+                        bytes(binary_packet[: packet["size"]]),
+                    )
+
+                if decode:
+                    self.write_packet(packet)
+
+            else:
+                self.write_condition(
+                    error_message="data checksum failed", packet=binary_packet
+                )
+
+            binary_packet = binary_packet[packet["sizeHeader"] + packet["sizeData"] :]
+            reading_packet = len(binary_packet) != 0
+
+        elif 0xA5 in binary_packet[1:]:
+            start_index = binary_packet.index(0xA5, 1)
+            ascii_packet.extend(binary_packet[:start_index])
+            binary_packet = binary_packet[start_index:]
+            reading_packet = True
+
+        else:
+            self.write_condition(
+                error_message="header checksum failed", packet=binary_packet
+            )
+            reading_packet = False
+            binary_packet = bytearray()
+
+        return binary_packet, ascii_packet, reading_packet
+
+    def get_packet(self, binary_packet, decode=True):
+
+        header_checksum = False
+        data_checksum = False
+        packet = dict()
+
+        if not isinstance(binary_packet, bytearray):
+            self.messages.write_exception("packet is not bytearray. Extraction aborted")
+            return header_checksum, data_checksum, packet
+
+        if len(binary_packet) < binary_packet[1]:
+            self.messages.write_exception(
+                "Packet is smaller than specified header length. Extraction aborted"
+            )
+            return header_checksum, data_checksum, packet
+
+        try:
+            header_data = dvl_schema.decode_header(binary_packet)
+        except struct_error:
+            self.messages.write_warning(
+                f"Failed to unpack header data: {binary_packet}"
+            )
+            return header_checksum, data_checksum, packet
+
+        size_header = header_data["sizeHeader"]
+        size = header_data["size"]
+
+        if (
+            dvl_schema.checksum(binary_packet, 0, size_header - 2)
+            != header_data["headerCheckSum"]
+        ):
+            self.messages.write_exception(
+                "Header did not pass checksum. Extraction aborted"
+            )
+            return header_checksum, data_checksum, packet
+
+        header_checksum = True
+        packet.update(header_data)
+
+        if len(binary_packet) < size:
+            self.messages.write_exception(
+                "Packet is smaller than specified header and data length. "
+                "Extraction aborted"
+            )
+            return header_checksum, data_checksum, packet
+
+        if (
+            dvl_schema.checksum(binary_packet, size_header, size)
+            != header_data["dataCheckSum"]
+        ):
+            self.messages.write_exception(
+                "Packet did not pass checksum. Extraction aborted"
+            )
+            return header_checksum, data_checksum, packet
+
+        data_checksum = True
+
+        if not decode:
+            return header_checksum, data_checksum, packet
+
+        data = binary_packet[size_header:size]
+
+        if header_data["id"] != self.ID_ASCII:
+            try:
+                packet.update(dvl_schema.decode_common(data))
+            except struct_error:
+                self.messages.write_warning(f"Failed to unpack common data: {data}")
+                return header_checksum, False, packet
+
+        packet["timestampPython"] = datetime.now().timestamp()
+
+        try:
+            sensor_data = dvl_schema.decode_sensor(
+                header_data["family"],
+                header_data["id"],
+                packet.get("version"),
+                data,
+                packet.get("offsetOfData", 0),
+            )
+        except struct_error:
+            self.messages.write_warning("Failed to unpack sensor data")
+            self.messages.write_warning(data)
+            sensor_data = None
+
+        if sensor_data is None:
+            self.messages.write_exception(
+                "Unable to unpack sensor data. Extraction aborted"
+            )
+            return header_checksum, data_checksum, packet
+
+        packet.update(sensor_data)
+
+        return header_checksum, data_checksum, packet
+
+
+class DVLDriver(NucleusDriver):
+    """NucleusDriver with the parser and logger of this repository installed.
+
+    Keyword arguments configure the AsyncLogger (queue_size, flush_interval,
+    batch_size, policy, block_timeout).
+    """
+
+    def __init__(self, **logger_options):
+
+        super().__init__()
+
+        self.logger = AsyncLogger(
+            messages=self.messages, connection=self.connection, **logger_options
+        )
+        self.parser = SchemaParser(
+            messages=self.messages, logger=self.logger, connection=self.connection
+        )
+        self.download = DVLDownload(
+            messages=self.messages,
+            connection=self.connection,
+            commands=self.commands,
+            parser=self.parser,
+            logger=self.logger,
+        )
+        self._link()
+
+    def _link(self):
+
+        self.commands.parser = self.parser
+        self.download.parser = self.parser
+        self.download.logger = self.logger
+        self.connection.parser = self.parser
+        self.logger.commands = self.commands
+        self.logger.parser = self.parser
+
+    def sync_data(self, path=None):
+        """Download everything new on the device since the last sync.
+
+        See DVLDownload.sync.
+        """
+
+        if not self.parser.set_thread_lock():
+            self.messages.write_warning("Failed to set thread lock before data sync")
+            return False
+
+        status = self.download.sync(path=path)
+
+        if not self.parser.reset_thread_lock():
+            self.messages.write_warning("Failed to reset thread lock after data sync")
+
+        return status
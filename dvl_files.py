@@ -0,0 +1,1417 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import lzma
+import mmap
+import os
+from binascii import crc32
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from struct import Struct
+from struct import error as struct_error
+
+import dvl_schema
+from dvl_database import PacketDatabase
+from dvl_logging import (
+    COLUMNS_MANIFEST_FILE,
+    NPY_TYPES,
+    RAW_LOG_FILE,
+    RAW_TIME_ENTRY,
+    SEGMENTS_INDEX_FILE,
+    ColumnarWriter,
+    PacketCsvWriter,
+)
+
+MAX_PACKAGE_LENGTH = 7000
+READ_CHUNK_SIZE = 1024 * 1024
+
+INDEX_MAGIC = b"NIDX"
+INDEX_HEADER = Struct("<4sIQ")  # magic, version, size of the indexed file
+INDEX_ENTRY = Struct("<QHBBd")  # offset, size, family, id, device time
+INDEX_VERSION = 1
+
+DVL_INDEX_MAGIC = b"DIDX"
+DVL_INDEX_HEADER = Struct("<4sIQ")  # magic, version, offset of the first record
+DVL_INDEX_ENTRY = Struct("<QII")  # offset, length, crc32
+DVL_INDEX_VERSION = 1
+DVL_VERIFY_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def find_frames(buffer, start=0, end=None):
+    """Locate Nucleus frames in buffer[start:end].
+
+    Returns a list of (offset, size, valid) and the position where scanning
+    stopped: either end or the start of a frame that is not complete yet.
+    valid is False for frames whose header passed but data checksum failed.
+    Bytes that are not part of a frame with a valid header are skipped.
+    """
+
+    if end is None:
+        end = len(buffer)
+
+    frames = list()
+    checksum = dvl_schema.checksum
+    position = start
+
+    while True:
+        position = buffer.find(b"\xa5", position, end)
+        if position < 0:
+            return frames, end
+
+        if end - position < dvl_schema.HEADER_SIZE:
+            return frames, position
+
+        size_header = buffer[position + 1]
+        if size_header < dvl_schema.HEADER_SIZE:
+            position += 1
+            continue
+
+        # a header running past end is checked once more data arrives (or is a
+        # truncated tail)
+        if end - position < size_header:
+            return frames, position
+
+        if checksum(buffer, position, position + size_header - 2) != int.from_bytes(
+            buffer[position + size_header - 2 : position + size_header], "little"
+        ):
+            position += 1
+            continue
+
+        size = size_header + int.from_bytes(
+            buffer[position + 4 : position + 6], "little"
+        )
+        if size > MAX_PACKAGE_LENGTH:
+            position += 1
+            continue
+
+        if end - position < size:
+            return frames, position
+
+        valid = checksum(
+            buffer, position + size_header, position + size
+        ) == int.from_bytes(buffer[position + 6 : position + 8], "little")
+        frames.append((position, size, valid))
+        position += size
+
+
+def find_boundary(buffer, position, end=None, chain=8):
+    """First frame start at or after position that a sequential scan would also reach.
+
+    A candidate 0xA5 is accepted when it starts a chain of frames with valid
+    header checksums, each starting where the previous one ends, that is
+    chain frames long or runs to the end of the buffer. This rules out sync
+    bytes and headers that happen to occur inside packet data. Returns end
+    when no boundary is found.
+    """
+
+    if end is None:
+        end = len(buffer)
+
+    while True:
+        position = buffer.find(b"\xa5", position, end)
+        if position < 0:
+            return end
+
+        frames, stop = find_frames(
+            buffer, position, min(end, position + chain * MAX_PACKAGE_LENGTH)
+        )
+        if (
+            frames
+            and frames[0][0] == position
+            and all(
+                frames[k][0] + frames[k][1] == frames[k + 1][0]
+                for k in range(min(len(frames), chain) - 1)
+            )
+        ):
+            if len(frames) >= chain or frames[-1][0] + frames[-1][1] == end:
+                return position
+
+        position += 1
+
+
+class FrameAssembler:
+    """Frames a byte stream that arrives in pieces, e.g. from a download.
+
+    feed appends data and returns the complete frames as (offset, size,
+    valid) into buffer, which holds the bytes from file position offset on.
+    Bytes of an incomplete frame are kept for the next feed; the frames
+    returned stay valid until then.
+    """
+
+    def __init__(self, offset=0):
+
+        self.buffer = bytearray()
+        self.offset = offset
+        self._stop = 0
+
+    def feed(self, data):
+
+        del self.buffer[: self._stop]
+        self.offset += self._stop
+
+        self.buffer += data
+
+        frames, self._stop = find_frames(self.buffer)
+
+        return frames
+
+
+def open_input(path):
+
+    path = Path(path)
+
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+
+    if path.suffix == ".xz":
+        return lzma.open(path, "rb")
+
+    return open(path, "rb")
+
+
+def read_bytes(path):
+
+    path = Path(path)
+
+    if path.suffix == ".gz":
+        with gzip.open(path, "rb") as file:
+            return file.read()
+
+    if path.suffix == ".xz":
+        with lzma.open(path, "rb") as file:
+            return file.read()
+
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def open_buffer(path):
+    """Read-only buffer over a raw log or .nucleus file.
+
+    Plain files are memory-mapped; compressed segments (.gz, .xz) are
+    decompressed into memory. Close the result with close_buffer.
+    """
+
+    path = Path(path)
+
+    if path.suffix in (".gz", ".xz"):
+        return read_bytes(path)
+
+    if path.stat().st_size == 0:
+        return b""
+
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def close_buffer(buffer):
+
+    if isinstance(buffer, mmap.mmap):
+        buffer.close()
+
+
+def times_path(path):
+    """Path of the host time sidecar belonging to a raw log file."""
+
+    path = Path(path)
+    compression = path.suffix if path.suffix in (".gz", ".xz") else ""
+    stem = Path(path.name[: len(path.name) - len(compression)])
+
+    return path.parent / (stem.with_suffix(".times").name + compression)
+
+
+def read_raw_times(path):
+    """Map frame offset to host receive time from a nucleus_log.times file."""
+
+    times = dict()
+
+    if not Path(path).is_file():
+        return times
+
+    data = read_bytes(path)
+
+    for offset, timestamp in RAW_TIME_ENTRY.iter_unpack(
+        data[: len(data) - len(data) % RAW_TIME_ENTRY.size]
+    ):
+        times[offset] = timestamp
+
+    return times
+
+
+def _iter_raw_times(path):
+
+    if not Path(path).is_file():
+        return
+
+    with open_input(path) as file:
+        while True:
+            data = file.read(RAW_TIME_ENTRY.size * 4096)
+            if len(data) < RAW_TIME_ENTRY.size:
+                return
+            yield from RAW_TIME_ENTRY.iter_unpack(
+                data[: len(data) - len(data) % RAW_TIME_ENTRY.size]
+            )
+
+
+def _iter_raw_packets(path):
+
+    times = _iter_raw_times(times_path(path))
+    time_offset, host_time = next(times, (None, None))
+
+    assembler = FrameAssembler()
+
+    with open_input(path) as file:
+        while True:
+            data = file.read(READ_CHUNK_SIZE)
+
+            for offset, size, valid in assembler.feed(data):
+                if not valid:
+                    continue
+
+                while (
+                    time_offset is not None and time_offset < assembler.offset + offset
+                ):
+                    time_offset, host_time = next(times, (None, None))
+
+                try:
+                    packet = dvl_schema.decode_packet(
+                        assembler.buffer,
+                        offset,
+                        timestamp=(
+                            host_time
+                            if time_offset == assembler.offset + offset
+                            else None
+                        ),
+                    )
+                except struct_error:
+                    continue
+
+                if packet is not None:
+                    yield packet
+
+            if not data:
+                return
+
+
+def _csv_value(value):
+
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+
+    if value in ("True", "False"):
+        return value == "True"
+
+    return value
+
+
+def _iter_csv_packets(path):
+
+    with io.TextIOWrapper(open_input(path), newline="") as file:
+        for row in csv.DictReader(file):
+            yield {
+                name: _csv_value(value)
+                for name, value in row.items()
+                if value != "" and name is not None
+            }
+
+
+def iter_packets(path, ids=None, start=None, end=None):
+    """Yield the packets of a .nucleus file, raw log or nucleus_log.csv one at a time.
+
+    path may also be a log folder, in which case its raw log is read if
+    present and its nucleus_log.csv otherwise. ids limits the output to
+    those packet ids; start and end limit it to a device time range in
+    POSIX seconds, which drops packets without a device time. Nothing is
+    written and memory use does not grow with the file size.
+
+    Packets from .nucleus files are decoded as the parser would decode them,
+    with timestampPython taken from the raw log's .times sidecar when present.
+    csv rows give the columns that have a value, converted to int, float or
+    bool where possible.
+    """
+
+    path = Path(path)
+    if path.is_dir():
+        path = (
+            path / RAW_LOG_FILE
+            if (path / RAW_LOG_FILE).is_file()
+            else path / "nucleus_log.csv"
+        )
+
+    if ids is not None:
+        ids = {int(packet_id) for packet_id in ids}
+
+    packets = (
+        _iter_csv_packets(path) if ".csv" in path.suffixes else _iter_raw_packets(path)
+    )
+
+    for packet in packets:
+
+        if ids is not None and packet.get("id") not in ids:
+            continue
+
+        if start is not None or end is not None:
+            if "timeStamp" not in packet:
+                continue
+            device_time = packet["timeStamp"] + packet.get("microSeconds", 0) * 1e-6
+            if (start is not None and device_time < start) or (
+                end is not None and device_time > end
+            ):
+                continue
+
+        yield packet
+
+
+def iter_columns(path, ids=None, start=None, end=None, batch_size=10000):
+    """Like iter_packets, but yield (layout name, {field: list of values}) batches.
+
+    Packets are grouped by layout; a batch is yielded when it holds batch_size
+    packets, and the remaining partial batches at the end.
+    """
+
+    batches = defaultdict(lambda: defaultdict(list))
+    counts = defaultdict(int)
+
+    for packet in iter_packets(path, ids=ids, start=start, end=end):
+
+        key = dvl_schema.layout_key(
+            packet.get("family"), packet.get("id"), packet.get("version")
+        )
+        name = dvl_schema.layout_name(key) if key is not None else "unknown"
+        batch = batches[name]
+        for field, value in packet.items():
+            batch[field].append(value)
+        counts[name] += 1
+
+        if counts[name] == batch_size:
+            yield name, dict(batches.pop(name))
+            counts[name] = 0
+
+    for name, batch in batches.items():
+        yield name, dict(batch)
+
+
+class CsvExporter:
+    """Writes decoded packets to csv in the nucleus_log.csv format.
+
+    Current profile packets go to current_profile_log.csv in the same folder,
+    which is created with the first one, as in the Logger format.
+    """
+
+    def __init__(self, output_folder, name="nucleus_log.csv"):
+
+        self.output_folder = Path(output_folder)
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+
+        self.packet_file = open(self.output_folder / name, "w", newline="")
+        self.packet_writer = PacketCsvWriter(
+            self.packet_file,
+            fieldnames=dvl_schema.merged_field_names(),
+            extrasaction="ignore",
+        )
+        self.packet_writer.writeheader()
+
+        self.current_profile_file = None
+        self.current_profile_writer = None
+
+    def write(self, packet):
+
+        if packet["id"] == dvl_schema.DataID.CURRENT_PROFILE:
+            if self.current_profile_writer is None:
+                self.current_profile_file = open(
+                    self.output_folder / "current_profile_log.csv", "w", newline=""
+                )
+                self.current_profile_writer = csv.DictWriter(
+                    self.current_profile_file,
+                    fieldnames=list(packet.keys()),
+                    extrasaction="ignore",
+                )
+                self.current_profile_writer.writeheader()
+            self.current_profile_writer.writerow(packet)
+        else:
+            self.packet_writer.writerow(packet)
+
+    def close(self):
+
+        self.packet_file.close()
+
+        if self.current_profile_file is not None:
+            self.current_profile_file.close()
+
+
+def export_csv(path, output_folder=None):
+    """Convert a raw log (or any .nucleus file) to csv in the nucleus_log.csv format.
+
+    The csv is named after the input, e.g. nucleus_log_0003.nucleus.gz becomes
+    nucleus_log_0003.csv.
+    Host receive times are taken from the nucleus_log.times sidecar when it is
+    present. Current profile packets go to current_profile_log.csv as in the
+    Logger format. Returns the number of packets written.
+    """
+
+    path = Path(path)
+    if path.is_dir():
+        path = path / RAW_LOG_FILE
+
+    output_folder = Path(output_folder) if output_folder is not None else path.parent
+
+    exporter = CsvExporter(
+        output_folder, name=times_path(path).name.split(".")[0] + ".csv"
+    )
+
+    # streamed in READ_CHUNK_SIZE pieces, so memory does not grow with the file
+    written = 0
+    for packet in _iter_raw_packets(path):
+        exporter.write(packet)
+        written += 1
+
+    exporter.close()
+
+    return written
+
+
+def _csv_float(value):
+
+    return float(value) if value else float("nan")
+
+
+def _csv_bool(value):
+
+    return value == "True"
+
+
+def _csv_record_plan(header, key):
+    """(name, column, converter) for the record fields of a layout.
+
+    None if the csv lacks one of them.
+    """
+
+    columns = {name: index for index, name in enumerate(header)}
+
+    plan = list()
+    for name, numpy_type in dvl_schema.RECORD_FIELDS[key]:
+        if name not in columns:
+            return None
+        plan.append(
+            (
+                name,
+                columns[name],
+                (
+                    _csv_bool
+                    if numpy_type == "?"
+                    else _csv_float if numpy_type[0] == "f" else int
+                ),
+            )
+        )
+
+    return plan
+
+
+def _export_csv_columnar(path, writer):
+    """Stream a nucleus_log.csv into writer, one pass over the rows.
+
+    Each row is split by family, id and version and only the record fields
+    of its layout are converted, with the type the layout gives them.
+    Returns the number of packets written and of rows skipped.
+    """
+
+    written = 0
+    skipped = 0
+    plans = dict()
+
+    with io.TextIOWrapper(open_input(path), newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return written, skipped
+
+        family_column, id_column, version_column = (
+            header.index(name) for name in ("family", "id", "version")
+        )
+
+        for row in reader:
+
+            group = (row[family_column], row[id_column], row[version_column])
+
+            plan = plans.get(group, False)
+            if plan is False:
+                key = None
+                try:
+                    key = dvl_schema.layout_key(
+                        int(group[0]),
+                        int(group[1]),
+                        int(group[2]) if group[2] else None,
+                    )
+                except ValueError:
+                    pass
+                plan = (
+                    _csv_record_plan(header, key)
+                    if key is not None and dvl_schema.RECORD_FIELDS[key] is not None
+                    else None
+                )
+                plans[group] = plan
+
+            if plan is None:
+                skipped += 1
+                continue
+
+            try:
+                packet = {name: convert(row[column]) for name, column, convert in plan}
+            except (ValueError, IndexError):
+                skipped += 1
+                continue
+
+            writer.write(packet)
+            written += 1
+
+    return written, skipped
+
+
+def export_columnar(path, output_folder=None):
+    """Convert a raw log, .nucleus file or nucleus_log.csv to per layout .npy files.
+
+    A manifest.json describes the files. A log folder is read from its raw
+    log if present and its nucleus_log.csv otherwise, so archives of csv
+    logs can be converted once and then opened with load_columns. csv input
+    is streamed in one pass; rows of layouts without fixed-width records or
+    with missing values are skipped. Current profile, ASCII and other
+    variable-length packets are skipped. Returns the number of packets
+    written.
+    """
+
+    path = Path(path)
+    if path.is_dir():
+        path = (
+            path / RAW_LOG_FILE
+            if (path / RAW_LOG_FILE).is_file()
+            else path / "nucleus_log.csv"
+        )
+
+    output_folder = Path(output_folder) if output_folder is not None else path.parent
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    writer = ColumnarWriter(output_folder)
+
+    if path.suffix == ".csv":
+        written, _ = _export_csv_columnar(path, writer)
+        writer.close()
+        return written
+
+    written = 0
+    for packet in _iter_raw_packets(path):
+        if writer.write(packet):
+            written += 1
+
+    writer.close()
+
+    return written
+
+
+class _ArrayCollector:
+    """Writer for _export_csv_columnar that keeps the records in memory, per layout."""
+
+    def __init__(self):
+
+        self.rows = defaultdict(list)
+
+    def write(self, packet):
+
+        key = dvl_schema.layout_key(packet["family"], packet["id"], packet["version"])
+        self.rows[key].append(tuple(packet.values()))
+
+        return True
+
+    def arrays(self):
+
+        import numpy as np
+
+        return {
+            dvl_schema.layout_name(key): np.array(rows, dtype=dvl_schema.DTYPES[key])
+            for key, rows in self.rows.items()
+        }
+
+
+def _select_rows(array, ids=None, start=None, end=None):
+
+    import numpy as np
+
+    mask = np.ones(len(array), dtype=bool)
+
+    if ids is not None:
+        mask &= np.isin(array["id"], [int(packet_id) for packet_id in ids])
+
+    if start is not None or end is not None:
+        device_time = array["timeStamp"] + array["microSeconds"] * 1e-6
+        if start is not None:
+            mask &= device_time >= start
+        if end is not None:
+            mask &= device_time <= end
+
+    return array if mask.all() else array[mask]
+
+
+def _source_arrays(kind, source, ids=None, start=None, end=None):
+
+    if kind == "columnar":
+        return {
+            name: _select_rows(array, ids, start, end)
+            for name, array in load_columns(source).items()
+        }
+
+    if ".csv" in source.suffixes:
+        collector = _ArrayCollector()
+        _export_csv_columnar(source, collector)
+        return {
+            name: _select_rows(array, ids, start, end)
+            for name, array in collector.arrays().items()
+        }
+
+    with PacketIndex(source) as index:
+        return index.arrays(ids=ids, start=start, end=end)
+
+
+def load_arrays(path, ids=None, start=None, end=None):
+    """Decode the packets of a log into NumPy structured arrays per layout name.
+
+    .nucleus files and raw logs are located with the PacketIndex sidecar
+    (built on first use) and decoded in bulk, see PacketIndex.arrays.
+    nucleus_log.csv files are converted in one pass as export_columnar would
+    and columnar logs are memory-mapped with load_columns. A folder is read
+    from its log_sources, so segmented logs and download folders work as
+    well; the arrays of all sources are concatenated in order. Variable-length
+    packets (current profile, ASCII) are not included. Raises ValueError for
+    a folder without packet logs.
+    """
+
+    import numpy as np
+
+    sources = log_sources(path)
+    if not sources:
+        raise ValueError("no packet log in {}".format(path))
+
+    parts = defaultdict(list)
+    for kind, source in sources:
+        for name, array in _source_arrays(kind, Path(source), ids, start, end).items():
+            if len(array):
+                parts[name].append(array)
+
+    return {
+        name: arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+        for name, arrays in parts.items()
+    }
+
+
+def load_columns(folder, names=None):
+    """Memory-map the .npy files of a columnar log as NumPy structured arrays.
+
+    Returns a dict of layout name to array. The record count is taken from the
+    file size, so files of a logger that did not stop cleanly load as well.
+    """
+
+    import numpy as np
+
+    folder = Path(folder)
+    with open(folder / COLUMNS_MANIFEST_FILE) as file:
+        manifest = json.load(file)
+
+    columns = dict()
+    for name, entry in manifest["files"].items():
+        if names is not None and name not in names:
+            continue
+
+        path = folder / entry["file"]
+        with open(path, "rb") as file:
+            prefix = file.read(10)
+        header_size = 10 + int.from_bytes(prefix[8:10], "little")
+
+        dtype = np.dtype(
+            [(field, NPY_TYPES[numpy_type]) for field, numpy_type in entry["fields"]]
+        )
+        count = (path.stat().st_size - header_size) // dtype.itemsize
+
+        columns[name] = (
+            np.memmap(path, dtype=dtype, mode="r", offset=header_size, shape=(count,))
+            if count
+            else np.empty(0, dtype=dtype)
+        )
+
+    return columns
+
+
+def index_path(path):
+    """Path of the packet index sidecar belonging to a .nucleus or raw log file."""
+
+    path = Path(path)
+
+    return path.parent / (path.name + ".index")
+
+
+class IndexWriter:
+    """Writes a packet index sidecar frame by frame.
+
+    The header records the size of the indexed file, which is only known
+    when the writer is closed; until then it holds zero, so a PacketIndex
+    opened on an unfinished index rebuilds it.
+    """
+
+    def __init__(self, path):
+
+        self.file = open(index_path(path), "wb")
+        self.file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0))
+        self.entries = 0
+
+    def write(self, buffer, offset, size, file_offset=None):
+        """Add the valid frame at buffer[offset:offset + size].
+
+        file_offset is where the frame was found in the file (default offset).
+        """
+
+        size_header = buffer[offset + 1]
+        device_time = float("nan")
+        if buffer[offset + 2] != dvl_schema.DataID.ASCII and size >= size_header + 12:
+            device_time = (
+                int.from_bytes(
+                    buffer[offset + size_header + 4 : offset + size_header + 8],
+                    "little",
+                )
+                + int.from_bytes(
+                    buffer[offset + size_header + 8 : offset + size_header + 12],
+                    "little",
+                )
+                * 1e-6
+            )
+
+        self.file.write(
+            INDEX_ENTRY.pack(
+                offset if file_offset is None else file_offset,
+                size,
+                buffer[offset + 3],
+                buffer[offset + 2],
+                device_time,
+            )
+        )
+        self.entries += 1
+
+    def close(self, file_length):
+
+        self.file.seek(0)
+        self.file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, file_length))
+        self.file.close()
+
+
+def build_index(path):
+    """Write the packet index sidecar of a .nucleus or raw log file.
+
+    The index holds one INDEX_ENTRY per frame that passed its checksums:
+    offset and size in the file, family, id and device time in POSIX seconds
+    (NaN for ASCII frames). Returns the number of entries.
+    """
+
+    path = Path(path)
+    buffer = open_buffer(path)
+    file_length = len(buffer)
+
+    writer = IndexWriter(path)
+    position = 0
+
+    while position < file_length:
+
+        frames, stop = find_frames(
+            buffer, position, min(position + READ_CHUNK_SIZE, file_length)
+        )
+
+        for offset, size, valid in frames:
+            if valid:
+                writer.write(buffer, offset, size)
+
+        if stop == position:
+            break
+        position = stop
+
+    writer.close(file_length)
+    close_buffer(buffer)
+
+    return writer.entries
+
+
+class PacketIndex:
+    """Random access to the packets of a .nucleus or raw log file.
+
+    The index sidecar is built on first use and rebuilt when the file size no
+    longer matches. Both the file and the index are memory-mapped: select
+    finds entries by id and device time range, frame returns a memoryview
+    of a frame without copying and packet decodes one. NumPy is required.
+
+        with PacketIndex("nucleus_data.nucleus") as index:
+            for packet in index.packets([DataID.BOTTOM_TRACK], start=t0, end=t0 + 60):
+                ...
+    """
+
+    def __init__(self, path, rebuild=False):
+
+        import numpy as np
+
+        self.path = Path(path)
+        self.buffer = open_buffer(self.path)
+
+        header = b""
+        if index_path(self.path).is_file():
+            with open(index_path(self.path), "rb") as file:
+                header = file.read(INDEX_HEADER.size)
+
+        if (
+            rebuild
+            or len(header) != INDEX_HEADER.size
+            or INDEX_HEADER.unpack(header)
+            != (INDEX_MAGIC, INDEX_VERSION, len(self.buffer))
+        ):
+            build_index(self.path)
+
+        dtype = np.dtype(
+            [
+                ("offset", "<u8"),
+                ("size", "<u2"),
+                ("family", "u1"),
+                ("id", "u1"),
+                ("time", "<f8"),
+            ]
+        )
+        count = (
+            index_path(self.path).stat().st_size - INDEX_HEADER.size
+        ) // dtype.itemsize
+
+        self.entries = (
+            np.memmap(
+                index_path(self.path),
+                dtype=dtype,
+                mode="r",
+                offset=INDEX_HEADER.size,
+                shape=(count,),
+            )
+            if count
+            else np.empty(0, dtype=dtype)
+        )
+        self._view = memoryview(self.buffer)
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exception):
+
+        self.close()
+
+    def close(self):
+
+        self._view.release()
+        self.entries = None
+        close_buffer(self.buffer)
+
+    def select(self, ids=None, start=None, end=None):
+        """Positions of the entries matching the packet ids and device time range."""
+
+        import numpy as np
+
+        mask = np.ones(len(self.entries), dtype=bool)
+
+        if ids is not None:
+            mask &= np.isin(self.entries["id"], [int(packet_id) for packet_id in ids])
+
+        if start is not None:
+            mask &= self.entries["time"] >= start
+
+        if end is not None:
+            mask &= self.entries["time"] <= end
+
+        return np.flatnonzero(mask)
+
+    def frame(self, position):
+        """The bytes of entry position's frame, as a memoryview into the file.
+
+        Release the view before closing the index.
+        """
+
+        entry = self.entries[position]
+
+        return self._view[
+            int(entry["offset"]) : int(entry["offset"]) + int(entry["size"])
+        ]
+
+    def packet(self, position, timestamp=None):
+
+        return dvl_schema.decode_packet(
+            self.buffer, int(self.entries[position]["offset"]), timestamp=timestamp
+        )
+
+    def packets(self, ids=None, start=None, end=None):
+
+        for position in self.select(ids=ids, start=start, end=end):
+            packet = self.packet(position)
+            if packet is not None:
+                yield packet
+
+    def arrays(self, ids=None, start=None, end=None):
+        """Decode the selected packets at once into NumPy structured arrays.
+
+        Returns a dict of layout name (as in load_columns) to array, built by
+        dvl_schema.decode_batch. Host times come from the nucleus_log.times
+        sidecar of a raw log when there is one.
+        """
+
+        import numpy as np
+
+        offsets = self.entries["offset"][
+            self.select(ids=ids, start=start, end=end)
+        ].astype(np.int64)
+        timestamps = np.full(len(offsets), np.nan)
+
+        if times_path(self.path).is_file() and len(offsets):
+            data = read_bytes(times_path(self.path))
+            times = np.frombuffer(
+                data[: len(data) - len(data) % RAW_TIME_ENTRY.size],
+                dtype=[("offset", "<u8"), ("time", "<f8")],
+            )
+
+            if len(times):
+                positions = np.minimum(
+                    np.searchsorted(times["offset"], offsets), len(times) - 1
+                )
+                found = times["offset"][positions] == offsets
+                timestamps[found] = times["time"][positions[found]]
+
+        return {
+            dvl_schema.layout_name(key): array
+            for key, array in dvl_schema.decode_batch(
+                self.buffer, offsets, timestamps
+            ).items()
+        }
+
+
+def open_dvl_index(path, header=None, size=None):
+    """Open the record index of a dvl_data.bin download for appending records.
+
+    With header (the offset of the first record, after the get_all data) a
+    new index is started. Otherwise the existing index is cut back to the
+    records that end within the first size bytes of the data file, where a
+    resumed download continues; None is returned when there is no index.
+    """
+
+    path = index_path(path)
+
+    if header is not None:
+        file = open(path, "wb")
+        file.write(DVL_INDEX_HEADER.pack(DVL_INDEX_MAGIC, DVL_INDEX_VERSION, header))
+        return file
+
+    if not path.is_file():
+        return None
+
+    file = open(path, "r+b")
+    data = file.read()
+
+    count = 0
+    for offset, length, _ in DVL_INDEX_ENTRY.iter_unpack(
+        data[
+            DVL_INDEX_HEADER.size : DVL_INDEX_HEADER.size
+            + (len(data) - DVL_INDEX_HEADER.size)
+            // DVL_INDEX_ENTRY.size
+            * DVL_INDEX_ENTRY.size
+        ]
+    ):
+        if offset + length > size:
+            break
+        count += 1
+
+    file.truncate(DVL_INDEX_HEADER.size + count * DVL_INDEX_ENTRY.size)
+    file.seek(0, os.SEEK_END)
+
+    return file
+
+
+def _verify_dvl_records(path, start, stop):
+    """Positions of the records start to stop of a dvl_data.bin that fail their crc32.
+
+    Runs in a worker process.
+    """
+
+    with DVLRecordIndex(path) as index:
+        return [
+            position for position in range(start, stop) if not index.check(position)
+        ]
+
+
+class DVLRecordIndex:
+    """Random access to the records of a dvl_data.bin download.
+
+    dvl_data.bin holds the get_all data followed by the record data only, so
+    record boundaries come from the dvl_data.bin.index sidecar that
+    download_dvl_data writes alongside: offset, length and the crc32 sent by
+    the device for every record. Files downloaded without it cannot be split
+    into records. Both files are memory-mapped; index entries beyond the end
+    of the data file (an interrupted download) are left out. NumPy is
+    required.
+
+        with DVLRecordIndex("dvl/250623_184622/dvl_data.bin") as index:
+            bad = index.verify()
+            record = bytes(index.record(0))
+    """
+
+    def __init__(self, path):
+
+        import numpy as np
+
+        self.path = Path(path)
+
+        with open(index_path(self.path), "rb") as file:
+            header = file.read(DVL_INDEX_HEADER.size)
+
+        if len(header) != DVL_INDEX_HEADER.size or DVL_INDEX_HEADER.unpack(header)[
+            :2
+        ] != (DVL_INDEX_MAGIC, DVL_INDEX_VERSION):
+            raise ValueError(f"{index_path(self.path)} is not a DVL record index")
+
+        self.header = DVL_INDEX_HEADER.unpack(header)[2]
+        self.buffer = open_buffer(self.path)
+
+        dtype = np.dtype([("offset", "<u8"), ("length", "<u4"), ("crc", "<u4")])
+        count = (
+            index_path(self.path).stat().st_size - DVL_INDEX_HEADER.size
+        ) // dtype.itemsize
+
+        entries = (
+            np.memmap(
+                index_path(self.path),
+                dtype=dtype,
+                mode="r",
+                offset=DVL_INDEX_HEADER.size,
+                shape=(count,),
+            )
+            if count
+            else np.empty(0, dtype=dtype)
+        )
+        self.entries = entries[
+            : np.searchsorted(
+                entries["offset"] + entries["length"], len(self.buffer), side="right"
+            )
+        ]
+        self._view = memoryview(self.buffer)
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exception):
+
+        self.close()
+
+    def close(self):
+
+        self._view.release()
+        self.entries = None
+        close_buffer(self.buffer)
+
+    def record(self, position):
+        """The data of record position, as a memoryview into the file.
+
+        Release the view before closing the index.
+        """
+
+        entry = self.entries[position]
+
+        return self._view[
+            int(entry["offset"]) : int(entry["offset"]) + int(entry["length"])
+        ]
+
+    def check(self, position) -> bool:
+        """Whether record position still matches the crc32 the device sent with it."""
+
+        with self.record(position) as record:
+            return crc32(record) == int(self.entries[position]["crc"])
+
+    def verify(self, workers=None):
+        """Positions of the records whose crc32 does not match, checked in parallel.
+
+        The records are split into runs of about DVL_VERIFY_CHUNK_SIZE bytes
+        that a pool of worker processes (default one per core) checks.
+        """
+
+        import numpy as np
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        ends = np.cumsum(self.entries["length"], dtype=np.int64)
+        boundaries = np.unique(
+            np.searchsorted(
+                ends,
+                np.arange(0, int(ends[-1]) if len(ends) else 0, DVL_VERIFY_CHUNK_SIZE),
+                side="right",
+            )
+        ).tolist()
+        chunks = list(zip(boundaries, boundaries[1:] + [len(self.entries)]))
+
+        if workers <= 1 or len(chunks) <= 1:
+            return np.array(
+                [
+                    position
+                    for start, stop in chunks
+                    for position in range(start, stop)
+                    if not self.check(position)
+                ],
+                dtype=np.int64,
+            )
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            starts, stops = zip(*chunks)
+            results = executor.map(
+                _verify_dvl_records, [self.path] * len(chunks), starts, stops
+            )
+            return np.array(
+                [position for result in results for position in result], dtype=np.int64
+            )
+
+
+def read_segments(folder):
+    """Entries of the segments.json index of a segmented log folder."""
+
+    with open(Path(folder) / SEGMENTS_INDEX_FILE) as file:
+        return json.load(file)["segments"]
+
+
+def select_segments(folder, start=None, end=None, device_time=False):
+    """Segments of a log that overlap the time range [start, end].
+
+    Times are POSIX seconds of the host clock, or of the device clock when
+    device_time is True. Segments without packets are left out.
+    """
+
+    key_start, key_end = (
+        ("device_start", "device_end") if device_time else ("start", "end")
+    )
+
+    selected = list()
+    for segment in read_segments(folder):
+        if segment[key_start] is None:
+            continue
+        if start is not None and segment[key_end] < start:
+            continue
+        if end is not None and segment[key_start] > end:
+            continue
+        selected.append(segment)
+
+    return selected
+
+
+def log_sources(path):
+    """The packet files of a log as (kind, path).
+
+    kind is "packets" for iter_packets or "columnar" for load_columns.
+    """
+
+    path = Path(path)
+
+    if not path.is_dir():
+        return [("packets", path)]
+
+    if (path / SEGMENTS_INDEX_FILE).is_file():
+        sources = list()
+        for segment in read_segments(path):
+            for name in segment["files"]:
+                if (path / name).is_dir():
+                    sources.append(("columnar", path / name))
+                elif name.split(".")[1] != "times":
+                    sources.append(("packets", path / name))
+        return sources
+
+    if (path / RAW_LOG_FILE).is_file():
+        return [("packets", path / RAW_LOG_FILE)]
+
+    if (path / "nucleus_log.csv").is_file():
+        return [("packets", path / "nucleus_log.csv")]
+
+    if (path / COLUMNS_MANIFEST_FILE).is_file():
+        return [("columnar", path)]
+
+    # download folders hold the .nucleus file fetched from the device
+    return [("packets", file) for file in sorted(path.glob("*.nucleus"))]
+
+
+def _iter_columnar_packets(folder):
+
+    for array in load_columns(folder).values():
+        names = array.dtype.names
+        for values in array.tolist():
+            yield dict(zip(names, values))
+
+
+def ingest(paths, database, force=False):
+    """Load the packets of logs into a sqlite3 database for queries across runs.
+
+    paths are log folders (plain, segmented or columnar), .nucleus files or
+    nucleus_log.csv files; each becomes a run of the PacketDatabase at
+    database. A log that is stored already with the same modification time
+    is skipped unless force is set; a changed log replaces its run. Returns
+    the number of packets inserted.
+    """
+
+    inserted = 0
+
+    with PacketDatabase(database) as packet_database:
+
+        for path in paths:
+
+            sources = log_sources(path)
+            if not sources:
+                continue
+
+            mtime = max(
+                (source / COLUMNS_MANIFEST_FILE if kind == "columnar" else source)
+                .stat()
+                .st_mtime
+                for kind, source in sources
+            )
+            run_path = Path(path).resolve()
+
+            if not force and packet_database.is_current(run_path, mtime):
+                continue
+
+            run = packet_database.run(run_path, mtime)
+
+            for kind, source in sources:
+                packets = (
+                    _iter_columnar_packets(source)
+                    if kind == "columnar"
+                    else iter_packets(source)
+                )
+                for packet in packets:
+                    if packet_database.insert(run, packet):
+                        inserted += 1
+
+            packet_database.finish(run)
+
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline tools for Nucleus log files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Convert log folders, .nucleus files or nucleus_log.csv files "
+        "to csv or columnar files",
+    )
+    export_parser.add_argument(
+        "paths",
+        nargs="+",
+        help="Log folders, .nucleus files or (for columnar) nucleus_log.csv files",
+    )
+    export_parser.add_argument(
+        "--format", choices=["csv", "columnar"], default="csv", help="Output format"
+    )
+    export_parser.add_argument(
+        "--output", default=None, help="Output folder (default: next to each input)"
+    )
+
+    segments_parser = subparsers.add_parser(
+        "segments", help="List the segments of a log overlapping a time range"
+    )
+    segments_parser.add_argument("folder", help="Segmented log folder")
+    segments_parser.add_argument(
+        "--start", type=float, default=None, help="Start time, POSIX seconds"
+    )
+    segments_parser.add_argument(
+        "--end", type=float, default=None, help="End time, POSIX seconds"
+    )
+    segments_parser.add_argument(
+        "--device-time",
+        action="store_true",
+        help="Compare against device time instead of host time",
+    )
+
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="Load logs into a sqlite3 database with per packet type tables"
+    )
+    ingest_parser.add_argument(
+        "database", help="sqlite3 database file, created if missing"
+    )
+    ingest_parser.add_argument(
+        "paths", nargs="+", help="Log folders, .nucleus files or nucleus_log.csv files"
+    )
+    ingest_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reload logs that have not changed since they were loaded",
+    )
+
+    index_parser = subparsers.add_parser(
+        "index", help="Build the packet index of a .nucleus file for random access"
+    )
+    index_parser.add_argument("path", help=".nucleus or raw log file")
+
+    records_parser = subparsers.add_parser(
+        "records",
+        help="Verify the records of a dvl_data.bin download against their crc32",
+    )
+    records_parser.add_argument("path", help="dvl_data.bin with its dvl_data.bin.index")
+    records_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: one per core)",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        if args.output is not None and len(args.paths) > 1:
+            parser.error("--output can only be used with a single input")
+
+        for path in args.paths:
+            if args.format == "columnar":
+                written = export_columnar(path, output_folder=args.output)
+            else:
+                written = export_csv(path, output_folder=args.output)
+            print(f"✅ Exported {written} packets from {path}")
+
+    elif args.command == "ingest":
+        inserted = ingest(args.paths, args.database, force=args.force)
+        print(f"✅ Inserted {inserted} packets into {args.database}")
+
+    elif args.command == "index":
+        print(f"✅ Indexed {build_index(args.path)} packets to {index_path(args.path)}")
+
+    elif args.command == "records":
+        with DVLRecordIndex(args.path) as index:
+            bad = index.verify(workers=args.workers)
+            passed = len(index) - len(bad)
+            print(f"✅ {passed} of {len(index)} records passed the crc check")
+            for position in bad:
+                offset = int(index.entries[position]["offset"])
+                print(f"❌ record {position} at offset {offset}")
+
+    elif args.command == "segments":
+        for segment in select_segments(
+            args.folder, start=args.start, end=args.end, device_time=args.device_time
+        ):
+            print(" ".join(segment["files"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,888 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+from math import nan
+from operator import itemgetter
+from pathlib import Path
+from queue import Queue, Empty, Full
+from struct import Struct
+from threading import Lock, Thread
+import csv
+import gzip
+import json
+import lzma
+import time
+
+from nucleus_driver._logger import Logger
+
+from dvl_database import PacketDatabase
+import dvl_schema
+
+
+RAW_LOG_FILE = "nucleus_log.nucleus"
+RAW_TIMES_FILE = "nucleus_log.times"
+
+# one entry per frame in the raw log: byte offset of the frame, host receive time
+RAW_TIME_ENTRY = Struct("<Qd")
+
+COLUMNS_MANIFEST_FILE = "manifest.json"
+SEGMENTS_INDEX_FILE = "segments.json"
+
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "lzma": ".xz"}
+
+
+def open_output(path, binary=True, compression=None):
+    """Open path (plus the compression suffix) for streaming writes."""
+
+    path = str(path) + COMPRESSION_SUFFIXES[compression]
+
+    if compression == "gzip":
+        return (
+            gzip.open(path, "wb", compresslevel=6)
+            if binary
+            else gzip.open(path, "wt", compresslevel=6, newline="")
+        )
+
+    if compression == "lzma":
+        return lzma.open(path, "wb") if binary else lzma.open(path, "wt", newline="")
+
+    return open(path, "wb") if binary else open(path, "w", newline="")
+
+
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+NPY_TYPES = {
+    "u1": "|u1",
+    "u2": "<u2",
+    "u4": "<u4",
+    "i1": "|i1",
+    "i2": "<i2",
+    "i4": "<i4",
+    "f4": "<f4",
+    "f8": "<f8",
+    "?": "|b1",
+}
+
+
+def npy_header(fields, count, reserve=0):
+    """Version 1.0 .npy header for count records of fields.
+
+    The header is padded to a 64 byte boundary.
+    """
+
+    descr = [(name, NPY_TYPES[numpy_type]) for name, numpy_type in fields]
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+        descr, count
+    )
+    header += " " * reserve
+
+    length = len(NPY_MAGIC) + 2 + len(header) + 1
+    header += " " * (-length % 64) + "\n"
+
+    return NPY_MAGIC + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+
+class PacketCsvWriter(csv.DictWriter):
+    """DictWriter for packet rows with the wide, mostly empty nucleus_log.csv header.
+
+    Rows of numeric layouts are formatted from a template cached per layout
+    and set of keys, with the empty columns already filled in, instead of
+    looking up every column. Packets whose sensor data could not be decoded
+    have fewer keys and get a template of their own. The output is the same
+    as DictWriter's: rows with a None value and other layouts go through
+    DictWriter.
+    """
+
+    def __init__(self, file, fieldnames, **kwargs):
+
+        super().__init__(file, fieldnames, **kwargs)
+
+        self.file = file
+        self._row_formats = dict()
+
+    def _row_format(self, packet):
+
+        layout = (packet["family"], packet["id"], packet.get("version"))
+
+        # usually one key set per layout, more when some sensor data failed to decode
+        row_formats = self._row_formats.setdefault(layout, [])
+        for keys, row_format in row_formats:
+            if packet.keys() == keys:
+                return row_format
+
+        names = [name for name in self.fieldnames if name in packet]
+
+        row_format = None
+        if len(names) == len(packet) and all(
+            type(packet[name]) in (int, float, bool, type(None)) for name in names
+        ):
+            present = set(names)
+            template = (
+                ",".join("{}" if name in present else "" for name in self.fieldnames)
+                + self.writer.dialect.lineterminator
+            )
+            row_format = (template.format, itemgetter(*names))
+
+        row_formats.append((frozenset(packet), row_format))
+
+        return row_format
+
+    def writerow(self, rowdict):
+
+        row_format = self._row_format(rowdict)
+        if row_format is None:
+            return super().writerow(rowdict)
+
+        line, values = row_format
+
+        row = values(rowdict)
+        if None in row:
+            # DictWriter writes None as an empty field, the template would write "None"
+            return super().writerow(rowdict)
+
+        return self.file.write(line(*row))
+
+
+class ColumnarWriter:
+    """Per packet layout .npy files of fixed-width records, plus a manifest.
+
+    Records are packed with the record structs from dvl_schema and appended in
+    blocks of block_size bytes. The .npy headers hold the record count once the
+    writer is closed; readers of a file that was not closed take the count from
+    the file size.
+    """
+
+    HEADER_RESERVE = 24  # room for the record count digits when the header is rewritten
+
+    def __init__(self, folder, block_size=64 * 1024):
+
+        self.folder = Path(folder)
+        self.block_size = block_size
+        self.columns = dict()
+
+    def _open(self, key):
+
+        fields = dvl_schema.RECORD_FIELDS[key]
+        name = dvl_schema.layout_name(key)
+        header = npy_header(fields, 0, reserve=self.HEADER_RESERVE)
+
+        file = open(self.folder / (name + ".npy"), "wb")
+        file.write(header)
+
+        column = {
+            "name": name,
+            "key": key,
+            "file": file,
+            "fields": fields,
+            "struct": dvl_schema.RECORD_STRUCTS[key],
+            "getter": itemgetter(*(field for field, _ in fields)),
+            "buffer": bytearray(),
+            "count": 0,
+            "header_size": len(header),
+        }
+
+        self.columns[key] = column
+
+        return column
+
+    def write(self, packet) -> bool:
+        """Append a decoded packet.
+
+        Returns False if its layout has no fixed-width record.
+        """
+
+        key = dvl_schema.layout_key(
+            packet["family"], packet["id"], packet.get("version")
+        )
+        if key is None or dvl_schema.RECORD_STRUCTS[key] is None:
+            return False
+
+        column = self.columns.get(key)
+        if column is None:
+            column = self._open(key)
+
+        values = column["getter"](packet)
+        if packet["timestampPython"] is None:
+            # the packet may be shared with the parser queue and callbacks, so it is
+            # left as it is
+            values = tuple(nan if value is None else value for value in values)
+
+        column["buffer"] += column["struct"].pack(*values)
+        column["count"] += 1
+
+        if len(column["buffer"]) >= self.block_size:
+            column["file"].write(column["buffer"])
+            column["buffer"] = bytearray()
+
+        return True
+
+    def flush(self):
+
+        for column in self.columns.values():
+            if column["buffer"]:
+                column["file"].write(column["buffer"])
+                column["buffer"] = bytearray()
+            column["file"].flush()
+
+    def manifest(self):
+
+        files = dict()
+        for column in self.columns.values():
+            family, packet_id, version = column["key"]
+            files[column["name"]] = {
+                "file": column["name"] + ".npy",
+                "family": family,
+                "id": packet_id,
+                "version": version,
+                "count": column["count"],
+                "record_size": column["struct"].size,
+                "fields": [list(field) for field in column["fields"]],
+            }
+
+        return {"format": "npy", "files": files}
+
+    def close(self):
+
+        self.flush()
+
+        for column in self.columns.values():
+            column["file"].seek(0)
+            column["file"].write(
+                npy_header(
+                    column["fields"],
+                    column["count"],
+                    reserve=column["header_size"]
+                    - len(npy_header(column["fields"], column["count"])),
+                )
+            )
+            column["file"].close()
+
+        with open(self.folder / COLUMNS_MANIFEST_FILE, "w") as file:
+            json.dump(self.manifest(), file, indent=2)
+
+
+class SchemaLogger(Logger):
+    """Logger taking its csv columns from dvl_schema.
+
+    The parser hands records to write_packet, write_frame, write_ascii and
+    write_condition instead of reaching into the csv writers itself.
+
+    Modes:
+        "csv"  decoded packets to nucleus_log.csv (the Logger format)
+        "raw"  validated frames appended unchanged to nucleus_log.nucleus, with
+               host receive times in nucleus_log.times. Nothing is decoded for
+               logging; use dvl_files.py export to get csv later.
+        "columnar"
+               one .npy file of fixed-width records per packet layout and a
+               manifest.json (see ColumnarWriter). Current profiles still go to
+               current_profile_log.csv.
+
+    With segment_seconds or segment_bytes set, the packet output is split into
+    numbered segments (nucleus_log_0001.csv, nucleus_log_0001.nucleus, or a
+    segment_0001 folder for columnar logs). A segment is closed once it spans
+    segment_seconds of host time or holds segment_bytes of frame data.
+    compression ("gzip" or "lzma", csv and raw modes only) compresses segments
+    while they are written. segments.json indexes the host and device time span
+    of every segment.
+
+    With database set to the path of a sqlite3 file, decoded packets are also
+    inserted into it (see dvl_database.PacketDatabase) as a run named after
+    the log folder, so many runs can be queried together. This needs
+    decoded packets and is not available in raw mode.
+    """
+
+    MODES = ("csv", "raw", "columnar")
+    COMPRESSIONS = (None, "gzip", "lzma")
+
+    def __init__(
+        self,
+        mode="csv",
+        segment_seconds=None,
+        segment_bytes=None,
+        compression=None,
+        database=None,
+        **kwargs
+    ):
+
+        super().__init__(**kwargs)
+
+        if compression not in self.COMPRESSIONS:
+            raise ValueError("compression must be one of {}".format(self.COMPRESSIONS))
+
+        if compression is not None and mode == "columnar":
+            raise ValueError(
+                "columnar logs can not be compressed, they are memory-mapped when read"
+            )
+
+        self.mode = None
+        self.set_mode(mode)
+
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.compression = compression
+
+        self._segments = list()
+        self._segment = None
+        self._segments_folder = None
+
+        self.raw_file = None
+        self.raw_times_file = None
+        self._raw_offset = 0
+
+        self.columnar_writer = None
+
+        self.database_path = database
+        self.database = None
+        self._database_run = None
+
+    def set_mode(self, mode):
+
+        if mode not in self.MODES:
+            raise ValueError("mode must be one of {}".format(self.MODES))
+
+        if self._logging:
+            self.messages.write_warning("can not change logging mode while logging")
+            return False
+
+        self.mode = mode
+
+        return True
+
+    def needs_packets(self) -> bool:
+        """True if the logger writes decoded packets, False if it only takes frames."""
+
+        return self.mode != "raw"
+
+    def _get_field_names_packet(self):
+
+        return dvl_schema.merged_field_names()
+
+    def _segmenting(self) -> bool:
+
+        return self.segment_seconds is not None or self.segment_bytes is not None
+
+    def _open_packet_files(self, folder, suffix=""):
+        """Open the packet output.
+
+        Returns the names of the files or folder created.
+        """
+
+        compression = self.compression if suffix else None
+
+        if self.mode == "columnar":
+            columnar_folder = (
+                Path(folder) / ("segment" + suffix) if suffix else Path(folder)
+            )
+            columnar_folder.mkdir(parents=True, exist_ok=True)
+            self.columnar_writer = ColumnarWriter(columnar_folder)
+            return [columnar_folder.name]
+
+        if self.mode == "raw":
+            names = [RAW_LOG_FILE, RAW_TIMES_FILE]
+        else:
+            names = ["nucleus_log.csv"]
+
+        names = ["{0}{2}.{1}".format(*name.rsplit(".", 1), suffix) for name in names]
+
+        if self.mode == "raw":
+            self.raw_file = open_output(
+                folder + "/" + names[0], compression=compression
+            )
+            self.raw_times_file = open_output(
+                folder + "/" + names[1], compression=compression
+            )
+            self._raw_offset = 0
+        else:
+            self.packet_file = open_output(
+                folder + "/" + names[0], binary=False, compression=compression
+            )
+            self.packet_writer = PacketCsvWriter(
+                self.packet_file, fieldnames=self._get_field_names_packet()
+            )
+            self.packet_writer.writeheader()
+
+        return [name + COMPRESSION_SUFFIXES[compression] for name in names]
+
+    def _close_packet_files(self):
+
+        for file in (self.packet_file, self.raw_file, self.raw_times_file):
+            if file is not None and not file.closed:
+                file.close()
+
+        if self.columnar_writer is not None:
+            self.columnar_writer.close()
+            self.columnar_writer = None
+
+    def _open_segment(self):
+
+        number = len(self._segments) + 1
+        files = self._open_packet_files(
+            self._segments_folder, suffix="_{:04d}".format(number)
+        )
+
+        self._segment = {
+            "number": number,
+            "files": files,
+            "start": None,
+            "end": None,
+            "device_start": None,
+            "device_end": None,
+            "packets": 0,
+            "bytes": 0,
+        }
+        self._segments.append(self._segment)
+
+    def _close_segment(self):
+
+        self._close_packet_files()
+        self._segment = None
+
+        with open(self._segments_folder + "/" + SEGMENTS_INDEX_FILE, "w") as file:
+            json.dump(
+                {
+                    "mode": self.mode,
+                    "compression": self.compression,
+                    "segments": self._segments,
+                },
+                file,
+                indent=2,
+            )
+
+    def _track_segment(self, host_time, device_time, size):
+
+        segment = self._segment
+        if segment is None:
+            return
+
+        if segment["start"] is None:
+            segment["start"] = host_time
+        segment["end"] = host_time
+
+        if device_time is not None:
+            if segment["device_start"] is None:
+                segment["device_start"] = device_time
+            segment["device_end"] = device_time
+
+        segment["packets"] += 1
+        segment["bytes"] += size
+
+        if (
+            self.segment_bytes is not None and segment["bytes"] >= self.segment_bytes
+        ) or (
+            self.segment_seconds is not None
+            and host_time is not None
+            and host_time - segment["start"] >= self.segment_seconds
+        ):
+            self._close_segment()
+            self._open_segment()
+
+    def flush(self):
+
+        for file in (
+            self.packet_file,
+            self.raw_file,
+            self.raw_times_file,
+            self.current_profile_file,
+            self.condition_file,
+            self.ascii_file,
+        ):
+            if file is not None and not file.closed:
+                file.flush()
+
+        if self.columnar_writer is not None:
+            self.columnar_writer.flush()
+
+        if self.database is not None:
+            self.database.flush()
+
+    def start(self, _converting=False) -> str:
+
+        def get_all_package(get_all: bytes) -> bytes:
+
+            get_all_package = b"".join(
+                entry.split(b"$PNOR,")[1].split(b"*")[0] + b"\r\n" for entry in get_all
+            ).split(b"OK")[0]
+
+            header = bytearray(dvl_schema.HEADER_SIZE)
+            header[0:4] = bytes(
+                (
+                    dvl_schema.SYNC_BYTE,
+                    dvl_schema.HEADER_SIZE,
+                    dvl_schema.DataID.ASCII,
+                    dvl_schema.FAMILY_NUCLEUS,
+                )
+            )
+            header[4:6] = len(get_all_package).to_bytes(2, byteorder="little")
+            header[6:8] = dvl_schema.checksum(get_all_package).to_bytes(
+                2, byteorder="little"
+            )
+            header[8:10] = dvl_schema.checksum(header, 0, 8).to_bytes(
+                2, byteorder="little"
+            )
+
+            return header + get_all_package
+
+        folder = self._path + "/" + datetime.now().strftime("%y%m%d_%H%M%S")
+        self._logging_folder = folder
+
+        Path(folder).mkdir(parents=True, exist_ok=True)
+
+        if not _converting:
+            self.messages.write_message("Logging started. Path: {}".format(folder))
+        else:
+            self.messages.write_message("Converting started. Path: {}".format(folder))
+
+        if self._segmenting():
+            self._segments = list()
+            self._segments_folder = folder
+            self._open_segment()
+        else:
+            self._open_packet_files(folder)
+
+        if self.database_path is not None:
+            if self.mode == "raw":
+                self.messages.write_warning(
+                    "packets are not decoded in raw mode "
+                    "and are not written to the database"
+                )
+            else:
+                self.database = PacketDatabase(self.database_path)
+                self._database_run = self.database.run(folder)
+
+        self.condition_file = open(folder + "/condition_log.csv", "w", newline="")
+        self.ascii_file = open(folder + "/ascii_log.csv", "w", newline="")
+
+        if self.connection.get_all is not None and _converting is False:
+            with open(folder + "/get_all.txt", "w") as file:
+                file.writelines(self.connection.get_all)
+
+        self.condition_writer = csv.DictWriter(
+            self.condition_file, fieldnames=self._get_field_names_condition()
+        )
+        self.ascii_writer = csv.DictWriter(
+            self.ascii_file, fieldnames=self._get_field_names_ascii()
+        )
+
+        self.condition_writer.writeheader()
+        self.ascii_writer.writeheader()
+
+        self._logging = True
+
+        if self.connection.get_all_nmea is not None:
+            get_all = get_all_package(self.connection.get_all_nmea)
+            self.parser.add_data(get_all)
+
+        return folder
+
+    def stop(self):
+
+        super().stop()
+
+        if self._segment is not None:
+            self._close_segment()
+        else:
+            self._close_packet_files()
+
+        if self.database is not None:
+            self.database.finish(self._database_run)
+            self.database.close()
+            self.database = None
+
+    def write_frame(self, timestamp, frame):
+
+        if self.mode != "raw":
+            return
+
+        self.raw_file.write(frame)
+        self.raw_times_file.write(RAW_TIME_ENTRY.pack(self._raw_offset, timestamp))
+        self._raw_offset += len(frame)
+
+        if self._segment is not None:
+            device_time = None
+            if frame[2] != dvl_schema.DataID.ASCII and len(frame) >= frame[1] + 12:
+                device_time = (
+                    int.from_bytes(frame[frame[1] + 4 : frame[1] + 8], "little")
+                    + int.from_bytes(frame[frame[1] + 8 : frame[1] + 12], "little")
+                    * 1e-6
+                )
+            self._track_segment(timestamp, device_time, len(frame))
+
+    def write_packet(self, packet):
+
+        if self.mode == "raw":
+            return
+
+        if self.mode == "csv" or not self.columnar_writer.write(packet):
+            self._write_packet_csv(packet)
+
+        if self.database is not None:
+            self.database.insert(self._database_run, packet)
+
+        if self._segment is not None:
+            device_time = (
+                packet["timeStamp"] + packet["microSeconds"] * 1e-6
+                if "timeStamp" in packet
+                else None
+            )
+            self._track_segment(packet["timestampPython"], device_time, packet["size"])
+
+    def _write_packet_csv(self, packet):
+
+        if packet["id"] != dvl_schema.DataID.CURRENT_PROFILE and self.mode != "csv":
+            return
+
+        if (
+            packet["id"] == dvl_schema.DataID.CURRENT_PROFILE
+            and not self.get_current_profile_logging_status()
+        ):
+            self.open_current_profile_writer(
+                number_of_cells=int(packet["numberOfCells"])
+            )
+
+        try:
+            if packet["id"] == dvl_schema.DataID.CURRENT_PROFILE:
+                self.current_profile_writer.writerow(packet)
+            else:
+                self.packet_writer.writerow(packet)
+        except ValueError as exception:
+            self.messages.write_warning(
+                "Failed to write package to csv file: {}".format(exception)
+            )
+
+    def write_ascii(self, timestamp, ascii_bytes):
+
+        ascii_message = "".join(chr(i) for i in ascii_bytes if 0 <= i <= 0x7E).rstrip(
+            "\r\n"
+        )
+
+        try:
+            self.ascii_writer.writerow(
+                {"timestamp_python": timestamp, "message": ascii_message}
+            )
+        except Exception as exception:
+            self.messages.write_warning(
+                "Failed to write ascii message to csv file: {}".format(exception)
+            )
+
+    def write_condition(self, failed_packet):
+
+        try:
+            self.condition_writer.writerow(failed_packet)
+        except ValueError as exception:
+            self.messages.write_warning(
+                "Failed to write condition to csv file: {}".format(exception)
+            )
+
+
+class AsyncLogger(SchemaLogger):
+    """SchemaLogger whose files are written by a background thread.
+
+    The parser only enqueues records. The writer thread drains the queue in
+    batches and flushes the files every flush_interval seconds. When the queue
+    is full the policy decides what happens to a new record:
+
+        "drop_oldest"  discard the oldest queued record (default)
+        "drop_newest"  discard the new record
+        "block"        wait up to block_timeout seconds for room, then drop it
+
+    When converting files there is no live stream to protect, so records are
+    written directly by the calling thread and never dropped.
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(
+        self,
+        queue_size=10000,
+        flush_interval=1.0,
+        batch_size=500,
+        policy="drop_oldest",
+        block_timeout=0.1,
+        **kwargs
+    ):
+
+        super().__init__(**kwargs)
+
+        if policy not in self.POLICIES:
+            raise ValueError("policy must be one of {}".format(self.POLICIES))
+
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self.log_queue = Queue(maxsize=queue_size)
+        self.writer_thread = Thread()
+        self._converting = False
+
+        # producers count queued and dropped records, the writer thread the rest
+        self.statistics = dict()
+        self._statistics_lock = Lock()
+        self._reset_statistics()
+
+    def _reset_statistics(self):
+
+        with self._statistics_lock:
+            self.statistics["queued"] = 0
+            self.statistics["written"] = 0
+            self.statistics["dropped"] = 0
+            self.statistics["failed"] = 0
+            self.statistics["flushes"] = 0
+
+    def _count(self, name, amount=1):
+
+        with self._statistics_lock:
+            self.statistics[name] += amount
+
+    def _enqueue(self, record):
+
+        try:
+            if self.policy == "block":
+                self.log_queue.put(record, timeout=self.block_timeout)
+            else:
+                self.log_queue.put_nowait(record)
+
+        except Full:
+            if self.policy != "drop_oldest":
+                self._count("dropped")
+                return
+
+            try:
+                self.log_queue.get_nowait()
+                self._count("dropped")
+                self.log_queue.put_nowait(record)
+            except (Empty, Full):
+                self._count("dropped")
+                return
+
+        self._count("queued")
+
+    def write_packet(self, packet):
+
+        if self._converting:
+            super().write_packet(packet)
+            return
+
+        self._enqueue((super().write_packet, (packet,)))
+
+    def write_ascii(self, timestamp, ascii_bytes):
+
+        if self._converting:
+            super().write_ascii(timestamp, ascii_bytes)
+            return
+
+        self._enqueue((super().write_ascii, (timestamp, ascii_bytes)))
+
+    def write_frame(self, timestamp, frame):
+
+        if self._converting:
+            super().write_frame(timestamp, frame)
+            return
+
+        self._enqueue((super().write_frame, (timestamp, frame)))
+
+    def write_condition(self, failed_packet):
+
+        if self._converting:
+            super().write_condition(failed_packet)
+            return
+
+        self._enqueue((super().write_condition, (failed_packet,)))
+
+    def _flush(self):
+
+        try:
+            self.flush()
+        except Exception as exception:
+            self.messages.write_exception(
+                "Failed to flush log files: {!r}".format(exception)
+            )
+            return
+
+        self._count("flushes")
+
+    def _run_writer(self):
+
+        last_flush = time.monotonic()
+        running = True
+
+        while running:
+
+            batch = list()
+            try:
+                batch.append(self.log_queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.log_queue.get_nowait())
+            except Empty:
+                pass
+
+            written = failed = 0
+            for record in batch:
+                if record is None:
+                    running = False
+                    continue
+
+                # a failing record must not end the thread, or the queue would never
+                # be drained again
+                write, arguments = record
+                try:
+                    write(*arguments)
+                except Exception as exception:
+                    failed += 1
+                    self.messages.write_exception(
+                        "Failed to write log record: {!r}".format(exception)
+                    )
+                    continue
+
+                written += 1
+
+            self._count("written", written)
+            self._count("failed", failed)
+
+            if not running or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+    def start(self, _converting=False) -> str:
+
+        self._reset_statistics()
+        self.log_queue = Queue(maxsize=self.queue_size)
+
+        self._converting = _converting
+
+        folder = super().start(_converting=_converting)
+
+        if not _converting:
+            self.writer_thread = Thread(target=self._run_writer, daemon=True)
+            self.writer_thread.start()
+
+        return folder
+
+    def stop(self):
+
+        self._logging = False
+
+        if self.writer_thread.is_alive():
+            # the stop marker must not be dropped, so wait for room regardless of policy
+            self.log_queue.put(None)
+            self.writer_thread.join()
+        elif self.writer_thread.ident is not None and not self._converting:
+            self.messages.write_warning(
+                "the log writer thread stopped early, "
+                "{} queued log records were not written".format(self.log_queue.qsize())
+            )
+
+        super().stop()
+        self._converting = False
+
+        if self.statistics["dropped"]:
+            self.messages.write_warning(
+                "{} log records were dropped because the log queue was full".format(
+                    self.statistics["dropped"]
+                )
+            )
+
+        if self.statistics["failed"]:
+            self.messages.write_warning(
+                "{} log records failed to be written".format(self.statistics["failed"])
+            )
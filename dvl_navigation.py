@@ -0,0 +1,769 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import product
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from dvl_files import load_arrays
+from dvl_schema import DataID
+
+ROTATIONS = ("heading", "attitude", "none")
+
+VELOCITY_THRESHOLD = (
+    0.01  # m/s, both horizontal components below this count as standing still
+)
+FOM_LIMIT = 1.5
+MAX_INTERVAL = (
+    2.0  # s, longest BT interval a velocity is held over (dropouts are not bridged)
+)
+
+REFERENCES = ("ins", "start")
+SWEEP_FOM_LIMITS = (0.5, 1.0, 1.5, 2.0, None)
+SWEEP_VELOCITY_THRESHOLDS = (0.0, 0.005, 0.01, 0.02, 0.05)
+SWEEP_YAW_JUMP_LIMITS = (None, 20.0, 45.0, 90.0)
+SWEEP_CHUNK_SIZE = 16  # settings evaluated per worker task
+
+
+def device_time(array):
+    """Device time in POSIX seconds (timeStamp + microSeconds) of a packet array."""
+
+    return array["timeStamp"] + array["microSeconds"] * 1e-6
+
+
+def measurement_time(bottom_track):
+    """Device time each bottom track velocity refers to.
+
+    A packet's timeStamp is the ping trigger; dtXYZ is the time from the
+    trigger to the center of the bottom echo, so it is added where valid.
+    """
+
+    dt_xyz = bottom_track["dtXYZ"].astype(np.float64)
+    offset = np.where(
+        np.isfinite(dt_xyz) & (dt_xyz >= 0.0) & (dt_xyz < MAX_INTERVAL), dt_xyz, 0.0
+    )
+
+    return device_time(bottom_track) + offset
+
+
+def bt_intervals(times, bottom_track, max_interval=MAX_INTERVAL):
+    """Integration interval of every BT velocity.
+
+    A velocity is integrated from the previous measurement to its own. The
+    first velocity has no previous measurement and is integrated over its
+    estimate duration (timeVelXYZ) when the instrument reports one.
+    Intervals are clipped to [0, max_interval].
+    """
+
+    intervals = np.diff(times, prepend=times[:1])
+
+    if len(times):
+        first = float(bottom_track["timeVelXYZ"][0])
+        intervals[0] = first if np.isfinite(first) and first > 0.0 else 0.0
+
+    return np.clip(intervals, 0.0, max_interval)
+
+
+def bt_gate(
+    bottom_track,
+    fom_limit=FOM_LIMIT,
+    velocity_threshold=VELOCITY_THRESHOLD,
+    vertical=False,
+):
+    """Mask of the BT velocities to integrate.
+
+    A velocity is used when the instrument flags its x and y components (and
+    z if vertical) valid, fomX and fomY are at most fom_limit and at least
+    one horizontal component reaches velocity_threshold. fom_limit or
+    velocity_threshold None disables that check.
+    """
+
+    vx = bottom_track["velocityX"]
+    vy = bottom_track["velocityY"]
+
+    gate = bottom_track["status.xVelocityValid"] & bottom_track["status.yVelocityValid"]
+    gate &= np.isfinite(vx) & np.isfinite(vy)
+
+    if vertical:
+        gate &= bottom_track["status.zVelocityValid"] & np.isfinite(
+            bottom_track["velocityZ"]
+        )
+
+    if fom_limit is not None:
+        gate &= (bottom_track["fomX"] <= fom_limit) & (
+            bottom_track["fomY"] <= fom_limit
+        )
+
+    if velocity_threshold is not None:
+        gate &= (np.abs(vx) >= velocity_threshold) | (np.abs(vy) >= velocity_threshold)
+
+    return gate
+
+
+def _unwrap_degrees(angles):
+
+    return np.rad2deg(np.unwrap(np.deg2rad(angles.astype(np.float64))))
+
+
+def _yaw_jumps(times, heading, limit):
+    """Device times of the attitude samples whose heading jumped.
+
+    A jump is a move of more than limit degrees from the previous sample.
+    """
+
+    change = np.abs((np.diff(heading.astype(np.float64)) + 180.0) % 360.0 - 180.0)
+
+    return times[1:][change > limit]
+
+
+def dead_reckon(
+    bottom_track,
+    ahrs=None,
+    rotation="heading",
+    fom_limit=FOM_LIMIT,
+    velocity_threshold=VELOCITY_THRESHOLD,
+    yaw_jump_limit=None,
+    max_interval=MAX_INTERVAL,
+):
+    """Integrate a dive's bottom track velocities into a trajectory with NumPy.
+
+    bottom_track and ahrs are structured arrays as returned by load_arrays
+    (ahrs may be AHRS or INS packets, both carry ahrsData). Every velocity
+    that passes bt_gate is held over its own device interval (bt_intervals)
+    and rotated into the local level frame with the heading (rotation
+    "heading", x north and y east as the position test scripts do) or roll,
+    pitch and heading ("attitude"), interpolated to the measurement time;
+    rotation "none" keeps the instrument frame. Velocities measured before
+    the first attitude sample are not used. With yaw_jump_limit set, a
+    velocity is dropped when the heading jumped by more than that many
+    degrees between two attitude samples within its interval.
+
+    Returns a dict of arrays, one entry per BT packet: time (device time of
+    the measurement), x, y, z (position relative to the start), distance
+    (horizontal path length) and used (the velocities integrated).
+    """
+
+    if rotation not in ROTATIONS:
+        raise ValueError("rotation must be one of {}".format(", ".join(ROTATIONS)))
+
+    times = measurement_time(bottom_track)
+    intervals = bt_intervals(times, bottom_track, max_interval)
+    used = bt_gate(
+        bottom_track, fom_limit, velocity_threshold, vertical=rotation == "attitude"
+    )
+
+    vx = bottom_track["velocityX"].astype(np.float64)
+    vy = bottom_track["velocityY"].astype(np.float64)
+    vz = bottom_track["velocityZ"].astype(np.float64)
+
+    if rotation != "none":
+
+        if ahrs is None or not len(ahrs):
+            raise ValueError("rotation {} needs attitude packets".format(rotation))
+
+        ahrs_times = device_time(ahrs)
+        order = np.argsort(ahrs_times, kind="stable")
+        ahrs_times = ahrs_times[order]
+        heading = ahrs["ahrsData.heading"][order]
+
+        used &= times >= ahrs_times[0]
+
+        if yaw_jump_limit is not None:
+            jumps = _yaw_jumps(ahrs_times, heading, yaw_jump_limit)
+            used &= np.searchsorted(jumps, times, side="right") == np.searchsorted(
+                jumps, times - intervals, side="right"
+            )
+
+        yaw = np.deg2rad(np.interp(times, ahrs_times, _unwrap_degrees(heading)))
+        cos_yaw, sin_yaw = np.cos(yaw), np.sin(yaw)
+
+        if rotation == "heading":
+            vx, vy = cos_yaw * vx - sin_yaw * vy, sin_yaw * vx + cos_yaw * vy
+
+        else:
+            roll = np.deg2rad(
+                np.interp(
+                    times, ahrs_times, _unwrap_degrees(ahrs["ahrsData.roll"][order])
+                )
+            )
+            pitch = np.deg2rad(
+                np.interp(
+                    times, ahrs_times, ahrs["ahrsData.pitch"][order].astype(np.float64)
+                )
+            )
+            cos_roll, sin_roll = np.cos(roll), np.sin(roll)
+            cos_pitch, sin_pitch = np.cos(pitch), np.sin(pitch)
+
+            # body to local level, R = Rz(heading) Ry(pitch) Rx(roll)
+            vx, vy, vz = (
+                cos_yaw * cos_pitch * vx
+                + (cos_yaw * sin_pitch * sin_roll - sin_yaw * cos_roll) * vy
+                + (cos_yaw * sin_pitch * cos_roll + sin_yaw * sin_roll) * vz,
+                sin_yaw * cos_pitch * vx
+                + (sin_yaw * sin_pitch * sin_roll + cos_yaw * cos_roll) * vy
+                + (sin_yaw * sin_pitch * cos_roll - cos_yaw * sin_roll) * vz,
+                -sin_pitch * vx + cos_pitch * sin_roll * vy + cos_pitch * cos_roll * vz,
+            )
+
+    weights = np.where(used, intervals, 0.0)
+    dx = np.where(used, vx, 0.0) * weights
+    dy = np.where(used, vy, 0.0) * weights
+    dz = np.where(used & np.isfinite(vz), vz, 0.0) * weights
+
+    return {
+        "time": times,
+        "x": np.cumsum(dx),
+        "y": np.cumsum(dy),
+        "z": np.cumsum(dz),
+        "distance": np.cumsum(np.hypot(dx, dy)),
+        "used": used,
+    }
+
+
+def compare_ins(trajectory, ins):
+    """Compare a dead-reckoned trajectory with the INS positionFrameX/Y/Z.
+
+    Both are taken relative to their value at the first INS packet inside
+    the trajectory's time span, the trajectory interpolated to the INS
+    packet times. Returns a dict of arrays (time, error_x, error_y, error_z,
+    horizontal) and the final and maximum horizontal error, None without
+    overlapping INS packets.
+    """
+
+    times = device_time(ins)
+    inside = (
+        (times >= trajectory["time"][0]) & (times <= trajectory["time"][-1])
+        if len(trajectory["time"])
+        else np.zeros(len(ins), dtype=bool)
+    )
+
+    if not inside.any():
+        return None
+
+    ins = ins[inside]
+    times = times[inside]
+
+    errors = dict()
+    for axis in "xyz":
+        estimate = np.interp(times, trajectory["time"], trajectory[axis])
+        reference = ins["positionFrame" + axis.upper()].astype(np.float64)
+        errors["error_" + axis] = (estimate - estimate[0]) - (reference - reference[0])
+
+    horizontal = np.hypot(errors["error_x"], errors["error_y"])
+
+    return {
+        "time": times,
+        **errors,
+        "horizontal": horizontal,
+        "final": float(horizontal[-1]),
+        "max": float(horizontal.max()),
+    }
+
+
+def load_dive(path, start=None, end=None):
+    """The bottom track, attitude and INS arrays of a log.
+
+    The arrays are what dead_reckon and compare_ins take. Attitude comes
+    from the AHRS packets, or from the INS packets when the log has no AHRS
+    packets. Missing packet types are None.
+    """
+
+    arrays = load_arrays(
+        path, ids=(DataID.BOTTOM_TRACK, DataID.AHRS, DataID.INS), start=start, end=end
+    )
+
+    ahrs = [array for name, array in arrays.items() if name.startswith("ahrs")]
+    ins = [array for name, array in arrays.items() if name.startswith("ins")]
+
+    ins = np.concatenate(ins) if ins else None
+    ahrs = np.concatenate(ahrs) if ahrs else ins
+
+    return {"bottom_track": arrays.get("bottom_track"), "ahrs": ahrs, "ins": ins}
+
+
+class NavigationCore:
+    """Dead reckoning of live packets.
+
+    Every bottom track velocity is integrated over its own device interval.
+
+    Feed each decoded packet to update. AHRS and INS packets update the
+    attitude; a bottom track packet is gated like bt_gate, rotated with the
+    latest attitude (rotation as in dead_reckon) and held over the device
+    time since the previous bottom track measurement (measurement_time and
+    bt_intervals), so the position does not depend on when the host gets to
+    the packet. With yaw_jump_limit set and a rotation, a velocity is
+    dropped when the heading jumped by more than that many degrees since the
+    previous bottom track packet. Unlike dead_reckon, which interpolates the
+    attitude to the measurement time, the latest attitude sample is used.
+
+    x, y and z are the position relative to the start (or the last reset),
+    distance the horizontal path length. rejected names why the last bottom
+    track velocity was not used: "missing" (fields), "status", "fom",
+    "still", "attitude" or "yaw_jump", None if it was.
+    """
+
+    def __init__(
+        self,
+        rotation="heading",
+        fom_limit=FOM_LIMIT,
+        velocity_threshold=VELOCITY_THRESHOLD,
+        yaw_jump_limit=None,
+        max_interval=MAX_INTERVAL,
+    ):
+
+        if rotation not in ROTATIONS:
+            raise ValueError("rotation must be one of {}".format(", ".join(ROTATIONS)))
+
+        self.rotation = rotation
+        self.fom_limit = fom_limit
+        self.velocity_threshold = velocity_threshold
+        self.yaw_jump_limit = yaw_jump_limit
+        self.max_interval = max_interval
+
+        self.roll = None
+        self.pitch = None
+        self.heading = None
+        self.yaw_jump = None
+
+        self.reset()
+
+    def reset(self):
+        """Restart the position at the origin."""
+
+        self.x = 0.0
+        self.y = 0.0
+        self.z = 0.0
+        self.distance = 0.0
+
+        self.time = None
+        self.velocity = None
+        self.fom_x = None
+        self.fom_y = None
+        self.rejected = None
+        self.jumped = False
+
+    def update(self, packet) -> bool:
+        """Process a decoded packet. Returns True if it moved the position."""
+
+        packet_id = packet.get("id")
+
+        if packet_id in (DataID.AHRS, DataID.INS):
+            self.update_attitude(packet)
+
+        elif packet_id == DataID.BOTTOM_TRACK:
+            return self.update_bottom_track(packet)
+
+        return False
+
+    def update_attitude(self, packet):
+
+        try:
+            heading = packet["ahrsData.heading"]
+            roll = packet["ahrsData.roll"]
+            pitch = packet["ahrsData.pitch"]
+        except KeyError:
+            return
+
+        if self.heading is not None:
+            self.yaw_jump = abs((heading - self.heading + 180.0) % 360.0 - 180.0)
+            if self.yaw_jump_limit is not None and self.yaw_jump > self.yaw_jump_limit:
+                self.jumped = True
+
+        self.roll, self.pitch, self.heading = roll, pitch, heading
+
+    def update_bottom_track(self, packet) -> bool:
+
+        try:
+            time = packet["timeStamp"] + packet["microSeconds"] * 1e-6
+            dt_xyz = packet["dtXYZ"]
+            vx, vy, vz = packet["velocityX"], packet["velocityY"], packet["velocityZ"]
+            self.fom_x, self.fom_y = packet["fomX"], packet["fomY"]
+            valid = packet["status.xVelocityValid"] and packet["status.yVelocityValid"]
+        except KeyError:
+            self.rejected = "missing"
+            return False
+
+        if math.isfinite(dt_xyz) and 0.0 <= dt_xyz < MAX_INTERVAL:
+            time += dt_xyz
+
+        if self.time is None:
+            time_velocity = packet.get("timeVelXYZ", 0.0)
+            interval = (
+                time_velocity
+                if math.isfinite(time_velocity) and time_velocity > 0.0
+                else 0.0
+            )
+        else:
+            interval = time - self.time
+        interval = min(max(interval, 0.0), self.max_interval)
+
+        self.time = time
+        self.velocity = (vx, vy, vz)
+
+        jumped = self.jumped
+        self.jumped = False
+
+        if self.rotation == "attitude":
+            valid = (
+                valid
+                and packet.get("status.zVelocityValid", False)
+                and math.isfinite(vz)
+            )
+
+        if not (valid and math.isfinite(vx) and math.isfinite(vy)):
+            self.rejected = "status"
+        elif self.fom_limit is not None and (
+            self.fom_x > self.fom_limit or self.fom_y > self.fom_limit
+        ):
+            self.rejected = "fom"
+        elif (
+            self.velocity_threshold is not None
+            and abs(vx) < self.velocity_threshold
+            and abs(vy) < self.velocity_threshold
+        ):
+            self.rejected = "still"
+        elif self.rotation != "none" and self.heading is None:
+            self.rejected = "attitude"
+        elif self.rotation != "none" and jumped:
+            self.rejected = "yaw_jump"
+        else:
+            self.rejected = None
+
+        if self.rejected is not None:
+            return False
+
+        if not math.isfinite(vz):
+            vz = 0.0
+
+        if self.rotation != "none":
+            yaw = math.radians(self.heading)
+            cos_yaw, sin_yaw = math.cos(yaw), math.sin(yaw)
+
+            if self.rotation == "heading":
+                vx, vy = cos_yaw * vx - sin_yaw * vy, sin_yaw * vx + cos_yaw * vy
+
+            else:
+                roll, pitch = math.radians(self.roll), math.radians(self.pitch)
+                cos_roll, sin_roll = math.cos(roll), math.sin(roll)
+                cos_pitch, sin_pitch = math.cos(pitch), math.sin(pitch)
+
+                vx, vy, vz = (
+                    cos_yaw * cos_pitch * vx
+                    + (cos_yaw * sin_pitch * sin_roll - sin_yaw * cos_roll) * vy
+                    + (cos_yaw * sin_pitch * cos_roll + sin_yaw * sin_roll) * vz,
+                    sin_yaw * cos_pitch * vx
+                    + (sin_yaw * sin_pitch * sin_roll + cos_yaw * cos_roll) * vy
+                    + (sin_yaw * sin_pitch * cos_roll - cos_yaw * sin_roll) * vz,
+                    -sin_pitch * vx
+                    + cos_pitch * sin_roll * vy
+                    + cos_pitch * cos_roll * vz,
+                )
+
+        dx, dy = vx * interval, vy * interval
+
+        self.x += dx
+        self.y += dy
+        self.z += vz * interval
+        self.distance += math.hypot(dx, dy)
+
+        return True
+
+    def drift(self) -> float:
+        """Horizontal distance from the start."""
+
+        return math.hypot(self.x, self.y)
+
+
+def sweep_settings(
+    fom_limits=SWEEP_FOM_LIMITS,
+    velocity_thresholds=SWEEP_VELOCITY_THRESHOLDS,
+    yaw_jump_limits=SWEEP_YAW_JUMP_LIMITS,
+    rotations=("heading",),
+):
+    """Every combination of the given thresholds, as dead_reckon keyword arguments."""
+
+    return [
+        {
+            "rotation": rotation,
+            "fom_limit": fom_limit,
+            "velocity_threshold": velocity_threshold,
+            "yaw_jump_limit": yaw_jump_limit,
+        }
+        for rotation, fom_limit, velocity_threshold, yaw_jump_limit in product(
+            rotations, fom_limits, velocity_thresholds, yaw_jump_limits
+        )
+    ]
+
+
+def final_drift(dive, settings, reference="ins"):
+    """Horizontal drift at the end of a dive dead-reckoned with settings.
+
+    reference "ins" is the difference to the INS position (None without INS
+    packets), "start" the distance from the start for dives that end where
+    they began.
+    """
+
+    trajectory = dead_reckon(dive["bottom_track"], dive["ahrs"], **settings)
+
+    if reference == "start":
+        return float(np.hypot(trajectory["x"][-1], trajectory["y"][-1]))
+
+    comparison = (
+        compare_ins(trajectory, dive["ins"]) if dive["ins"] is not None else None
+    )
+
+    return comparison["final"] if comparison is not None else None
+
+
+@lru_cache(maxsize=4)
+def _cached_dive(path):
+
+    return load_dive(path)
+
+
+def _sweep_dive(path, settings, reference):
+
+    dive = _cached_dive(path)
+    if dive["bottom_track"] is None or not len(dive["bottom_track"]):
+        return [None] * len(settings)
+
+    drifts = list()
+    for entry in settings:
+        try:
+            drifts.append(final_drift(dive, entry, reference))
+        except ValueError:
+            # rotation without attitude packets
+            drifts.append(None)
+
+    return drifts
+
+
+def sweep(paths, settings=None, reference="ins", workers=None):
+    """Replay recorded dives through dead_reckon for a grid of settings.
+
+    The dives are replayed in a process pool. settings is a list of
+    dead_reckon keyword arguments (default sweep_settings()). Each worker
+    task evaluates SWEEP_CHUNK_SIZE settings on one dive, which a worker
+    loads once and keeps. Returns one entry per setting, best first:
+    settings, drift per dive path (see final_drift, None where it could not
+    be computed) and the mean and max drift over the dives, sorted by mean
+    drift.
+    """
+
+    if reference not in REFERENCES:
+        raise ValueError("reference must be one of {}".format(", ".join(REFERENCES)))
+
+    if settings is None:
+        settings = sweep_settings()
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    paths = [str(path) for path in paths]
+    tasks = [
+        (path, start)
+        for path in paths
+        for start in range(0, len(settings), SWEEP_CHUNK_SIZE)
+    ]
+    chunks = [settings[start : start + SWEEP_CHUNK_SIZE] for _, start in tasks]
+
+    if workers <= 1 or len(tasks) <= 1:
+        results = [
+            _sweep_dive(path, chunk, reference)
+            for (path, _), chunk in zip(tasks, chunks)
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(
+                    _sweep_dive,
+                    [path for path, _ in tasks],
+                    chunks,
+                    [reference] * len(tasks),
+                )
+            )
+
+    entries = [{"settings": entry, "drift": dict()} for entry in settings]
+
+    for (path, start), drifts in zip(tasks, results):
+        for index, drift in enumerate(drifts):
+            entries[start + index]["drift"][path] = drift
+
+    for entry in entries:
+        drifts = [drift for drift in entry["drift"].values() if drift is not None]
+        entry["mean"] = sum(drifts) / len(drifts) if drifts else None
+        entry["max"] = max(drifts) if drifts else None
+
+    entries.sort(key=lambda entry: (entry["mean"] is None, entry["mean"] or 0.0))
+
+    return entries
+
+
+def _optional_float(value):
+
+    return None if value.lower() == "none" else float(value)
+
+
+def _format(value):
+
+    return "-" if value is None else "{:g}".format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dead-reckon recorded dives from their bottom track velocities"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    track_parser = subparsers.add_parser(
+        "track", help="Dead-reckon one dive and compare it with the INS position"
+    )
+    track_parser.add_argument(
+        "path", help="Log folder, .nucleus file, raw log or nucleus_log.csv"
+    )
+    track_parser.add_argument(
+        "--rotation",
+        choices=ROTATIONS,
+        default="heading",
+        help="Frame the velocities are rotated into",
+    )
+    track_parser.add_argument(
+        "--fom-limit",
+        type=_optional_float,
+        default=FOM_LIMIT,
+        help="Largest fomX/fomY used (none: no limit)",
+    )
+    track_parser.add_argument(
+        "--velocity-threshold",
+        type=float,
+        default=VELOCITY_THRESHOLD,
+        help="Smallest horizontal speed used (m/s)",
+    )
+    track_parser.add_argument(
+        "--yaw-jump-limit",
+        type=float,
+        default=None,
+        help="Drop velocities across heading jumps larger than this (deg)",
+    )
+
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="Final drift of recorded dives for a grid of gating thresholds"
+    )
+    sweep_parser.add_argument(
+        "paths",
+        nargs="+",
+        help="Log folders, .nucleus files, raw logs or nucleus_log.csv files",
+    )
+    sweep_parser.add_argument(
+        "--reference",
+        choices=REFERENCES,
+        default="ins",
+        help="Drift against the INS position or the start point",
+    )
+    sweep_parser.add_argument(
+        "--rotations",
+        nargs="+",
+        choices=ROTATIONS,
+        default=["heading"],
+        help="Rotations to try",
+    )
+    sweep_parser.add_argument(
+        "--fom-limits",
+        nargs="+",
+        type=_optional_float,
+        default=SWEEP_FOM_LIMITS,
+        help="FOM limits to try (none: no limit)",
+    )
+    sweep_parser.add_argument(
+        "--velocity-thresholds",
+        nargs="+",
+        type=float,
+        default=SWEEP_VELOCITY_THRESHOLDS,
+        help="Velocity thresholds to try (m/s)",
+    )
+    sweep_parser.add_argument(
+        "--yaw-jump-limits",
+        nargs="+",
+        type=_optional_float,
+        default=SWEEP_YAW_JUMP_LIMITS,
+        help="Yaw jump limits to try (deg, none: off)",
+    )
+    sweep_parser.add_argument(
+        "--top", type=int, default=10, help="Number of settings to print"
+    )
+    sweep_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: one per core)",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "sweep":
+        settings = sweep_settings(
+            args.fom_limits,
+            args.velocity_thresholds,
+            args.yaw_jump_limits,
+            args.rotations,
+        )
+        entries = sweep(
+            args.paths, settings, reference=args.reference, workers=args.workers
+        )
+
+        count = f"{len(settings)} settings x {len(args.paths)} dives"
+        print(f"🔁 {count}, drift against {args.reference}")
+        for entry in entries[: args.top]:
+            setting = entry["settings"]
+            fom = _format(setting["fom_limit"])
+            velocity = _format(setting["velocity_threshold"])
+            yaw_jump = _format(setting["yaw_jump_limit"])
+            print(
+                f"  {setting['rotation']} fom {fom} | velocity {velocity} | "
+                f"yaw jump {yaw_jump}: "
+                f"mean {_format(entry['mean'])} m | max {_format(entry['max'])} m"
+            )
+        return
+
+    dive = load_dive(args.path)
+    if dive["bottom_track"] is None or not len(dive["bottom_track"]):
+        print("❌ No bottom track packets in", args.path)
+        return
+
+    trajectory = dead_reckon(
+        dive["bottom_track"],
+        dive["ahrs"],
+        rotation=args.rotation,
+        fom_limit=args.fom_limit,
+        velocity_threshold=args.velocity_threshold,
+        yaw_jump_limit=args.yaw_jump_limit,
+    )
+
+    used = int(trajectory["used"].sum())
+    print(f"📍 {len(trajectory['time'])} BT packets, {used} used")
+    x, y, z = trajectory["x"][-1], trajectory["y"][-1], trajectory["z"][-1]
+    print(f"📍 Final X: {x:.3f} m | Y: {y:.3f} m | Z: {z:.3f} m")
+    print(
+        f"🧭 Total Distance: {trajectory['distance'][-1]:.3f} m | "
+        f"Distance from Start: {np.hypot(x, y):.3f} m"
+    )
+
+    comparison = (
+        compare_ins(trajectory, dive["ins"]) if dive["ins"] is not None else None
+    )
+    if comparison is not None:
+        print(
+            f"🛰️ INS difference: final {comparison['final']:.3f} m | "
+            f"max {comparison['max']:.3f} m"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,54 @@
 #!/usr/bin/env python3
 
-from nucleus_driver import NucleusDriver
-from enum import IntEnum
+import sys
+import threading
+import time
+from datetime import datetime
+from queue import Empty, Full, Queue
 
+from dvl_driver import DVLDriver
+from dvl_schema import DataID
 
-class DataID(IntEnum):
-    AHRS = 0xD2
-    ALTIMETER = 0xAA
-    BOTTOM_TRACK = 0xB4
+DISPATCH_MODES = ("thread", "parser")
+DASHBOARD_REFRESH_RATE = 4.0  # Hz
 
 
 class DVLReader:
-    def __init__(self, port="/dev/ttyUSB1"):
+    """Reads AHRS, altimeter and bottom track data from a Nucleus.
+
+    Packets can be pulled with the driver's read_packet (get_single) or
+    pushed to callbacks registered with on, as soon as the parser decodes
+    them. With dispatch "parser" callbacks run on the parser thread itself;
+    with "thread" the parser only queues the packet and a dispatch thread
+    runs the callbacks, so slow callbacks do not hold up the serial port.
+    When that queue is full the oldest packet is dropped and counted in
+    dropped.
+    """
+
+    def __init__(self, port="/dev/ttyUSB1", dispatch="thread", queue_size=1000):
+        if dispatch not in DISPATCH_MODES:
+            raise ValueError(
+                "dispatch must be one of {}".format(", ".join(DISPATCH_MODES))
+            )
+
         self.port = port
-        self.driver = NucleusDriver()
+        self.driver = DVLDriver()
         self.ahrs_data = None
         self.altimeter_data = None
         self.bt_data = None
 
+        self.dispatch = dispatch
+        self.handlers = dict()  # packet id (None: every packet) -> tuple of callbacks
+        self.queue = Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.thread = None
+        self.stopping = threading.Event()
+
+        # newest packet and packet count per type, for the dashboard; the keys
+        # are fixed so other threads can copy them safely
+        self.latest = dict.fromkeys(DataID)
+        self.counts = dict.fromkeys(DataID, 0)
+
     def setup(self):
         self.driver.set_serial_configuration(self.port)
         self.driver.connect(connection_type="serial")
@@ -33,6 +64,100 @@ class DVLReader:
         except Exception as e:
             print("Stop error:", e)
         self.driver.disconnect()
+        self._stop_dispatch()
+
+    def on(self, packet_id, callback):
+        """Call callback(packet) for every decoded packet with packet_id.
+
+        packet_id is a DataID, or None to receive every packet.
+        """
+
+        handlers = dict(self.handlers)
+        handlers[packet_id] = handlers.get(packet_id, ()) + (callback,)
+        self.handlers = handlers
+
+        if self.dispatch == "parser":
+            self.driver.parser.add_callback(callback, packet_id)
+
+        elif self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run_dispatch, daemon=True)
+            self.thread.start()
+            self.driver.parser.add_callback(self._enqueue)
+
+    def off(self, packet_id, callback):
+
+        handlers = dict(self.handlers)
+        remaining = tuple(
+            registered
+            for registered in handlers.get(packet_id, ())
+            if registered != callback
+        )
+        if remaining:
+            handlers[packet_id] = remaining
+        else:
+            handlers.pop(packet_id, None)
+        self.handlers = handlers
+
+        if self.dispatch == "parser":
+            self.driver.parser.remove_callback(callback, packet_id)
+
+    def _put(self, packet):
+        # drop the oldest packet to make room; if another put takes that room
+        # first, the new packet is dropped as well
+        try:
+            self.queue.put_nowait(packet)
+        except Full:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                pass
+            self.dropped += 1
+            try:
+                self.queue.put_nowait(packet)
+            except Full:
+                self.dropped += 1
+
+    def _enqueue(self, packet):
+        if self.stopping.is_set():
+            return
+
+        handlers = self.handlers
+        if packet["id"] in handlers or None in handlers:
+            self._put(packet)
+
+    def _run_dispatch(self):
+        while True:
+            try:
+                packet = self.queue.get(timeout=0.1)
+            except Empty:
+                # the stop marker is never dropped by _stop_dispatch, but a put
+                # racing in behind it could still push it out of a full queue
+                if self.stopping.is_set():
+                    return
+                continue
+
+            if packet is None:
+                return
+
+            handlers = self.handlers
+            for callback in handlers.get(packet["id"], ()) + handlers.get(None, ()):
+                try:
+                    callback(packet)
+                except Exception as e:
+                    print("Callback error:", e)
+
+    def _stop_dispatch(self):
+        if self.thread is None:
+            return
+
+        # a parser callback may still be running, so it is turned away before the
+        # stop marker is queued; the marker waits for room and is never dropped
+        self.stopping.set()
+        self.driver.parser.remove_callback(self._enqueue)
+        self.queue.put(None)
+        self.thread.join(timeout=2.0)
+        self.thread = None
 
     def parse_packet(self, pkt):
         if pkt["id"] == DataID.AHRS:
@@ -77,33 +202,155 @@ class DVLReader:
             if self.ahrs_data and self.altimeter_data and self.bt_data:
                 return {**self.ahrs_data, **self.altimeter_data, **self.bt_data}
 
-    def stream(self):
-        print("🔄 Streaming AHRS + Altimeter + Bottom Track... Press Ctrl-C to stop.")
+    def print_ahrs(self, pkt):
+        self.parse_packet(pkt)
+        if self.ahrs_data:
+            print(
+                f"🎯 RPY: {self.ahrs_data['roll']:.2f}, "
+                f"{self.ahrs_data['pitch']:.2f}, "
+                f"{self.ahrs_data['yaw']:.2f} | "
+                f"Depth: {self.ahrs_data['depth']:.2f} m"
+            )
+
+    def print_altimeter(self, pkt):
+        self.parse_packet(pkt)
+        if self.altimeter_data:
+            print(f"📏 Altimeter: {self.altimeter_data['altitude']:.2f} m")
+
+    def print_bottom_track(self, pkt):
+        self.parse_packet(pkt)
+        if self.bt_data:
+            print(f"📶 FOM X: {self.bt_data['fom_x']:.2f}")
+            print(f"📶 FOM Y: {self.bt_data['fom_y']:.2f}")
+            print(f"📶 FOM Z: {self.bt_data['fom_z']:.2f}")
+            print(f"📡 B1:     {self.bt_data['b1']:.2f} m")
+            print(f"📡 B2:     {self.bt_data['b2']:.2f} m")
+            print(f"📡 B3:     {self.bt_data['b3']:.2f} m")
+
+    def track(self, pkt):
+        packet_id = pkt["id"]
+        if packet_id in self.counts:
+            self.latest[packet_id] = pkt
+            self.counts[packet_id] += 1
+
+    def dashboard_lines(self, rates):
+        def value(packet_id, field, fmt="{:.2f}"):
+            pkt = self.latest[packet_id]
+            return fmt.format(pkt[field]) if pkt is not None and field in pkt else "-"
+
+        ahrs = DataID.AHRS if self.latest[DataID.AHRS] is not None else DataID.INS
+        bt = DataID.BOTTOM_TRACK
+
+        roll = value(ahrs, "ahrsData.roll")
+        pitch = value(ahrs, "ahrsData.pitch")
+        heading = value(ahrs, "ahrsData.heading")
+        fom = [value(bt, field) for field in ("fomX", "fomY", "fomZ")]
+        beams = [value(bt, f"distanceBeam{beam}") for beam in (1, 2, 3)]
+        velocity = [
+            value(bt, field, "{:.3f}")
+            for field in ("velocityX", "velocityY", "velocityZ")
+        ]
+        packet_rates = " | ".join(
+            f"{packet_id.name} {rate:.1f} Hz"
+            for packet_id, rate in rates.items()
+            if rate
+        )
+        log_dropped = self.driver.logger.statistics.get("dropped", 0)
+        failed_frames = self.driver.parser.failed_packets
+
+        return [
+            f"🔄 Nucleus {self.port} | {datetime.now():%H:%M:%S} | Press Ctrl-C to stop",
+            f"🎯 RPY:       {roll}, {pitch}, {heading}",
+            f"🌊 Depth:     {value(ahrs, 'depth')} m",
+            f"📏 Altimeter: {value(DataID.ALTIMETER, 'altimeterDistance')} m",
+            "📶 FOM:       X {} | Y {} | Z {}".format(*fom),
+            "📡 Beams:     B1 {} m | B2 {} m | B3 {} m".format(*beams),
+            "🚀 Velocity:  X {} | Y {} | Z {} m/s".format(*velocity),
+            f"⏱️ Rates:     {packet_rates or '-'}",
+            f"⚠️ Drops:     dispatch {self.dropped} | log {log_dropped} "
+            f"| failed frames {failed_frames}",
+        ]
+
+    def dashboard(self, refresh_rate=DASHBOARD_REFRESH_RATE, output=sys.stdout):
+        """Show the latest values in place, redrawn refresh_rate times per second.
+
+        A callback only keeps the newest packet of each type and counts them,
+        so drawing costs the same at any packet rate. Rates are measured over
+        the last refresh interval. Without a terminal a snapshot is printed
+        per refresh instead.
+        """
+        if not refresh_rate > 0:
+            raise ValueError(
+                "refresh_rate must be positive, not {}".format(refresh_rate)
+            )
+
+        self.on(None, self.track)
+        self.driver.parser.set_queuing(packet=False)
+
+        interactive = output.isatty()
+        interval = 1.0 / refresh_rate
+        stopped = threading.Event()
+
+        if interactive:
+            output.write("\x1b[?25l\x1b[2J")  # hide the cursor, clear the screen
+
         try:
+            previous_counts = dict(self.counts)
+            previous_time = time.monotonic()
+            deadline = previous_time
+
             while True:
-                pkt = self.driver.read_packet(timeout=2.0)
-                if not pkt:
-                    continue
-                self.parse_packet(pkt)
-
-                if self.ahrs_data:
-                    print(
-                        f"🎯 RPY: {self.ahrs_data['roll']:.2f}, "
-                        f"{self.ahrs_data['pitch']:.2f}, "
-                        f"{self.ahrs_data['yaw']:.2f} | "
-                        f"Depth: {self.ahrs_data['depth']:.2f} m"
+                deadline += interval
+                stopped.wait(max(0.0, deadline - time.monotonic()))
+
+                now = time.monotonic()
+                counts = dict(self.counts)
+                elapsed = now - previous_time
+                rates = {
+                    packet_id: (counts[packet_id] - previous_counts[packet_id])
+                    / elapsed
+                    for packet_id in counts
+                }
+                previous_counts, previous_time = counts, now
+
+                lines = self.dashboard_lines(rates)
+                if interactive:
+                    # back to the top left, each line cleared to its end, anything
+                    # below cleared
+                    output.write(
+                        "\x1b[H"
+                        + "".join(line + "\x1b[K\n" for line in lines)
+                        + "\x1b[J"
                     )
+                else:
+                    output.write("\n".join(lines) + "\n\n")
+                output.flush()
 
-                if self.altimeter_data:
-                    print(f"📏 Altimeter: {self.altimeter_data['altitude']:.2f} m")
+        except KeyboardInterrupt:
+            print("\n⏹️ Stopped by user.")
+        finally:
+            if interactive:
+                output.write("\x1b[?25h")
+                output.flush()
+            self.off(None, self.track)
+            self.driver.parser.set_queuing(packet=True)
+
+    def stream(self):
+        print("🔄 Streaming AHRS + Altimeter + Bottom Track... Press Ctrl-C to stop.")
+
+        self.on(DataID.AHRS, self.print_ahrs)
+        self.on(DataID.ALTIMETER, self.print_altimeter)
+        self.on(DataID.BOTTOM_TRACK, self.print_bottom_track)
 
-                if self.bt_data:
-                    print(f"📶 FOM X: {self.bt_data['fom_x']:.2f}")
-                    print(f"📶 FOM Y: {self.bt_data['fom_y']:.2f}")
-                    print(f"📶 FOM Z: {self.bt_data['fom_z']:.2f}")
-                    print(f"📡 B1:     {self.bt_data['b1']:.2f} m")
-                    print(f"📡 B2:     {self.bt_data['b2']:.2f} m")
-                    print(f"📡 B3:     {self.bt_data['b3']:.2f} m")
+        # packets reach the callbacks directly; nothing reads the driver queue meanwhile
+        self.driver.parser.set_queuing(packet=False)
 
+        try:
+            threading.Event().wait()
         except KeyboardInterrupt:
             print("\n⏹️ Stopped by user.")
+        finally:
+            self.off(DataID.AHRS, self.print_ahrs)
+            self.off(DataID.ALTIMETER, self.print_altimeter)
+            self.off(DataID.BOTTOM_TRACK, self.print_bottom_track)
+            self.driver.parser.set_queuing(packet=True)
@@ -0,0 +1,935 @@
+#!/usr/bin/env python3
+
+from enum import IntEnum
+from struct import Struct, calcsize, pack_into, unpack_from
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+SYNC_BYTE = 0xA5
+HEADER_SIZE = 10
+CHECKSUM_SEED = 0xB58C
+
+FAMILY_NUCLEUS = 0x20
+FAMILY_DVL = 0x16
+
+
+class DataID(IntEnum):
+    IMU = 0x82
+    MAGNETOMETER = 0x87
+    FIELD_CALIBRATION = 0x8B
+    FAST_PRESSURE = 0x96
+    ASCII = 0xA0
+    ALTIMETER = 0xAA
+    BOTTOM_TRACK = 0xB4
+    WATER_TRACK = 0xBE
+    CURRENT_PROFILE = 0xC0
+    AHRS = 0xD2
+    INS = 0xDC
+    SPECTRUM_ANALYZER = 0x20
+
+
+class Field(NamedTuple):
+    name: str
+    fmt: str
+    offset: int
+    relative: bool = False  # offset counts from the packet's offsetOfData
+
+
+class Status(NamedTuple):
+    offset: int
+    bits: tuple  # ((name, bit), ...)
+    fmt: str = "I"
+    relative: bool = False
+
+
+class Cells(NamedTuple):
+    name: str
+    fmt: str
+    cell_offset: int  # bytes per cell preceding this block, from offsetOfData
+    count: str = "numberOfCells"
+    per_cell: int = 3
+
+
+class Raw(NamedTuple):
+    name: str
+    wrap: bool = False
+
+
+class Layout(NamedTuple):
+    family: int
+    id: int
+    version: object  # None matches any version without a dedicated layout
+    items: tuple
+    common: bool = True
+
+
+HEADER_FIELDS = (
+    ("sizeHeader", "u1"),
+    ("id", "u1"),
+    ("family", "u1"),
+    ("sizeData", "u2"),
+    ("size", "u2"),
+    ("dataCheckSum", "u2"),
+    ("headerCheckSum", "u2"),
+)
+
+COMMON_FIELDS = (
+    ("version", "u1"),
+    ("offsetOfData", "u1"),
+    ("flags.posixTime", "?"),
+    ("timeStamp", "u4"),
+    ("microSeconds", "u4"),
+)
+
+DRIVER_FIELDS = (("timestampPython", "f8"),)
+
+_HEADER = Struct("<BBBBHHH")
+_COMMON = Struct("<BBBxII")
+
+_NUMPY_TYPES = {
+    "B": "u1",
+    "H": "u2",
+    "I": "u4",
+    "b": "i1",
+    "h": "i2",
+    "i": "i4",
+    "f": "f4",
+    "d": "f8",
+}
+_STRUCT_TYPES = {numpy_type: fmt for fmt, numpy_type in _NUMPY_TYPES.items()}
+_STRUCT_TYPES["?"] = "?"
+
+
+def _run(fmt, start, names, relative=True):
+    size = calcsize("<" + fmt)
+    return tuple(
+        Field(name, fmt, start + index * size, relative)
+        for index, name in enumerate(names)
+    )
+
+
+def _bits(*names_and_bits):
+    return tuple(names_and_bits)
+
+
+AHRS_DATA = (
+    "ahrsData.roll",
+    "ahrsData.pitch",
+    "ahrsData.heading",
+    "ahrsData.quaternionW",
+    "ahrsData.quaternionX",
+    "ahrsData.quaternionY",
+    "ahrsData.quaternionZ",
+    *("ahrsData.rotationMatrix_{}".format(index) for index in range(9)),
+    "declination",
+    "depth",
+)
+
+AHRS_ITEMS = (
+    Field("serialNumber", "I", 16),
+    Field("operationMode", "B", 24),
+    *_run("f", 0, AHRS_DATA),
+)
+
+INS_ITEMS = (
+    Field("serialNumber", "I", 16),
+    Field("operationMode", "B", 24),
+    Field("fomAhrs", "f", 28),
+    Field("fomFc1", "f", 32),
+    *_run("f", 0, AHRS_DATA),
+    Field("fomIns", "f", 72, True),
+    Status(76, _bits(("statusIns.latLonIsValid", 0)), relative=True),
+    *_run("f", 80, ("courseOverGround", "temperature", "pressure", "altitude")),
+    *_run("d", 96, ("latitude", "longitude")),
+    *_run(
+        "f",
+        120,
+        (
+            "positionFrameX",
+            "positionFrameY",
+            "positionFrameZ",
+            "velocityNedX",
+            "velocityNedY",
+            "velocityNedZ",
+            "velocityNucleusX",
+            "velocityNucleusY",
+            "velocityNucleusZ",
+            "speedOverGround",
+            "turnRateX",
+            "turnRateY",
+            "turnRateZ",
+        ),
+    ),
+)
+
+IMU_ITEMS = (
+    Status(
+        12,
+        _bits(
+            ("status.isValid", 0),
+            ("status.hasChecksumError", 15),
+            ("status.hasDataPathOverrun", 17),
+            ("status.hasFlashUpdateFailure", 18),
+            ("status.hasSpiComError", 19),
+            ("status.hasLowVoltage", 20),
+            ("status.hasSensorFailure", 21),
+            ("status.hasMemoryFailure", 22),
+            ("status.hasGyro1Failure", 23),
+            ("status.hasGyro2Failure", 24),
+            ("status.hasAccelerometerFailure", 25),
+        ),
+    ),
+    *_run(
+        "f",
+        0,
+        (
+            "accelerometer.x",
+            "accelerometer.y",
+            "accelerometer.z",
+            "gyro.x",
+            "gyro.y",
+            "gyro.z",
+            "temperature",
+        ),
+    ),
+)
+
+MAGNETOMETER_ITEMS = (
+    Status(
+        12,
+        _bits(
+            ("status.isCompensatedForHardIron", 0),
+            ("status.dvlActive", 29),
+            ("status.dvlAcousticsActive", 30),
+            ("status.dvlTransmitterActive", 31),
+        ),
+    ),
+    *_run("f", 0, ("magnetometer.x", "magnetometer.y", "magnetometer.z")),
+)
+
+BOTTOM_TRACK_ITEMS = (
+    Status(
+        12,
+        _bits(
+            ("status.beam1VelocityValid", 0),
+            ("status.beam2VelocityValid", 1),
+            ("status.beam3VelocityValid", 2),
+            ("status.beam1DistanceValid", 3),
+            ("status.beam2DistanceValid", 4),
+            ("status.beam3DistanceValid", 5),
+            ("status.beam1FomValid", 6),
+            ("status.beam2FomValid", 7),
+            ("status.beam3FomValid", 8),
+            ("status.xVelocityValid", 9),
+            ("status.yVelocityValid", 10),
+            ("status.zVelocityValid", 11),
+            ("status.xFomValid", 12),
+            ("status.yFomValid", 13),
+            ("status.zFomValid", 14),
+        ),
+    ),
+    Field("serialNumber", "I", 16),
+    *_run(
+        "f",
+        24,
+        (
+            "soundSpeed",
+            "temperature",
+            "pressure",
+            "velocityBeam1",
+            "velocityBeam2",
+            "velocityBeam3",
+            "distanceBeam1",
+            "distanceBeam2",
+            "distanceBeam3",
+            "fomBeam1",
+            "fomBeam2",
+            "fomBeam3",
+            "dtBeam1",
+            "dtBeam2",
+            "dtBeam3",
+            "timeVelBeam1",
+            "timeVelBeam2",
+            "timeVelBeam3",
+            "velocityX",
+            "velocityY",
+            "velocityZ",
+            "fomX",
+            "fomY",
+            "fomZ",
+            "dtXYZ",
+            "timeVelXYZ",
+        ),
+        relative=False,
+    ),
+)
+
+ALTIMETER_ITEMS = (
+    Status(
+        12,
+        _bits(
+            ("status.altimeterDistanceValid", 0),
+            ("status.altimeterQualityValid", 1),
+            ("status.pressureValid", 16),
+            ("status.temperatureValid", 17),
+        ),
+    ),
+    Field("serialNumber", "I", 16),
+    *_run(
+        "f",
+        24,
+        ("soundSpeed", "temperature", "pressure", "altimeterDistance"),
+        relative=False,
+    ),
+    Field("altimeterQuality", "H", 40),
+)
+
+CURRENT_PROFILE_ITEMS = (
+    Field("serialNumber", "I", 16),
+    *_run(
+        "f",
+        24,
+        ("soundVelocity", "temperature", "pressure", "cellSize", "blanking"),
+        relative=False,
+    ),
+    Field("numberOfCells", "H", 44),
+    Field("ambiguityVelocity", "H", 46),
+    Cells("velocityData", "h", 0),
+    Cells("amplitudeData", "B", 6),
+    Cells("correlationData", "B", 9),
+)
+
+FIELD_CALIBRATION_ITEMS = (
+    Status(12, _bits(("status.pointsUsedInEstimation", 0))),
+    *_run(
+        "f",
+        0,
+        (
+            "hardIron.x",
+            "hardIron.y",
+            "hardIron.z",
+            *("sAxis_{}".format(index) for index in range(9)),
+            "newPoint.x",
+            "newPoint.y",
+            "newPoint.z",
+            "fomFieldCalibration",
+            "coverage",
+        ),
+    ),
+)
+
+LAYOUTS = (
+    Layout(FAMILY_NUCLEUS, DataID.AHRS, None, AHRS_ITEMS),
+    Layout(
+        FAMILY_NUCLEUS,
+        DataID.AHRS,
+        1,
+        AHRS_ITEMS + (Field("fomAhrs", "B", 25), Field("fomFc1", "B", 26)),
+    ),
+    Layout(
+        FAMILY_NUCLEUS,
+        DataID.AHRS,
+        2,
+        AHRS_ITEMS + (Field("fomAhrs", "f", 28), Field("fomFc1", "f", 32)),
+    ),
+    Layout(FAMILY_NUCLEUS, DataID.INS, None, INS_ITEMS),
+    Layout(FAMILY_NUCLEUS, DataID.IMU, None, IMU_ITEMS),
+    Layout(FAMILY_NUCLEUS, DataID.MAGNETOMETER, None, MAGNETOMETER_ITEMS),
+    Layout(FAMILY_NUCLEUS, DataID.BOTTOM_TRACK, None, BOTTOM_TRACK_ITEMS),
+    Layout(FAMILY_NUCLEUS, DataID.WATER_TRACK, None, BOTTOM_TRACK_ITEMS),
+    Layout(FAMILY_NUCLEUS, DataID.ALTIMETER, None, ALTIMETER_ITEMS),
+    Layout(FAMILY_NUCLEUS, DataID.CURRENT_PROFILE, None, CURRENT_PROFILE_ITEMS),
+    Layout(FAMILY_NUCLEUS, DataID.FIELD_CALIBRATION, None, FIELD_CALIBRATION_ITEMS),
+    Layout(
+        FAMILY_NUCLEUS,
+        DataID.FAST_PRESSURE,
+        None,
+        (Field("fast_pressure", "f", 0, True),),
+    ),
+    Layout(
+        FAMILY_NUCLEUS, DataID.ASCII, None, (Raw("string", wrap=True),), common=False
+    ),
+    Layout(FAMILY_DVL, DataID.SPECTRUM_ANALYZER, None, (Raw("data"),)),
+)
+
+# Order in which the sparse nucleus_log.csv header is assembled by Logger
+LOG_ORDER = (
+    (FAMILY_NUCLEUS, DataID.AHRS, 2),
+    (FAMILY_NUCLEUS, DataID.INS, None),
+    (FAMILY_NUCLEUS, DataID.IMU, None),
+    (FAMILY_NUCLEUS, DataID.MAGNETOMETER, None),
+    (FAMILY_NUCLEUS, DataID.BOTTOM_TRACK, None),
+    (FAMILY_NUCLEUS, DataID.ALTIMETER, None),
+    (FAMILY_NUCLEUS, DataID.FAST_PRESSURE, None),
+    (FAMILY_NUCLEUS, DataID.FIELD_CALIBRATION, None),
+    (FAMILY_NUCLEUS, DataID.ASCII, None),
+)
+
+
+def checksum(data, start=0, end=None):
+    """Nucleus 16 bit checksum of data[start:end], equal to Parser.checksum."""
+
+    if end is None:
+        end = len(data)
+
+    words = (end - start) // 2
+    total = CHECKSUM_SEED + sum(unpack_from("<{}H".format(words), data, start))
+
+    if (end - start) % 2:
+        total += data[end - 1] << 8
+
+    return total & 0xFFFF
+
+
+def sensor_names(layout):
+    """Column names produced by a layout, in decode order. Cells are not expanded."""
+
+    names = list()
+    for item in layout.items:
+        if isinstance(item, Status):
+            names.extend(name for name, _ in item.bits)
+        elif not isinstance(item, Cells):
+            names.append(item.name)
+
+    return names
+
+
+def _scalar_struct(items):
+
+    fmt = "<"
+    position = 0
+    for item in sorted(items, key=lambda item: item.offset):
+        if item.offset < position:
+            raise ValueError("overlapping fields at offset {}".format(item.offset))
+        fmt += "{}x".format(item.offset - position) if item.offset > position else ""
+        fmt += item.fmt
+        position = item.offset + calcsize("<" + item.fmt)
+
+    return Struct(fmt)
+
+
+def _compile_decoder(layout):
+
+    scalars = [item for item in layout.items if isinstance(item, (Field, Status))]
+    absolute = sorted(
+        (item for item in scalars if not item.relative), key=lambda item: item.offset
+    )
+    relative = sorted(
+        (item for item in scalars if item.relative), key=lambda item: item.offset
+    )
+
+    namespace = {"unpack_from": unpack_from}
+    lines = ["def decode(data, rel):"]
+
+    slots = dict()
+    for variable, items in (("a", absolute), ("r", relative)):
+        if not items:
+            continue
+        namespace["_" + variable] = _scalar_struct(items)
+        lines.append(
+            "    {0} = _{0}.unpack_from(data, {1})".format(
+                variable, "0" if variable == "a" else "rel"
+            )
+        )
+        for index, item in enumerate(items):
+            slots[id(item)] = "{}[{}]".format(variable, index)
+
+    entries = list()
+    for item in layout.items:
+        if isinstance(item, Field):
+            entries.append("{!r}: {}".format(item.name, slots[id(item)]))
+        elif isinstance(item, Status):
+            entries.extend(
+                "{!r}: ({} >> {}) & 1 == 1".format(name, slots[id(item)], bit)
+                for name, bit in item.bits
+            )
+        elif isinstance(item, Raw):
+            entries.append(
+                "{!r}: {}".format(
+                    item.name, "(bytes(data),)" if item.wrap else "bytearray(data)"
+                )
+            )
+
+    lines.append("    out = {" + ", ".join(entries) + "}")
+
+    for item in layout.items:
+        if isinstance(item, Cells):
+            lines.append("    n = out[{!r}] * {}".format(item.count, item.per_cell))
+            unpack = "    values = unpack_from('<%d{}' % n, data, rel + {} * n // {})"
+            lines.append(unpack.format(item.fmt, item.cell_offset, item.per_cell))
+            lines.append("    for index, value in enumerate(values):")
+            lines.append("        out['{}_%d' % index] = value".format(item.name))
+
+    lines.append("    return out")
+
+    exec("\n".join(lines), namespace)
+
+    return namespace["decode"]
+
+
+def _default_offset(layout):
+
+    end = 16
+    for item in layout.items:
+        if isinstance(item, (Field, Status)) and not item.relative:
+            end = max(end, item.offset + calcsize("<" + item.fmt))
+
+    return (end + 3) // 4 * 4
+
+
+def _compile_encoder(layout):
+
+    def encode(packet):
+
+        for item in layout.items:
+            if isinstance(item, Raw):
+                return bytes(packet[item.name][0] if item.wrap else packet[item.name])
+
+        offset = packet.get("offsetOfData", _default_offset(layout))
+        cells = packet.get("numberOfCells", 0)
+
+        size = _COMMON.size
+        for item in layout.items:
+            if isinstance(item, Cells):
+                size = max(
+                    size,
+                    offset
+                    + (item.cell_offset + calcsize("<" + item.fmt) * item.per_cell)
+                    * cells,
+                )
+            else:
+                size = max(
+                    size,
+                    item.offset
+                    + (offset if item.relative else 0)
+                    + calcsize("<" + item.fmt),
+                )
+
+        data = bytearray(size)
+
+        flags = 1 if packet.get("flags.posixTime") else 0
+        _COMMON.pack_into(
+            data,
+            0,
+            packet.get("version", 0),
+            offset,
+            flags,
+            packet.get("timeStamp", 0),
+            packet.get("microSeconds", 0),
+        )
+
+        for item in layout.items:
+            base = offset if getattr(item, "relative", False) else 0
+            if isinstance(item, Field):
+                pack_into(
+                    "<" + item.fmt, data, base + item.offset, packet.get(item.name, 0)
+                )
+            elif isinstance(item, Status):
+                word = 0
+                for name, bit in item.bits:
+                    if packet.get(name):
+                        word |= 1 << bit
+                pack_into("<" + item.fmt, data, base + item.offset, word)
+            elif isinstance(item, Cells):
+                count = cells * item.per_cell
+                values = [
+                    packet.get("{}_{}".format(item.name, index), 0)
+                    for index in range(count)
+                ]
+                pack_into(
+                    "<{}{}".format(count, item.fmt),
+                    data,
+                    offset + item.cell_offset * cells,
+                    *values
+                )
+
+        return bytes(data)
+
+    return encode
+
+
+def _record_fields(layout):
+    """Fixed-width record fields (name, numpy type) of a layout.
+
+    None if the layout has variable parts.
+    """
+
+    if any(isinstance(item, (Cells, Raw)) for item in layout.items):
+        return None
+
+    fields = list(HEADER_FIELDS) + list(COMMON_FIELDS) + list(DRIVER_FIELDS)
+    for item in layout.items:
+        if isinstance(item, Status):
+            fields.extend((name, "?") for name, _ in item.bits)
+        else:
+            fields.append((item.name, _NUMPY_TYPES[item.fmt]))
+
+    return tuple(fields)
+
+
+def _record_struct(fields):
+
+    if fields is None:
+        return None
+
+    return Struct("<" + "".join(_STRUCT_TYPES[numpy_type] for _, numpy_type in fields))
+
+
+def _numpy_dtype(fields):
+
+    if np is None or fields is None:
+        return None
+
+    return np.dtype(list(fields))
+
+
+DECODERS = {
+    (layout.family, layout.id, layout.version): _compile_decoder(layout)
+    for layout in LAYOUTS
+}
+ENCODERS = {
+    (layout.family, layout.id, layout.version): _compile_encoder(layout)
+    for layout in LAYOUTS
+}
+SCHEMAS = {(layout.family, layout.id, layout.version): layout for layout in LAYOUTS}
+RECORD_FIELDS = {key: _record_fields(layout) for key, layout in SCHEMAS.items()}
+RECORD_STRUCTS = {key: _record_struct(fields) for key, fields in RECORD_FIELDS.items()}
+DTYPES = {key: _numpy_dtype(fields) for key, fields in RECORD_FIELDS.items()}
+
+
+def layout_key(family, packet_id, version=None):
+    """Key of the layout used for a packet, preferring a version specific layout."""
+
+    if (family, packet_id, version) in SCHEMAS:
+        return family, packet_id, version
+
+    if (family, packet_id, None) in SCHEMAS:
+        return family, packet_id, None
+
+    return None
+
+
+def field_names(family, packet_id, version=None):
+    """Per-ID log columns: header, common, driver and sensor fields."""
+
+    key = layout_key(family, packet_id, version)
+    if key is None:
+        return None
+
+    layout = SCHEMAS[key]
+    names = [name for name, _ in HEADER_FIELDS]
+    if layout.common:
+        names += [name for name, _ in COMMON_FIELDS]
+    names += [name for name, _ in DRIVER_FIELDS]
+
+    return names + sensor_names(layout)
+
+
+def merged_field_names():
+    """Column names of the sparse nucleus_log.csv written by Logger."""
+
+    names = [name for name, _ in HEADER_FIELDS + COMMON_FIELDS + DRIVER_FIELDS] + [
+        "isValid"
+    ]
+    for key in LOG_ORDER:
+        for name in sensor_names(SCHEMAS[key]):
+            if name not in names:
+                names.append(name)
+
+    return names
+
+
+def layout_name(key):
+    """File friendly name of a layout key, e.g. bottom_track or ahrs_v2."""
+
+    family, packet_id, version = key
+    name = DataID(packet_id).name.lower()
+
+    if family != FAMILY_NUCLEUS:
+        name = "family{:02x}_{}".format(family, name)
+
+    if version is not None:
+        name += "_v{}".format(version)
+
+    return name
+
+
+def numpy_dtype(family, packet_id, version=None):
+
+    key = layout_key(family, packet_id, version)
+
+    return DTYPES[key] if key is not None else None
+
+
+def decode_header(frame, offset=0):
+    """Header dict of the frame starting at offset."""
+
+    _, size_header, packet_id, family, size_data, data_checksum, header_checksum = (
+        _HEADER.unpack_from(frame, offset)
+    )
+
+    return {
+        "sizeHeader": size_header,
+        "id": packet_id,
+        "family": family,
+        "sizeData": size_data,
+        "size": size_header + size_data,
+        "dataCheckSum": data_checksum,
+        "headerCheckSum": header_checksum,
+    }
+
+
+def decode_common(data):
+    """Common data block shared by all non-ASCII packets."""
+
+    version, offset_of_data, flags, time_stamp, micro_seconds = _COMMON.unpack_from(
+        data, 0
+    )
+
+    return {
+        "version": version,
+        "offsetOfData": offset_of_data,
+        "flags.posixTime": flags & 1 == 1,
+        "timeStamp": time_stamp,
+        "microSeconds": micro_seconds,
+    }
+
+
+def decode_sensor(family, packet_id, version, data, offset_of_data=0):
+    """Sensor fields of a packet, or None if no layout is known for it.
+
+    Raises struct.error if the data is shorter than the layout.
+    """
+
+    key = layout_key(family, packet_id, version)
+    if key is None:
+        return None
+
+    return DECODERS[key](data, offset_of_data)
+
+
+def decode_packet(frame, offset=0, timestamp=None):
+    """Decode a checksum-verified frame into the packet dict Parser.get_packet produces.
+
+    Returns None if no layout is known for the packet. Raises struct.error if
+    the data is shorter than the layout.
+    """
+
+    packet = decode_header(frame, offset)
+
+    start = offset + packet["sizeHeader"]
+    data = frame[start : start + packet["sizeData"]]
+
+    if packet["id"] != DataID.ASCII:
+        packet.update(decode_common(data))
+
+    packet["timestampPython"] = timestamp
+
+    sensor = decode_sensor(
+        packet["family"],
+        packet["id"],
+        packet.get("version"),
+        data,
+        packet.get("offsetOfData", 0),
+    )
+    if sensor is None:
+        return None
+
+    packet.update(sensor)
+
+    return packet
+
+
+BATCH_BLOCK = 65536  # frames gathered per block by decode_batch
+
+
+def _batch_view(key, size_header, offset_of_data):
+    """Structured dtype laying a layout's fields over a whole frame.
+
+    Status words are left unexpanded.
+    """
+
+    layout = SCHEMAS[key]
+
+    names = [
+        "sizeHeader",
+        "id",
+        "family",
+        "sizeData",
+        "dataCheckSum",
+        "headerCheckSum",
+        "version",
+        "offsetOfData",
+        "flags",
+        "timeStamp",
+        "microSeconds",
+    ]
+    formats = ["u1", "u1", "u1", "<u2", "<u2", "<u2", "u1", "u1", "u1", "<u4", "<u4"]
+    offsets = [
+        1,
+        2,
+        3,
+        4,
+        6,
+        8,
+        size_header,
+        size_header + 1,
+        size_header + 2,
+        size_header + 4,
+        size_header + 8,
+    ]
+
+    for index, item in enumerate(layout.items):
+        names.append(
+            item.name if isinstance(item, Field) else "_status{}".format(index)
+        )
+        formats.append("<" + _NUMPY_TYPES[item.fmt])
+        offsets.append(
+            size_header + (offset_of_data if item.relative else 0) + item.offset
+        )
+
+    itemsize = max(
+        max(offset + np.dtype(fmt).itemsize for offset, fmt in zip(offsets, formats)),
+        size_header + _COMMON.size,
+    )
+
+    return np.dtype(
+        {"names": names, "formats": formats, "offsets": offsets, "itemsize": itemsize}
+    )
+
+
+def decode_batch(buffer, offsets, timestamps=None):
+    """Decode many checksum-verified frames at once into NumPy structured arrays.
+
+    offsets are the frame starts in buffer (e.g. from find_frames or a
+    PacketIndex), timestamps the optional host times that go to
+    timestampPython (NaN otherwise). Frames are grouped by layout and data
+    offset, gathered a block at a time into rows of equal width and read
+    with np.frombuffer through a dtype with the layout's field offsets, so
+    there is no Python work per packet. Status words are expanded into the
+    same boolean columns decode_packet produces.
+
+    Returns a dict of layout key to an array of DTYPES[key], in buffer
+    order. Layouts with variable parts (current profile, ASCII) and frames
+    shorter than their layout are left out; use decode_packet for those.
+    """
+
+    data = np.frombuffer(buffer, dtype="u1")
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    if timestamps is None:
+        timestamps = np.full(len(offsets), np.nan)
+    timestamps = np.asarray(timestamps, dtype="f8")
+
+    size_header = data[offsets + 1].astype(np.int64)
+    has_common = offsets + size_header + 2 <= len(data)
+    offsets, timestamps, size_header = (
+        offsets[has_common],
+        timestamps[has_common],
+        size_header[has_common],
+    )
+
+    frame_size = (
+        size_header + data[offsets + 4] + (data[offsets + 5].astype(np.int64) << 8)
+    )
+    groups = (
+        data[offsets + 3].astype(np.int64) << 32
+        | data[offsets + 2].astype(np.int64) << 24
+        | data[offsets + size_header].astype(np.int64) << 16
+        | size_header << 8
+        | data[offsets + size_header + 1]
+    )
+
+    parts = dict()
+
+    for group in np.unique(groups):
+
+        family, packet_id, version, header, offset_of_data = (
+            int(group) >> shift & 0xFF for shift in (32, 24, 16, 8, 0)
+        )
+
+        key = layout_key(family, packet_id, version)
+        if key is None or DTYPES[key] is None:
+            continue
+
+        view = _batch_view(key, header, offset_of_data)
+
+        selected = np.flatnonzero(
+            (groups == group)
+            & (frame_size >= view.itemsize)
+            & (offsets + view.itemsize <= len(data))
+        )
+        if not len(selected):
+            continue
+
+        records = np.empty(len(selected), dtype=DTYPES[key])
+        span = np.arange(view.itemsize)
+
+        for block in range(0, len(selected), BATCH_BLOCK):
+
+            rows = selected[block : block + BATCH_BLOCK]
+            frames = np.frombuffer(
+                np.ascontiguousarray(data[offsets[rows, None] + span]), dtype=view
+            )
+            out = records[block : block + len(rows)]
+
+            for name in DTYPES[key].names:
+                if name in view.names:
+                    out[name] = frames[name]
+
+            out["size"] = frames["sizeHeader"] + frames["sizeData"]
+            out["flags.posixTime"] = frames["flags"] & 1 == 1
+            out["timestampPython"] = timestamps[rows]
+
+            for index, item in enumerate(SCHEMAS[key].items):
+                if isinstance(item, Status):
+                    for name, bit in item.bits:
+                        out[name] = (frames["_status{}".format(index)] >> bit) & 1 == 1
+
+        parts.setdefault(key, list()).append((offsets[selected], records))
+
+    arrays = dict()
+    for key, chunks in parts.items():
+        if len(chunks) == 1:
+            arrays[key] = chunks[0][1]
+        else:
+            order = np.argsort(
+                np.concatenate([chunk[0] for chunk in chunks]), kind="stable"
+            )
+            arrays[key] = np.concatenate([chunk[1] for chunk in chunks])[order]
+
+    return arrays
+
+
+def encode_packet(packet, family=FAMILY_NUCLEUS):
+    """Build a complete frame (header and data) from a packet dict."""
+
+    family = packet.get("family", family)
+    key = layout_key(family, packet["id"], packet.get("version"))
+    if key is None:
+        raise KeyError(
+            "no layout for family 0x{:02x} id 0x{:02x}".format(family, packet["id"])
+        )
+
+    data = ENCODERS[key](packet)
+
+    header = bytearray(HEADER_SIZE)
+    _HEADER.pack_into(
+        header,
+        0,
+        SYNC_BYTE,
+        HEADER_SIZE,
+        packet["id"],
+        family,
+        len(data),
+        checksum(data),
+        0,
+    )
+    header[8:10] = checksum(header, 0, 8).to_bytes(2, "little")
+
+    return bytes(header) + data
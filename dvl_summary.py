@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+from math import fsum, sqrt
+from pathlib import Path
+
+import dvl_schema
+from dvl_files import iter_packets, load_columns, log_sources
+from dvl_logging import COLUMNS_MANIFEST_FILE
+
+SUMMARY_FILE = "summary.json"
+SUMMARY_VERSION = 1
+
+BATCH_SIZE = 4096
+GAP_FACTOR = 3.0  # an interval this many times the mean interval so far is a gap
+GAP_MIN_INTERVALS = 10
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min and max of a stream of numbers.
+
+    Values are added in batches; each batch is reduced on its own and merged
+    into the running moments (Welford's update in the pairwise form of Chan
+    et al.), so the variance stays accurate over millions of values.
+    Booleans count as 0 and 1, which makes the mean of a status bit its
+    valid ratio. None and NaN are skipped.
+    """
+
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self):
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, values):
+
+        values = [
+            value
+            for value in values
+            if isinstance(value, (int, float)) and value == value
+        ]
+        if not values:
+            return
+
+        count = len(values)
+        mean = fsum(values) / count
+        m2 = fsum((value - mean) ** 2 for value in values)
+
+        total = self.count + count
+        delta = mean - self.mean
+
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+        low, high = min(values), max(values)
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+    def result(self) -> dict:
+
+        return {
+            "count": self.count,
+            "mean": self.mean if self.count else None,
+            "std": sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None,
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+
+
+class _LayoutSummary:
+    """Accumulators of one packet layout: device time intervals and field statistics."""
+
+    def __init__(self, fields):
+
+        self.fields = fields
+        self.stats = {field: RunningStats() for field in fields}
+        self.batch = {field: list() for field in fields}
+        self.batched = 0
+
+        self.count = 0
+        self.start = None
+        self.end = None
+        self.interval = RunningStats()
+        self.intervals = list()
+        self.interval_sum = 0.0
+        self.gaps = 0
+        self.max_gap = None
+
+    def add_time(self, device_time):
+
+        if device_time is None:
+            return
+
+        if self.end is not None:
+            interval = device_time - self.end
+
+            count = self.count_intervals()
+            if (
+                count >= GAP_MIN_INTERVALS
+                and interval > GAP_FACTOR * self.interval_sum / count
+            ):
+                self.gaps += 1
+
+            self.max_gap = (
+                interval if self.max_gap is None else max(self.max_gap, interval)
+            )
+            self.intervals.append(interval)
+            self.interval_sum += interval
+
+        if self.start is None:
+            self.start = device_time
+        self.end = device_time
+
+    def count_intervals(self) -> int:
+
+        return self.interval.count + len(self.intervals)
+
+    def add(self, packet):
+
+        self.count += 1
+
+        if "timeStamp" in packet:
+            self.add_time(packet["timeStamp"] + packet.get("microSeconds", 0) * 1e-6)
+
+        for field in self.fields:
+            self.batch[field].append(packet.get(field))
+
+        self.batched += 1
+        if self.batched >= BATCH_SIZE:
+            self.flush()
+
+    def add_columns(self, columns, device_times):
+
+        self.count += len(device_times)
+
+        for device_time in device_times:
+            self.add_time(device_time)
+
+        for field in self.fields:
+            self.stats[field].add(columns[field])
+
+    def flush(self):
+
+        for field in self.fields:
+            self.stats[field].add(self.batch[field])
+            self.batch[field] = list()
+
+        self.interval.add(self.intervals)
+        self.intervals = list()
+        self.batched = 0
+
+    def result(self) -> dict:
+
+        self.flush()
+
+        duration = self.end - self.start if self.start is not None else None
+
+        return {
+            "count": self.count,
+            "start": self.start,
+            "end": self.end,
+            "rate": (self.count - 1) / duration if duration else None,
+            "interval": self.interval.result(),
+            "gaps": self.gaps,
+            "max_gap": self.max_gap,
+            "fields": {
+                field: stats.result()
+                for field, stats in self.stats.items()
+                if stats.count
+            },
+        }
+
+
+def summary_path(path):
+    """Sidecar of a run folder or a single log file.
+
+    That is summary.json inside a folder and <file>.summary.json next to a file.
+    """
+
+    path = Path(path)
+
+    return (
+        path / SUMMARY_FILE
+        if path.is_dir()
+        else path.parent / (path.name + "." + SUMMARY_FILE)
+    )
+
+
+def _sources_mtime(sources):
+
+    return max(
+        (
+            os.stat(
+                source / COLUMNS_MANIFEST_FILE if kind == "columnar" else source
+            ).st_mtime
+            for kind, source in sources
+        ),
+        default=None,
+    )
+
+
+def compute_summary(path):
+    """Summarize the logs of a run folder or a log file in one pass.
+
+    No sidecar is read or written.
+    """
+
+    sources = log_sources(path)
+    layouts = dict()
+
+    def layout(key):
+
+        name = dvl_schema.layout_name(key)
+        if name not in layouts:
+            layouts[name] = _LayoutSummary(
+                dvl_schema.sensor_names(dvl_schema.SCHEMAS[key]) + ["timestampPython"]
+            )
+        return layouts[name]
+
+    for kind, source in sources:
+
+        if kind == "columnar":
+            for name, array in load_columns(source).items():
+                if not len(array):
+                    continue
+                key = dvl_schema.layout_key(
+                    int(array["family"][0]),
+                    int(array["id"][0]),
+                    int(array["version"][0]),
+                )
+                summary = layout(key)
+                for start in range(0, len(array), BATCH_SIZE):
+                    block = array[start : start + BATCH_SIZE]
+                    columns = {
+                        field: block[field].tolist()
+                        for field in summary.fields
+                        if field in block.dtype.names
+                    }
+                    summary.add_columns(
+                        columns,
+                        (block["timeStamp"] + block["microSeconds"] * 1e-6).tolist(),
+                    )
+            continue
+
+        for packet in iter_packets(source):
+            key = dvl_schema.layout_key(
+                packet.get("family"), packet.get("id"), packet.get("version")
+            )
+            if key is not None:
+                layout(key).add(packet)
+
+    results = {name: summary.result() for name, summary in layouts.items()}
+
+    return {
+        "version": SUMMARY_VERSION,
+        "mtime": _sources_mtime(sources),
+        "sources": [str(source) for _, source in sources],
+        "packets": sum(result["count"] for result in results.values()),
+        "layouts": results,
+    }
+
+
+def summarize(path, force=False) -> dict:
+    """Summary statistics of a run, from its sidecar while the logs are unchanged.
+
+    Per packet layout: packet count, device time span, rate, interval
+    statistics and gaps (intervals over GAP_FACTOR times the mean interval
+    so far), and count, mean, std, min and max of every sensor field and of
+    timestampPython; the mean of a status bit is its valid ratio. The logs
+    are read once (see compute_summary) when the sidecar is missing, when
+    force is set or when the newest log file is newer than the mtime the
+    sidecar was computed from.
+    """
+
+    sidecar = summary_path(path)
+    mtime = _sources_mtime(log_sources(path))
+
+    if not force and sidecar.is_file():
+        try:
+            with open(sidecar) as file:
+                summary = json.load(file)
+            if (
+                summary.get("version") == SUMMARY_VERSION
+                and summary.get("mtime") == mtime
+            ):
+                return summary
+        except ValueError:
+            pass
+
+    summary = compute_summary(path)
+
+    with open(sidecar, "w") as file:
+        json.dump(summary, file, indent=2)
+
+    return summary
+
+
+def _format(value):
+
+    return "-" if value is None else "{:.4g}".format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summary statistics of Nucleus runs, "
+        "cached in a summary.json sidecar"
+    )
+    parser.add_argument("paths", nargs="+", help="Run folders or log files")
+    parser.add_argument(
+        "--force", action="store_true", help="Recompute even if the sidecar is current"
+    )
+    parser.add_argument(
+        "--fields", nargs="*", default=None, help="Fields to print (default: all)"
+    )
+    args = parser.parse_args()
+
+    for path in args.paths:
+        summary = summarize(path, force=args.force)
+        print(f"📊 {path}: {summary['packets']} packets")
+
+        for name, layout in summary["layouts"].items():
+            rate, max_gap = _format(layout["rate"]), _format(layout["max_gap"])
+            print(
+                f"  {name}: {layout['count']} packets, {rate} Hz, "
+                f"{layout['gaps']} gaps (max {max_gap} s)"
+            )
+
+            for field, stats in layout["fields"].items():
+                if args.fields is None or field in args.fields:
+                    mean, std = _format(stats["mean"]), _format(stats["std"])
+                    low, high = _format(stats["min"]), _format(stats["max"])
+                    print(f"    {field}: mean {mean} std {std} min {low} max {high}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
 
 import argparse
-from dvl_reader import DVLReader
+from dvl_reader import DASHBOARD_REFRESH_RATE, DVLReader
+
+
+def positive_float(text):
+    value = float(text)
+    if not 0 < value < float("inf"):
+        raise argparse.ArgumentTypeError(
+            "must be a positive number, not {}".format(text)
+        )
+    return value
 
 
 def main():
@@ -12,9 +21,25 @@ def main():
         default="single",
         help="Choose between a one-time read or continuous stream",
     )
+    parser.add_argument(
+        "--display",
+        choices=["dashboard", "scroll"],
+        default="dashboard",
+        help="Stream as an in-place dashboard of the latest values "
+        "or print every packet",
+    )
+    parser.add_argument(
+        "--refresh",
+        type=positive_float,
+        default=DASHBOARD_REFRESH_RATE,
+        help="Dashboard refreshes per second",
+    )
     args = parser.parse_args()
 
-    reader = DVLReader()
+    # the dashboard callback only stores the packet, cheap enough for the
+    # parser thread
+    dashboard = args.mode == "stream" and args.display == "dashboard"
+    reader = DVLReader(dispatch="parser" if dashboard else "thread")
 
     try:
         reader.setup()
@@ -35,7 +60,10 @@ def main():
             print(f"B3:       {result['b3']:.2f} m")
 
         elif args.mode == "stream":
-            reader.stream()
+            if args.display == "dashboard":
+                reader.dashboard(refresh_rate=args.refresh)
+            else:
+                reader.stream()
 
     finally:
         reader.stop()
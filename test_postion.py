@@ -1,31 +1,21 @@
 
 #!/usr/bin/env python3
 
-from nucleus_driver import NucleusDriver
-from enum import IntEnum
-import time
-import math
-
-
-class DataID(IntEnum):
-    AHRS = 0xD2
-    ALTIMETER = 0xAA
-    BOTTOM_TRACK = 0xB4
+from dvl_driver import DVLDriver
+from dvl_navigation import NavigationCore
+from dvl_schema import DataID
 
 
 class DVLReader:
     def __init__(self, port="/dev/ttyUSB0"):
         self.port = port
-        self.driver = NucleusDriver()
+        self.driver = DVLDriver()
         self.ahrs_data = None
         self.altimeter_data = None
         self.bt_data = None
 
-        self.x = 0.0
-        self.y = 0.0
-        self.total_distance = 0.0
-        self.last_time = time.time()
-        self.velocity_threshold = 0.01  # 1 cm/s noise floor
+        # instrument frame, 1 cm/s noise floor
+        self.navigation = NavigationCore(rotation="none", fom_limit=1.5, velocity_threshold=0.01)
 
     def setup(self):
         self.driver.set_serial_configuration(self.port)
@@ -91,26 +81,9 @@ class DVLReader:
 
                 self.parse_packet(pkt)
 
-                now = time.time()
-                dt = now - self.last_time
-                self.last_time = now
-
-                if self.bt_data:
-                    vx = self.bt_data["vx"]
-                    vy = self.bt_data["vy"]
-                    fom_x = self.bt_data["fom_x"]
-                    fom_y = self.bt_data["fom_y"]
-
-                    if fom_x > 1.5 or fom_y > 1.5:
-                        print("⚠️ FOM too high — skipping integration")
-                    elif abs(vx) < self.velocity_threshold and abs(vy) < self.velocity_threshold:
-                        pass  # below noise threshold
-                    else:
-                        dx = vx * dt
-                        dy = vy * dt
-                        self.x += dx
-                        self.y += dy
-                        self.total_distance += math.sqrt(dx**2 + dy**2)
+                # each velocity is integrated over its own device time interval
+                if not self.navigation.update(pkt) and pkt["id"] == DataID.BOTTOM_TRACK and self.navigation.rejected == "fom":
+                    print("⚠️ FOM too high — skipping integration")
 
                 # Print AHRS
                 if self.ahrs_data:
@@ -130,10 +103,7 @@ class DVLReader:
                     print(f"📶 FOM X: {self.bt_data['fom_x']} | Y: {self.bt_data['fom_y']}")
                     print(f"📡 B1: {self.bt_data['b1']} m | B2: {self.bt_data['b2']} m | B3: {self.bt_data['b3']} m")
 
-                    drift = math.sqrt(self.x**2 + self.y**2)
-                    print(f"📍 Distance Traveled: {self.total_distance} m | Drift from Start: {drift} m\n")
-
-                time.sleep(0.05)
+                    print(f"📍 Distance Traveled: {self.navigation.distance} m | Drift from Start: {self.navigation.drift()} m\n")
 
         except KeyboardInterrupt:
             print("\n⏹️ Stream stopped by user.")
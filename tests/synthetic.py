@@ -0,0 +1,94 @@
+"""Synthetic Nucleus frames for the tests."""
+
+from dvl_schema import (
+    DTYPES,
+    HEADER_SIZE,
+    SCHEMAS,
+    DataID,
+    _default_offset,
+    checksum,
+    encode_packet,
+)
+
+START_TIME = 1750000000
+
+
+def layout_packet(packet_id):
+    """A packet of the first numeric layout of packet_id, every field 0."""
+
+    key = next(key for key in DTYPES if key[1] == packet_id and DTYPES[key] is not None)
+
+    packet = {name: 0 for name in DTYPES[key].names}
+    packet.update(
+        family=key[0],
+        id=key[1],
+        version=key[2] or 0,
+        offsetOfData=_default_offset(SCHEMAS[key]) or 0,
+    )
+
+    return packet
+
+
+def frames(count, packet_id=DataID.BOTTOM_TRACK):
+    """count frames of packet_id, one second apart."""
+
+    packet = layout_packet(packet_id)
+
+    data = bytearray()
+    for index in range(count):
+        packet["timeStamp"] = START_TIME + index
+        data += encode_packet(packet)
+
+    return bytes(data)
+
+
+def short_frame(frame, size_data):
+    """frame with its data cut to size_data bytes.
+
+    Both checksums are redone, so the frame is still valid.
+    """
+
+    data = frame[HEADER_SIZE : HEADER_SIZE + size_data]
+
+    header = bytearray(frame[:HEADER_SIZE])
+    header[4:6] = len(data).to_bytes(2, "little")
+    header[6:8] = checksum(data).to_bytes(2, "little")
+    header[8:10] = checksum(header, 0, 8).to_bytes(2, "little")
+
+    return bytes(header) + data
+
+
+def mixed_frames(count):
+    """count frames cycling through several layouts, current profiles included.
+
+    Every 37th frame fails its data checksum and every 53rd is too short for
+    its layout.
+    """
+
+    packets = [
+        layout_packet(packet_id)
+        for packet_id in (DataID.BOTTOM_TRACK, DataID.AHRS, DataID.IMU)
+    ]
+
+    profile = layout_packet(DataID.AHRS)
+    cells = {f"velocityData_{index}": index - 4 for index in range(9)}
+    profile.update(
+        id=DataID.CURRENT_PROFILE, version=1, offsetOfData=48, numberOfCells=3, **cells
+    )
+    packets.append(profile)
+
+    data = bytearray()
+    for index in range(count):
+        packet = packets[index % len(packets)]
+        packet["timeStamp"] = START_TIME + index
+        packet["microSeconds"] = index * 1000 % 1000000
+        frame = encode_packet(packet)
+
+        if index % 53 == 52:
+            frame = short_frame(frame, 20)
+        elif index % 37 == 36:
+            frame = frame[:-1] + bytes([frame[-1] ^ 0xFF])
+
+        data += frame
+
+    return bytes(data)
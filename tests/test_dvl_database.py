@@ -0,0 +1,42 @@
+import os
+
+from dvl_database import PacketDatabase
+from dvl_files import ingest
+from dvl_schema import DataID
+from synthetic import frames
+
+
+def _counts(database):
+
+    with PacketDatabase(database) as packet_database:
+        return (
+            packet_database.query("SELECT COUNT(*) FROM bottom_track")[0][0],
+            packet_database.query("SELECT COUNT(*) FROM imu")[0][0],
+            [tuple(row) for row in packet_database.query("SELECT * FROM runs")],
+        )
+
+
+def test_ingest_skips_current_run(tmp_path):
+
+    path = tmp_path / "data.nucleus"
+    path.write_bytes(frames(5) + frames(3, DataID.IMU))
+    database = tmp_path / "runs.sqlite"
+
+    assert ingest([path], database) == 8
+    counts = _counts(database)
+    assert counts[:2] == (5, 3) and len(counts[2]) == 1
+
+    assert ingest([path], database) == 0
+    assert _counts(database) == counts
+
+    assert ingest([path], database, force=True) == 8
+    assert _counts(database) == counts
+
+    # a changed log replaces its run
+    path.write_bytes(frames(2))
+    os.utime(path, (1, 1))
+
+    assert ingest([path], database) == 2
+    bottom_track, imu, runs = _counts(database)
+    assert (bottom_track, imu) == (2, 0)
+    assert [run[0] for run in runs] == [counts[2][0][0]]
@@ -0,0 +1,268 @@
+import csv
+from binascii import crc32
+from datetime import datetime
+
+import pytest
+
+import dvl_download
+import dvl_driver
+import dvl_logging
+from dvl_download import (
+    DECODE_FOLDER,
+    ChunkController,
+    DownloadManifest,
+    StreamDecoder,
+    _convert_chunk,
+)
+from dvl_driver import DVLDriver
+from dvl_schema import DataID, merged_field_names
+from synthetic import frames, mixed_frames, short_frame
+
+
+def _converted_rows(path, **options):
+
+    driver = DVLDriver()
+    assert driver.download.convert_nucleus_data(path, **options)
+
+    (folder,) = (path.parent / "nucleus_converted").iterdir()
+    with open(folder / "nucleus_log.csv", newline="") as file:
+        rows = [
+            row
+            for row in csv.DictReader(file)
+            if row["id"] == str(int(DataID.BOTTOM_TRACK))
+        ]
+
+    return rows, dict(driver.download.conversion_statistics)
+
+
+def test_convert_short_frame(tmp_path):
+
+    path = tmp_path / "data.nucleus"
+    path.write_bytes(frames(2) + short_frame(frames(1), 20) + frames(3))
+
+    rows, statistics = _converted_rows(path, workers=1)
+
+    assert len(rows) == 5
+    assert statistics == {"packets": 5, "failed packets": 0, "undecoded packets": 1}
+
+
+def test_convert_chunk_short_frame(tmp_path):
+
+    data = frames(2) + short_frame(frames(1), 20) + frames(3)
+    path = tmp_path / "data.nucleus"
+    path.write_bytes(data)
+
+    text, current_profiles, failed_frames, packets, undecoded, stop = _convert_chunk(
+        path, 0, len(data), merged_field_names()
+    )
+
+    assert (packets, undecoded, stop) == (5, 1, len(data))
+
+
+def test_stream_decoder_short_frame(tmp_path):
+
+    path = tmp_path / "data.nucleus"
+    data = frames(2) + short_frame(frames(1), 20) + frames(3)
+
+    decoder = StreamDecoder(path, ("csv", "columnar"))
+    for position in range(0, len(data), 50):
+        decoder.feed(data[position : position + 50])
+
+    assert decoder.close()
+    assert decoder.statistics == {
+        "packets": 5,
+        "failed packets": 0,
+        "undecoded packets": 1,
+    }
+
+    with open(tmp_path / DECODE_FOLDER / "nucleus_log.csv", newline="") as file:
+        assert len(list(csv.DictReader(file))) == 5
+
+
+class _Manifest:
+
+    def __init__(self, chunk):
+
+        self.chunk = chunk
+
+    def matches(self, length):
+
+        return length >= self.chunk["end"]
+
+    def resume_chunk(self):
+
+        return self.chunk
+
+
+def test_same_file_timeouts(monkeypatch):
+
+    download = DVLDriver().download
+    data = bytes(range(256)) * 4
+    chunk = {"start": 0, "end": len(data), "crc": crc32(data)}
+
+    controller = ChunkController(1024, 1024, 1024)
+    controller.measure(1024, 0.1)
+    controller.measure(512, 0.06)
+    monkeypatch.setattr(download, "_chunk_controller", lambda: controller)
+
+    timeouts = []
+
+    def request_chunk(fid, src, sa, length, timeout):
+        timeouts.append(timeout)
+        if len(timeouts) < 3:
+            return False, b"", 0
+        return True, data, crc32(data)
+
+    monkeypatch.setattr(download, "_request_chunk", request_chunk)
+
+    assert download._same_file(_Manifest(chunk), 1, 0, len(data)) is True
+    assert timeouts == [controller.timeout(len(data), attempt) for attempt in (1, 2, 3)]
+    assert 0 < timeouts[0] < timeouts[1] < timeouts[2]
+
+
+def test_chunk_controller_timeout():
+
+    controller = ChunkController(4096, 1024, 65536)
+
+    # the fixed schedule of Download until a reply has been timed
+    assert [controller.timeout(4096, attempt) for attempt in range(1, 11)] == [
+        3,
+        4,
+        5,
+        6,
+        7,
+        8,
+        9,
+        10,
+        10,
+        10,
+    ]
+
+    controller.measure(1024, 0.2)
+    controller.measure(4096, 0.5)
+    assert controller.latency == pytest.approx(0.1)
+    assert controller.seconds_per_byte == pytest.approx(0.4 / 4096)
+
+    assert controller.timeout(4096, 1) == pytest.approx(1.5)
+    assert controller.timeout(4096, 2) == pytest.approx(3.0)
+    assert controller.timeout(16, 1) == ChunkController.MIN_TIMEOUT
+    assert controller.timeout(4096, 100) == ChunkController.MAX_TIMEOUT
+
+
+def test_chunk_controller_length():
+
+    controller = ChunkController(100000, 1024, 65536)
+    assert controller.length == 65536
+
+    # halved on a failure until a reply has been timed
+    controller.record(65536, False)
+    assert controller.length == 32768
+    controller.record(32768, True)
+    assert controller.length == 32768
+
+    # a clean link with a high latency: the length doubles up to the maximum
+    controller = ChunkController(4096, 1024, 65536)
+    controller.measure(1024, 0.11)
+    controller.measure(2048, 0.12)
+    for _ in range(4):
+        controller.record(controller.length, True)
+    assert controller.length == 65536
+
+    # every chunk failing: the length shrinks to where goodput peaks
+    for _ in range(20):
+        controller.record(controller.length, False)
+    length = controller.length
+    assert 1024 < length < 65536
+    assert controller.goodput(length) > controller.goodput(length // 2)
+    assert controller.goodput(length) > controller.goodput(length * 2)
+
+
+def _dvl_manifest(tmp_path):
+
+    manifest = DownloadManifest(tmp_path / "manifest.jsonl")
+    manifest.create(serial=1, src=1, fid=3, folder=str(tmp_path), length=0, header=10)
+
+    (tmp_path / "dvl_data.bin").write_bytes(bytes(10))
+    (tmp_path / "dvl_crc_fails.bin").write_bytes(b"")
+
+    manifest.add(0, 1000, 1, pending=4, size=900, fail_size=0)
+    manifest.add(1000, 2000, 2, pending=0, size=1900, fail_size=50)
+    manifest.close()
+
+    return manifest
+
+
+def test_manifest_resume_point(tmp_path):
+
+    manifest = _dvl_manifest(tmp_path)
+    assert manifest.resume_point() == (0, 10, 0)
+
+    (tmp_path / "dvl_data.bin").write_bytes(bytes(1800))
+    assert manifest.resume_point() == (996, 900, 0)
+
+    (tmp_path / "dvl_crc_fails.bin").write_bytes(bytes(50))
+    assert manifest.resume_point() == (996, 900, 0)
+
+    (tmp_path / "dvl_data.bin").write_bytes(bytes(2000))
+    assert manifest.resume_point() == (2000, 1900, 50)
+
+    # a reloaded manifest ignores a line cut short by an interrupted session
+    with open(tmp_path / "manifest.jsonl", "a") as file:
+        file.write('{"start": 2000, "end": 30')
+
+    reloaded = DownloadManifest(tmp_path / "manifest.jsonl")
+    assert reloaded.metadata == manifest.metadata
+    assert reloaded.chunks == manifest.chunks
+    assert reloaded.resumable()
+    assert reloaded.resume_point() == (2000, 1900, 50)
+
+
+def test_manifest_matches(tmp_path):
+
+    manifest = _dvl_manifest(tmp_path)
+    manifest.metadata["length"] = 1500
+
+    # no chunk the output files still hold: only the listed length counts
+    assert not manifest.matches(1499)
+    assert manifest.matches(1500)
+
+    (tmp_path / "dvl_data.bin").write_bytes(bytes(2000))
+    (tmp_path / "dvl_crc_fails.bin").write_bytes(bytes(50))
+    assert not manifest.matches(1999)
+    assert manifest.matches(2000)
+
+
+class _FixedTime(datetime):
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 6, 1, 12, 0, 0)
+
+
+def test_convert_parallel_same_as_sequential(tmp_path, monkeypatch):
+
+    for module in (dvl_download, dvl_driver, dvl_logging):
+        monkeypatch.setattr(module, "datetime", _FixedTime)
+    monkeypatch.setattr(dvl_download, "PARALLEL_CHUNK_SIZE", 4096)
+
+    data = mixed_frames(2000)
+    outputs = dict()
+    for workers in (1, 3):
+        path = tmp_path / str(workers) / "data.nucleus"
+        path.parent.mkdir()
+        path.write_bytes(data)
+
+        driver = DVLDriver()
+        assert driver.download.convert_nucleus_data(path, workers=workers)
+
+        (folder,) = (path.parent / "nucleus_converted").iterdir()
+        outputs[workers] = (
+            {file.name: file.read_bytes() for file in folder.iterdir()},
+            dict(driver.download.conversion_statistics),
+        )
+
+    assert len(data) > 8 * 4096
+    assert outputs[1][1]["failed packets"] > 0
+    assert outputs[1][1]["undecoded packets"] > 0
+    assert "current_profile_log.csv" in outputs[1][0]
+    assert outputs[3] == outputs[1]
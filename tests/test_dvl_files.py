@@ -0,0 +1,99 @@
+import csv
+import math
+
+from dvl_files import (
+    export_columnar,
+    export_csv,
+    find_frames,
+    iter_packets,
+    load_columns,
+)
+from dvl_logging import RAW_TIME_ENTRY
+from synthetic import frames, short_frame
+
+
+def test_find_frames_garbage_tail():
+
+    data = frames(5)
+    buffer = data + bytes([0xA5, 0x40]) + bytes(10)
+
+    found, stop = find_frames(buffer)
+
+    assert len(found) == 5 and all(valid for _, _, valid in found)
+    assert stop == len(data)
+
+
+def test_find_frames_truncated_tail():
+
+    data = frames(5)
+    frame = frames(1)
+
+    for cut in range(1, len(frame)):
+        found, stop = find_frames(data + frame[:cut])
+        assert len(found) == 5
+        assert stop == len(data)
+
+
+def test_find_frames_short_header_size():
+
+    data = frames(2)
+    found, stop = find_frames(bytes([0xA5, 0x02]) + bytes(20) + data)
+
+    assert len(found) == 2 and stop == 22 + len(data)
+
+
+def test_iter_packets_truncated_tail(tmp_path):
+
+    path = tmp_path / "data.nucleus"
+    path.write_bytes(frames(5) + bytes([0xA5, 0x40]) + bytes(10))
+
+    assert len(list(iter_packets(path))) == 5
+
+
+def _with_short_frame(tmp_path):
+
+    path = tmp_path / "data.nucleus"
+    path.write_bytes(frames(2) + short_frame(frames(1), 20) + frames(3))
+
+    return path
+
+
+def test_iter_packets_short_frame(tmp_path):
+
+    assert len(list(iter_packets(_with_short_frame(tmp_path)))) == 5
+
+
+def test_export_csv_short_frame(tmp_path):
+
+    assert export_csv(_with_short_frame(tmp_path), tmp_path / "csv") == 5
+
+    with open(tmp_path / "csv" / "data.csv", newline="") as file:
+        assert len(list(csv.DictReader(file))) == 5
+
+
+def test_export_columnar_short_frame(tmp_path):
+
+    assert export_columnar(_with_short_frame(tmp_path), tmp_path / "columns") == 5
+
+    assert (
+        sum(len(records) for records in load_columns(tmp_path / "columns").values())
+        == 5
+    )
+
+
+def test_export_columnar_times_sidecar(tmp_path):
+
+    data = frames(4)
+    (tmp_path / "nucleus_log.nucleus").write_bytes(data)
+
+    offsets = [offset for offset, _, _ in find_frames(data)[0]]
+    with open(tmp_path / "nucleus_log.times", "wb") as file:
+        for offset in offsets[1:3]:
+            file.write(RAW_TIME_ENTRY.pack(offset, 100.0 + offset))
+
+    assert export_columnar(tmp_path, tmp_path / "columns") == 4
+
+    (records,) = load_columns(tmp_path / "columns").values()
+    times = list(records["timestampPython"])
+    assert math.isnan(times[0]) and math.isnan(times[3])
+    assert times[1:3] == [100.0 + offset for offset in offsets[1:3]]
@@ -0,0 +1,166 @@
+import csv
+import io
+import math
+
+import pytest
+
+from dvl_driver import DVLDriver
+from dvl_files import load_columns
+from dvl_logging import AsyncLogger, ColumnarWriter, PacketCsvWriter
+from dvl_schema import (
+    DataID,
+    decode_common,
+    decode_header,
+    decode_packet,
+    encode_packet,
+)
+from synthetic import layout_packet
+
+
+def _packets(count):
+    """Full bottom track packets, and the same packets without their sensor data.
+
+    The parser passes packets on like that when their sensor data failed to
+    decode.
+    """
+
+    packet = layout_packet(DataID.BOTTOM_TRACK)
+
+    full, short = [], []
+    for index in range(count):
+        packet["timeStamp"] = 1750000000 + index
+        packet["velocityX"] = index * 0.25
+        frame = encode_packet(packet)
+
+        full.append(decode_packet(frame, timestamp=1750000000.5 + index))
+
+        truncated = decode_header(frame)
+        truncated.update(decode_common(frame[truncated["sizeHeader"] :]))
+        truncated["timestampPython"] = 1750000000.5 + index
+        short.append(truncated)
+
+    return full, short
+
+
+def _write(writer_class, packets, fieldnames):
+
+    text = io.StringIO()
+    writer = writer_class(text, fieldnames=fieldnames)
+    writer.writeheader()
+    for packet in packets:
+        writer.writerow(packet)
+
+    return text.getvalue()
+
+
+def _assert_same_as_dictwriter(packets):
+
+    fieldnames = sorted({name for packet in packets for name in packet})
+
+    assert _write(PacketCsvWriter, packets, fieldnames) == _write(
+        csv.DictWriter, packets, fieldnames
+    )
+
+
+def test_csv_full_then_truncated_packets():
+
+    full, short = _packets(4)
+
+    _assert_same_as_dictwriter(full[:2] + short[2:])
+
+
+def test_csv_truncated_then_full_packets():
+
+    full, short = _packets(4)
+
+    _assert_same_as_dictwriter(short[:1] + full[1:3] + short[3:] + full[:1])
+
+
+def test_csv_missing_python_timestamp():
+
+    full, _ = _packets(3)
+    full[1]["timestampPython"] = None
+
+    _assert_same_as_dictwriter(full)
+    _assert_same_as_dictwriter(full[1:])
+
+
+def test_columnar_missing_python_timestamp(tmp_path):
+
+    full, _ = _packets(2)
+    full[0]["timestampPython"] = None
+
+    writer = ColumnarWriter(tmp_path)
+    for packet in full:
+        writer.write(packet)
+    writer.close()
+
+    assert full[0]["timestampPython"] is None
+
+    (records,) = load_columns(tmp_path).values()
+    assert math.isnan(records["timestampPython"][0])
+    assert records["timestampPython"][1] == full[1]["timestampPython"]
+
+
+@pytest.mark.parametrize(
+    "policy, kept, queued",
+    [("drop_oldest", [2, 3], 4), ("drop_newest", [0, 1], 2), ("block", [0, 1], 2)],
+)
+def test_async_logger_policies(policy, kept, queued):
+
+    # not started, so nothing drains the queue
+    logger = AsyncLogger(queue_size=2, policy=policy, block_timeout=0.01)
+    for record in range(4):
+        logger._enqueue(record)
+
+    assert [logger.log_queue.get_nowait() for _ in range(2)] == kept
+    assert logger.statistics["dropped"] == 2
+    assert logger.statistics["queued"] == queued
+
+
+def test_async_logger_stop_writes_queue(tmp_path):
+
+    full, _ = _packets(500)
+
+    # the writer would only flush after a minute on its own
+    driver = DVLDriver(flush_interval=60.0, batch_size=7)
+    logger = driver.logger
+    logger.set_path(str(tmp_path))
+    folder = logger.start()
+
+    for packet in full:
+        logger.write_packet(packet)
+    logger.stop()
+
+    # start also logs the get_all package
+    assert logger.statistics["queued"] == logger.statistics["written"] == 501
+    assert logger.statistics["dropped"] == logger.statistics["failed"] == 0
+
+    bottom_track = str(int(DataID.BOTTOM_TRACK))
+    with open(f"{folder}/nucleus_log.csv", newline="") as file:
+        rows = [row for row in csv.DictReader(file) if row["id"] == bottom_track]
+
+    assert [float(row["velocityX"]) for row in rows] == [
+        packet["velocityX"] for packet in full
+    ]
+
+
+def test_async_logger_failed_write(tmp_path):
+
+    driver = DVLDriver()
+    logger = driver.logger
+    logger.set_path(str(tmp_path))
+    logger.start()
+
+    def write(value):
+        if value == 1:
+            raise OSError("disk full")
+
+    for value in range(3):
+        logger._enqueue((write, (value,)))
+    logger.stop()
+
+    assert not logger.writer_thread.is_alive()
+    assert logger.statistics["queued"] == 4
+    assert logger.statistics["written"] == 3
+    assert logger.statistics["failed"] == 1
@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+from dvl_files import iter_packets
+from dvl_navigation import ROTATIONS, NavigationCore, dead_reckon, load_dive
+from dvl_schema import DataID, encode_packet
+from synthetic import START_TIME, layout_packet
+
+DT_XYZ = 0.25
+
+
+def _timed(packet, time):
+
+    seconds = math.floor(time)
+    packet.update(timeStamp=seconds, microSeconds=round((time - seconds) * 1e6))
+
+    return encode_packet(packet)
+
+
+def _dive(path):
+    """A synthetic dive of 400 bottom track packets at 8 Hz with attitude.
+
+    Every BT packet follows an attitude sample at its measurement time, so
+    the interpolated and the latest attitude agree. The dive has a heading
+    wrap, a yaw jump, a 3 s dropout and rejected velocities.
+    """
+
+    bottom_track = layout_packet(DataID.BOTTOM_TRACK)
+    ahrs = layout_packet(DataID.AHRS)
+
+    data = bytearray()
+    for index in range(400):
+        time = START_TIME + index * 0.125 + (3.0 if index >= 200 else 0.0)
+
+        for step, offset in enumerate((DT_XYZ - 0.0625, DT_XYZ)):
+            sample = 2 * index + step
+            ahrs.update(
+                {
+                    "ahrsData.heading": (350.0 + 0.25 * sample) % 360.0
+                    + (60.0 if 300 <= index < 310 else 0.0),
+                    "ahrsData.roll": 5.0 * math.sin(sample / 50),
+                    "ahrsData.pitch": 3.0 * math.cos(sample / 70),
+                }
+            )
+            data += _timed(ahrs, time + offset)
+
+        valid = index % 31 != 30
+        bottom_track.update(
+            {
+                "status.xVelocityValid": valid,
+                "status.yVelocityValid": valid,
+                "status.zVelocityValid": valid,
+                "velocityX": 0.0 if index % 29 == 28 else 1.0 + math.sin(index / 40),
+                "velocityY": 0.0 if index % 29 == 28 else 0.5 * math.cos(index / 25),
+                "velocityZ": 0.1 * math.sin(index / 15),
+                "fomX": 2.0 if index % 17 == 16 else 0.1,
+                "fomY": 0.1,
+                "dtXYZ": DT_XYZ,
+                "timeVelXYZ": 0.125,
+            }
+        )
+        data += _timed(bottom_track, time)
+
+    path.write_bytes(data)
+
+
+@pytest.mark.parametrize("rotation", ROTATIONS)
+@pytest.mark.parametrize("yaw_jump_limit", [None, 45.0])
+def test_dead_reckon_matches_navigation_core(tmp_path, rotation, yaw_jump_limit):
+
+    path = tmp_path / "dive.nucleus"
+    _dive(path)
+
+    dive = load_dive(path)
+    trajectory = dead_reckon(
+        dive["bottom_track"],
+        dive["ahrs"],
+        rotation=rotation,
+        yaw_jump_limit=yaw_jump_limit,
+    )
+
+    core = NavigationCore(rotation=rotation, yaw_jump_limit=yaw_jump_limit)
+    used = list()
+    for packet in iter_packets(path):
+        moved = core.update(packet)
+        if packet["id"] == DataID.BOTTOM_TRACK:
+            used.append(moved)
+
+    assert used == trajectory["used"].tolist()
+    assert trajectory["distance"][-1] > 40.0
+    assert core.x == pytest.approx(trajectory["x"][-1], abs=1e-4)
+    assert core.y == pytest.approx(trajectory["y"][-1], abs=1e-4)
+    assert core.z == pytest.approx(trajectory["z"][-1], abs=1e-4)
+    assert core.distance == pytest.approx(trajectory["distance"][-1], abs=1e-4)
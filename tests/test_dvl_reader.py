@@ -0,0 +1,100 @@
+import threading
+
+from dvl_reader import DVLReader
+from dvl_schema import DataID
+from synthetic import START_TIME, frames
+
+
+def _reader(dispatch, queue_size=1000):
+
+    reader = DVLReader(dispatch=dispatch, queue_size=queue_size)
+    reader.driver.parser.set_queuing(packet=False)
+
+    return reader
+
+
+def _times(packets):
+
+    return [packet["timeStamp"] - START_TIME for packet in packets]
+
+
+def test_parser_dispatch():
+
+    reader = _reader("parser")
+    bottom_track, every, threads = list(), list(), set()
+
+    def on_bottom_track(packet):
+        bottom_track.append(packet)
+        threads.add(threading.current_thread())
+
+    reader.on(DataID.BOTTOM_TRACK, on_bottom_track)
+    reader.on(None, every.append)
+
+    reader.driver.parser.add_data(frames(3) + frames(2, DataID.IMU))
+    assert _times(bottom_track) == [0, 1, 2]
+    assert [packet["id"] for packet in every] == [DataID.BOTTOM_TRACK] * 3 + [
+        DataID.IMU
+    ] * 2
+    assert threads == {threading.current_thread()}
+    assert reader.thread is None
+
+    reader.off(DataID.BOTTOM_TRACK, on_bottom_track)
+    reader.driver.parser.add_data(frames(1))
+    assert len(bottom_track) == 3 and len(every) == 6
+
+
+def test_thread_dispatch_and_stop(monkeypatch):
+
+    reader = _reader("thread")
+    monkeypatch.setattr(reader.driver, "stop", lambda: None)
+    monkeypatch.setattr(reader.driver, "disconnect", lambda: None)
+
+    received, threads = list(), set()
+    done = threading.Event()
+
+    def on_bottom_track(packet):
+        received.append(packet)
+        threads.add(threading.current_thread())
+        if len(received) == 5:
+            done.set()
+
+    reader.on(DataID.BOTTOM_TRACK, on_bottom_track)
+    reader.driver.parser.add_data(frames(5) + frames(2, DataID.IMU))
+
+    assert done.wait(2.0)
+    assert _times(received) == [0, 1, 2, 3, 4]
+    assert threads == {reader.thread}
+
+    thread = reader.thread
+    reader.stop()
+    assert reader.thread is None and not thread.is_alive()
+
+    # the parser no longer queues packets for the stopped dispatch thread
+    reader.driver.parser.add_data(frames(3))
+    assert reader.queue.empty() and len(received) == 5
+
+
+def test_thread_dispatch_drops_oldest():
+
+    reader = _reader("thread", queue_size=3)
+
+    received = list()
+    entered, release = threading.Event(), threading.Event()
+
+    def on_bottom_track(packet):
+        received.append(packet)
+        entered.set()
+        release.wait(2.0)
+
+    reader.on(DataID.BOTTOM_TRACK, on_bottom_track)
+
+    # the dispatch thread holds the first packet while the rest arrive
+    reader.driver.parser.add_data(frames(1))
+    assert entered.wait(2.0)
+    reader.driver.parser.add_data(frames(10)[len(frames(1)) :])
+
+    assert reader.dropped == 6
+
+    release.set()
+    reader._stop_dispatch()
+    assert _times(received) == [0, 7, 8, 9]
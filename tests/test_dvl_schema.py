@@ -0,0 +1,147 @@
+import math
+import random
+
+import pytest
+from nucleus_driver._parser import Parser
+
+from dvl_schema import (
+    DTYPES,
+    HEADER_SIZE,
+    SCHEMAS,
+    DataID,
+    _COMMON,
+    _HEADER,
+    _default_offset,
+    checksum,
+    decode_packet,
+    encode_packet,
+    sensor_names,
+)
+from synthetic import layout_packet
+
+NUMERIC_KEYS = [key for key in SCHEMAS if DTYPES[key] is not None]
+
+
+class _Messages:
+
+    def write_message(self, *arguments):
+        pass
+
+    def write_warning(self, *arguments):
+        pass
+
+    def write_exception(self, *arguments):
+        pass
+
+
+def _random_value(generator, dtype):
+
+    if dtype.kind == "b":
+        return generator.random() < 0.5
+
+    if dtype.kind == "u":
+        return generator.randrange(2 ** (8 * dtype.itemsize))
+
+    # multiples of 1/64 are exact in float32
+    return generator.randint(-(2**20), 2**20) / 64
+
+
+@pytest.mark.parametrize("key", NUMERIC_KEYS, ids=str)
+def test_encode_decode_round_trip(key):
+
+    generator = random.Random(1)
+    dtype = DTYPES[key]
+
+    packet = layout_packet(key[1])
+    packet.update(version=key[2] or 0, offsetOfData=_default_offset(SCHEMAS[key]))
+    for name in sensor_names(SCHEMAS[key]) + ["timeStamp", "microSeconds"]:
+        packet[name] = _random_value(generator, dtype[name])
+
+    decoded = decode_packet(encode_packet(packet), timestamp=1.5)
+
+    assert decoded["timestampPython"] == 1.5
+    for name in sensor_names(SCHEMAS[key]) + [
+        "version",
+        "offsetOfData",
+        "timeStamp",
+        "microSeconds",
+    ]:
+        assert decoded[name] == packet[name], name
+
+
+def test_encode_decode_current_profile():
+
+    cells = {
+        f"{name}_{index}": index
+        for name in ("velocityData", "amplitudeData", "correlationData")
+        for index in range(9)
+    }
+
+    packet = layout_packet(DataID.AHRS)
+    packet.update(
+        id=DataID.CURRENT_PROFILE, version=1, offsetOfData=48, numberOfCells=3, **cells
+    )
+
+    decoded = decode_packet(encode_packet(packet))
+
+    assert decoded["numberOfCells"] == 3
+    assert {name: decoded[name] for name in cells} == cells
+
+
+def _random_frame(generator, key, offset_of_data):
+
+    family, packet_id, version = key
+
+    if packet_id == DataID.ASCII:
+        data = bytes(generator.randrange(256) for _ in range(30))
+    else:
+        data = bytearray(generator.randrange(256) for _ in range(offset_of_data + 400))
+        _COMMON.pack_into(
+            data,
+            0,
+            version or 0,
+            offset_of_data,
+            generator.randrange(256),
+            generator.randrange(2**32),
+            generator.randrange(2**32),
+        )
+        if packet_id == DataID.CURRENT_PROFILE:
+            data[44:46] = generator.randrange(6).to_bytes(2, "little")
+        data = bytes(data)
+
+    header = bytearray(HEADER_SIZE)
+    _HEADER.pack_into(
+        header, 0, 0xA5, HEADER_SIZE, packet_id, family, len(data), checksum(data), 0
+    )
+    header[8:10] = checksum(header, 0, 8).to_bytes(2, "little")
+
+    return bytearray(header + data)
+
+
+def _same(first, second):
+
+    if isinstance(first, float) and math.isnan(first):
+        return isinstance(second, float) and math.isnan(second)
+
+    return first == second
+
+
+@pytest.mark.parametrize("key", list(SCHEMAS), ids=str)
+def test_decode_packet_matches_parser(key):
+
+    generator = random.Random(2)
+    parser = Parser(messages=_Messages())
+
+    offsets = [_default_offset(SCHEMAS[key]), 40, 48, 52, 60, 64]
+    for offset_of_data in offsets:
+        frame = _random_frame(generator, key, offset_of_data)
+
+        header_checksum, data_checksum, expected = parser.get_packet(frame)
+        assert header_checksum and data_checksum
+
+        packet = decode_packet(frame)
+        for decoded in (expected, packet):
+            decoded.pop("timestampPython", None)
+
+        assert packet.keys() == expected.keys()
+        assert all(_same(packet[name], expected[name]) for name in expected)
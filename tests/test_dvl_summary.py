@@ -0,0 +1,80 @@
+import math
+import random
+import statistics
+
+import pytest
+
+import dvl_summary
+from dvl_summary import RunningStats, _LayoutSummary
+
+
+def test_running_stats_merge():
+
+    generator = random.Random(3)
+    values = [1e6 + generator.gauss(0, 1) for _ in range(5000)]
+
+    stats = RunningStats()
+    position = 0
+    for size in (1, 2, 997, 3000, 1000):
+        stats.add(values[position : position + size])
+        position += size
+
+    result = stats.result()
+    assert result["count"] == len(values)
+    assert result["mean"] == pytest.approx(statistics.fmean(values), abs=1e-9)
+    assert result["std"] == pytest.approx(statistics.stdev(values), rel=1e-9)
+    assert (result["min"], result["max"]) == (min(values), max(values))
+
+
+def test_running_stats_skips_none_and_nan():
+
+    stats = RunningStats()
+    stats.add([None, math.nan])
+    assert stats.result() == {
+        "count": 0,
+        "mean": None,
+        "std": None,
+        "min": None,
+        "max": None,
+    }
+
+    stats.add([True, False, None, True, math.nan, True])
+    assert stats.result()["count"] == 4
+    assert stats.result()["mean"] == 0.75
+
+
+def _layout_result(packets):
+
+    summary = _LayoutSummary(["velocityX"])
+    for packet in packets:
+        summary.add(packet)
+
+    return summary.result()
+
+
+def test_layout_summary_batches(monkeypatch):
+
+    generator = random.Random(4)
+    packets = list()
+    device_time = 100.0
+    for index in range(500):
+        device_time += 5.0 if index == 300 else 0.125
+        seconds = int(device_time)
+        packets.append(
+            {
+                "timeStamp": seconds,
+                "microSeconds": round((device_time - seconds) * 1e6),
+                "velocityX": generator.uniform(-1, 1),
+            }
+        )
+
+    whole = _layout_result(packets)
+
+    monkeypatch.setattr(dvl_summary, "BATCH_SIZE", 7)
+    batched = _layout_result(packets)
+
+    assert batched["count"] == whole["count"] == 500
+    assert batched["gaps"] == whole["gaps"] == 1
+    assert batched["max_gap"] == whole["max_gap"] == pytest.approx(5.0)
+    assert batched["interval"] == pytest.approx(whole["interval"])
+    assert batched["fields"]["velocityX"] == pytest.approx(whole["fields"]["velocityX"])